@@ -1,20 +1,33 @@
 import os
 import flet as ft
 import json
-import difflib
+import threading
+import time
+import multiprocessing
 from datetime import datetime
 
 # Importando funções dos módulos utils
-from utils.explorer import listar_estrutura_pasta, gerar_arvore
-from utils.exporter import exportar_para_txt, exportar_para_pdf, exportar_para_md, exportar_para_json
-from utils.stats import gerar_estatisticas
+from utils.explorer import listar_estrutura_pasta, gerar_arvore_progressiva, atualizar_pastas, aplicar_busca
+from utils.exporter import exportar_para_txt, exportar_para_pdf, exportar_para_md, exportar_para_json, exportar_para_ndjson, exportar_para_snapshot, exportar_tudo
+from utils.stats import gerar_estatisticas, gerar_duplicados
 from utils.zipping import zipar_pasta
 from utils.config import carregar_config, salvar_config
+from utils.scanner import obter_snapshot, configurar_varredura, aplicar_alteracoes, INTERVALO_PROGRESSO
+from utils.observador import ObservadorPasta
+from utils.consulta import compilar_consulta, ErroConsulta
+from utils.comparacao import (gerar_estruturas, comparar_estruturas, obter_snapshots, ComparacaoEmFluxo, exportar_em_fluxo,
+                              caminho_exportacao, MODO_METADADOS, MODO_CONTEUDO, MODO_CONTEUDO_TOTAL)
+from utils.jobs import OperacaoCancelada, TokenCancelamento, iniciar_tarefa, finalizar_tarefa, cancelar_tarefas, observar_tarefas
 
 CONFIG_PATH = "assets/config.json"
+CACHE_PATH = os.path.join(os.path.dirname(CONFIG_PATH), "cache_varredura.db")
+
+# Pausa na digitação, em segundos, antes de aplicar a busca
+ATRASO_BUSCA = 0.3
 
 def main(page: ft.Page):
     config = carregar_config(CONFIG_PATH)
+    configurar_varredura(config.get("workers_varredura"), CACHE_PATH)
     page.title = "File Synapses - Visualizador de Estrutura de Pastas"
     
     page.window_width = 800
@@ -32,8 +45,9 @@ def main(page: ft.Page):
     file_picker = ft.FilePicker()
     page.overlay.append(file_picker)
     
-    def criar_visualizacao_arvore(pasta_path, termo_busca=None):
+    def criar_visualizacao_arvore(pasta_path, termo_busca=None, forcar=False):
         if not pasta_path or pasta_path == "Nenhuma pasta selecionada":
+            cancelar_tarefas("arvore")
             estrutura_container.controls.clear()
             estrutura_container.controls.append(ft.Text("Selecione uma pasta para visualizar sua estrutura"))
             page.update()
@@ -49,12 +63,88 @@ def main(page: ft.Page):
         )
         page.update()
         
-        # Carrega a estrutura
-        gerar_arvore(ft.Text(pasta_path), estrutura_container, termo_busca or "")
+        # A varredura roda numa thread; uma nova visualização (outra pasta ou
+        # F5) cancela a varredura anterior
+        token = iniciar_tarefa("arvore", "Varredura da pasta")
+        varredura["token"] = token
+        varredura["em_andamento"] = True
+        destino = ft.Column(spacing=10)
+        
+        def mostrar_destino():
+            # Troca o indicador de carregamento pela árvore (parcial ou final)
+            if not token.cancelado:
+                estrutura_container.controls[:] = [destino]
+                page.update()
         
-        # Atualiza o histórico de pastas recentes
-        atualizar_historico_pastas(pasta_path)
+        def carregar():
+            # Carrega a estrutura; as pastas aparecem conforme são listadas
+            try:
+                gerar_arvore_progressiva(ft.Text(pasta_path), destino, termo_busca or "", forcar=forcar,
+                                         atualizar_tela=mostrar_destino, token=token)
+            except OperacaoCancelada:
+                if tarefa_substituida(token):
+                    return
+                estrutura_container.controls[:] = [
+                    ft.Text("Varredura cancelada. Pressione F5 para tentar novamente.", italic=True)
+                ]
+                page.update()
+                return
+            finally:
+                finalizar_tarefa("arvore", token)
+                if not tarefa_substituida(token):
+                    varredura["em_andamento"] = False
+            
+            # O termo pode ter mudado durante a varredura
+            if (busca_input.value or "") != (termo_busca or "") and termo_valido(busca_input.value):
+                aplicar_busca(pasta_path, busca_input.value)
+            
+            # Atualiza o histórico de pastas recentes
+            atualizar_historico_pastas(pasta_path)
+            
+            # Passa a observar a nova pasta, se o modo de observação estiver ativo
+            reiniciar_observador()
+            
+            page.update()
         
+        page.run_thread(carregar)
+    
+    # Token da varredura mais recente da árvore (para diferenciar um
+    # cancelamento pelo usuário de uma varredura substituída por outra)
+    varredura = {"token": None, "em_andamento": False}
+    
+    def tarefa_substituida(token):
+        return varredura["token"] is not token
+    
+    observador = {"atual": None}
+    
+    def reiniciar_observador():
+        """(Re)inicia a observação de alterações da pasta atual"""
+        atual = observador["atual"]
+        pasta = txt_pasta.value
+        ativo = config.get("modo_observacao", False) and pasta and os.path.isdir(pasta)
+        if atual and ativo and atual.raiz == pasta:
+            return
+        if atual:
+            atual.parar()
+            observador["atual"] = None
+        if ativo:
+            novo = ObservadorPasta(pasta, lambda pastas, p=pasta: aplicar_alteracoes_observadas(p, pastas))
+            novo.iniciar()
+            observador["atual"] = novo
+    
+    def aplicar_alteracoes_observadas(pasta, pastas):
+        """Aplica ao snapshot e à árvore as alterações detectadas pelo observador"""
+        if pasta != txt_pasta.value:
+            return
+        aplicar_alteracoes(pasta, pastas)
+        atualizar_pastas(pasta, pastas)
+        page.update()
+    
+    def alternar_observacao(e):
+        config["modo_observacao"] = not config.get("modo_observacao", False)
+        btn_observar.icon = ft.Icons.VISIBILITY if config["modo_observacao"] else ft.Icons.VISIBILITY_OFF
+        salvar_config(CONFIG_PATH, config)
+        reiniciar_observador()
         page.update()
     
     def atualizar_historico_pastas(pasta_path):
@@ -115,11 +205,49 @@ def main(page: ft.Page):
             criar_visualizacao_arvore(pasta_path)
     
     busca_input = ft.TextField(
-        label="🔍 Buscar...",
+        label="🔍 Buscar... (ex.: ext:py size:>10MB mtime:<30d path:src/** ~aproximado)",
         width=500,
-        on_change=lambda e: criar_visualizacao_arvore(txt_pasta.value, e.control.value)
+        on_change=lambda e: agendar_busca(e.control.value)
     )
     
+    busca = {"timer": None, "token": None}
+    
+    def agendar_busca(termo):
+        """Aplica a busca só após uma pausa na digitação; buscas anteriores são descartadas"""
+        if busca["timer"]:
+            busca["timer"].cancel()
+        if busca["token"]:
+            busca["token"].cancelar()
+        token = TokenCancelamento("Busca")
+        busca["token"] = token
+        busca["timer"] = threading.Timer(ATRASO_BUSCA, executar_busca, (termo, token))
+        busca["timer"].daemon = True
+        busca["timer"].start()
+    
+    def termo_valido(termo):
+        """Valida a consulta, mostrando o erro de sintaxe no campo de busca"""
+        try:
+            compilar_consulta(termo or "")
+            erro = None
+        except ErroConsulta as e:
+            erro = str(e)
+        if busca_input.error_text != erro:
+            busca_input.error_text = erro
+            page.update()
+        return erro is None
+    
+    def executar_busca(termo, token):
+        pasta = txt_pasta.value
+        if token.cancelado or not termo_valido(termo) or not pasta or pasta == "Nenhuma pasta selecionada":
+            return
+        # Filtra a árvore já carregada pelo índice de nomes, sem varrer a pasta;
+        # se a varredura ainda está em andamento, ela aplica o termo ao terminar
+        if aplicar_busca(pasta, termo, token):
+            if not token.cancelado:
+                page.update()
+        elif not varredura["em_andamento"]:
+            criar_visualizacao_arvore(pasta, termo)
+    
     def selecionar_pasta(e):
         def on_result(e):
             if e.path:
@@ -132,6 +260,23 @@ def main(page: ft.Page):
         file_picker.on_result = on_result
         file_picker.get_directory_path()
     
+    def abrir_exportacao(e):
+        """Abre uma exportação (.fsnap, JSON ou NDJSON) no lugar de uma pasta, sem acessar a pasta original"""
+        def on_result(e):
+            if e.files:
+                caminho = e.files[0].path
+                txt_pasta.value = caminho
+                config["ultima_pasta"] = caminho
+                salvar_config(CONFIG_PATH, config)
+                criar_visualizacao_arvore(caminho)
+                page.update()
+        
+        file_picker.on_result = on_result
+        file_picker.pick_files(
+            dialog_title="Abrir exportação",
+            allowed_extensions=["fsnap", "json", "ndjson"]
+        )
+    
     def alternar_tema(e):
         config["tema_escuro"] = not config.get("tema_escuro", True)
         page.theme_mode = ft.ThemeMode.DARK if config["tema_escuro"] else ft.ThemeMode.LIGHT
@@ -140,7 +285,9 @@ def main(page: ft.Page):
     
     def atualizar_visualizacao(e):
         if txt_pasta.value and txt_pasta.value != "Nenhuma pasta selecionada":
-            criar_visualizacao_arvore(txt_pasta.value, busca_input.value)
+            # Força uma nova varredura para captar arquivos editados no lugar
+            termo = busca_input.value if termo_valido(busca_input.value) else ""
+            criar_visualizacao_arvore(txt_pasta.value, termo, forcar=True)
     
     # Atalhos de teclado
     def keyboard_handler(e: ft.KeyboardEvent):
@@ -161,12 +308,31 @@ def main(page: ft.Page):
         dlg = ft.AlertDialog(
             title=ft.Text("Comparação de Pastas"),
             content=ft.Column([
+                (modo_comp := ft.Dropdown(
+                    label="Comparar arquivos por",
+                    value=MODO_METADADOS,
+                    options=[
+                        ft.dropdown.Option(MODO_METADADOS, "Tamanho e data"),
+                        ft.dropdown.Option(MODO_CONTEUDO, "Conteúdo dos arquivos com data diferente"),
+                        ft.dropdown.Option(MODO_CONTEUDO_TOTAL, "Conteúdo de todos os arquivos"),
+                    ],
+                    width=400
+                )),
+                (fluxo_comp := ft.Checkbox(
+                    label="Em fluxo: para árvores muito grandes, grava os resultados durante a comparação",
+                    value=False
+                )),
                 ft.Text("Selecione a pasta para comparar com a pasta atual:"),
                 ft.ElevatedButton(
                     "Selecionar Pasta para Comparação",
                     icon=ft.Icons.FOLDER_OPEN,
                     on_click=lambda e: selecionar_pasta_comparacao()
                 ),
+                ft.TextButton(
+                    "Comparar com uma exportação",
+                    icon=ft.Icons.FILE_OPEN,
+                    on_click=lambda e: selecionar_pasta_comparacao(exportacao=True)
+                ),
                 ft.Row([
                     ft.Text("Pasta atual: "),
                     ft.Text(txt_pasta.value, color=ft.Colors.BLUE, italic=True)
@@ -176,6 +342,7 @@ def main(page: ft.Page):
                     (txt_pasta_comp := ft.Text("Não selecionada", color=ft.Colors.GREY, italic=True))
                 ]),
                 (progress_comp := ft.ProgressBar(width=400, visible=False)),
+                (progresso_lados := ft.Text("", size=12, visible=False)),
                 (container_resultado_comp := ft.Container(
                     height=300,
                     content=(resultado_comp := ft.Column([], scroll=ft.ScrollMode.ALWAYS)),
@@ -195,59 +362,182 @@ def main(page: ft.Page):
             page.update()
         
         # Função para selecionar pasta de comparação
-        def selecionar_pasta_comparacao():
+        def selecionar_pasta_comparacao(exportacao=False):
             def on_result(e):
-                if e.path:
+                caminho = e.files[0].path if exportacao and e.files else e.path
+                if caminho:
                     # Atualiza o texto da pasta de comparação
-                    txt_pasta_comp.value = e.path
+                    txt_pasta_comp.value = caminho
                     page.update()
                     
                     # Inicia a comparação
-                    realizar_comparacao(txt_pasta.value, e.path)
+                    realizar_comparacao(txt_pasta.value, caminho)
             
             file_picker.on_result = on_result
-            file_picker.get_directory_path()
+            if exportacao:
+                file_picker.pick_files(allowed_extensions=["fsnap", "json", "ndjson"])
+            else:
+                file_picker.get_directory_path()
+        
+        def linha_diferenca(diff):
+            if diff["tipo"] == "ausente_1":
+                return ft.Text(f"• Ausente na pasta 1: {diff['caminho']}", color=ft.Colors.RED_400)
+            if diff["tipo"] == "ausente_2":
+                return ft.Text(f"• Ausente na pasta 2: {diff['caminho']}", color=ft.Colors.BLUE_400)
+            return ft.Text(f"• Modificado: {diff['caminho']} ({diff['motivo']})")
+        
+        def linhas_resumo(stats, total, modo):
+            linhas = [
+                ft.Text(f"Resumo da comparação:", weight=ft.FontWeight.BOLD, size=16),
+                ft.Text(f"• Total de arquivos na pasta 1: {stats['pasta1']['arquivos']}"),
+                ft.Text(f"• Total de arquivos na pasta 2: {stats['pasta2']['arquivos']}"),
+                ft.Text(f"• Total de pastas na pasta 1: {stats['pasta1']['pastas']}"),
+                ft.Text(f"• Total de pastas na pasta 2: {stats['pasta2']['pastas']}"),
+                ft.Text(f"• Diferenças encontradas: {total}")
+            ]
+            if modo != (modo_comp.value or MODO_METADADOS):
+                linhas.append(
+                    ft.Text("• Exportações não têm o conteúdo dos arquivos: comparação por tamanho e data", italic=True)
+                )
+            return linhas
+        
+        def comparar_em_fluxo(pasta1, pasta2, token, ao_progredir_lado):
+            """Compara por merge-join, mostrando e gravando as diferenças à medida que aparecem"""
+            caminho = caminho_exportacao(pasta1, pasta2)
+            container_resultado_comp.visible = True
+            resultado_comp.controls.clear()
+            contador = ft.Text("Diferenças encontradas: 0", weight=ft.FontWeight.BOLD, size=16)
+            resultado_comp.controls.append(contador)
+            linhas = []
+            total = [0]
+            ultimo_aviso = [0.0]
+            
+            def ao_diferenca(diff):
+                total[0] += 1
+                if len(linhas) < 50:  # Limita a 50 diferenças para performance
+                    linhas.append(linha_diferenca(diff))
+                    resultado_comp.controls.append(linhas[-1])
+                agora = time.monotonic()
+                if agora - ultimo_aviso[0] >= INTERVALO_PROGRESSO:
+                    ultimo_aviso[0] = agora
+                    contador.value = f"Diferenças encontradas: {total[0]}"
+                    page.update()
+            
+            comparacao = None
+            try:
+                snapshot1, snapshot2 = obter_snapshots(pasta1, pasta2, token, ao_progredir_lado)
+                progress_comp.value = None
+                progresso_lados.value = "Comparando..."
+                page.update()
+                comparacao = ComparacaoEmFluxo(snapshot1, snapshot2, token, modo_comp.value or MODO_METADADOS)
+                exportar_em_fluxo(comparacao, caminho, pasta1, pasta2, ao_diferenca)
+            except OperacaoCancelada:
+                comparacao = None
+            finally:
+                finalizar_tarefa("comparacao", token)
+            
+            resultado_comp.controls.clear()
+            if comparacao is None:
+                resultado_comp.controls.append(ft.Text("Comparação cancelada.", italic=True))
+            else:
+                resultado_comp.controls.extend(linhas_resumo(comparacao.stats, total[0], comparacao.modo))
+                if total[0]:
+                    resultado_comp.controls.append(ft.Divider())
+                    resultado_comp.controls.append(
+                        ft.Text("Diferenças encontradas:", weight=ft.FontWeight.BOLD, size=16)
+                    )
+                    resultado_comp.controls.extend(linhas)
+                    if total[0] > len(linhas):
+                        resultado_comp.controls.append(
+                            ft.Text(f"... e mais {total[0] - len(linhas)} diferenças não mostradas", italic=True)
+                        )
+                else:
+                    resultado_comp.controls.append(
+                        ft.Text("As estruturas das pastas são idênticas!", color=ft.Colors.GREEN)
+                    )
+                resultado_comp.controls.append(ft.Divider())
+                resultado_comp.controls.append(ft.Text(f"Resultados gravados em: {caminho}", size=12, selectable=True))
+                resultado_comp.controls.append(
+                    ft.ElevatedButton(
+                        "Abrir Resultados",
+                        icon=ft.Icons.OPEN_IN_NEW,
+                        on_click=lambda e: os.startfile(caminho)
+                    )
+                )
+            
+            progress_comp.visible = False
+            progresso_lados.visible = False
+            page.dialog = dlg
+            page.dialog.open = True
+            page.update()
         
         # Função para realizar comparação
         def realizar_comparacao(pasta1, pasta2):
             # Mostra a barra de progresso
+            progress_comp.value = None
             progress_comp.visible = True
+            progresso_lados.visible = True
+            progresso_lados.value = ""
             page.update()
             
-            # Gera a estrutura das pastas
-            estrutura1 = gerar_estrutura_para_comparacao(pasta1)
-            estrutura2 = gerar_estrutura_para_comparacao(pasta2)
+            # Progresso de cada lado: (fração, entradas)
+            lados = [(0.0, 0), (0.0, 0)]
+            
+            def ao_progredir_lado(lado, fracao, entradas):
+                # As duas pastas são varridas ao mesmo tempo
+                lados[lado] = (fracao, entradas)
+                progress_comp.value = (lados[0][0] + lados[1][0]) / 2
+                progresso_lados.value = " • ".join(
+                    f"Pasta {i + 1}: {f * 100:.0f}% ({n} entradas)" for i, (f, n) in enumerate(lados)
+                )
+                page.update()
+            
+            ultimo_aviso = [0.0]
+            
+            def ao_progredir(feitos, total):
+                # Avança a barra durante a leitura do conteúdo dos arquivos
+                agora = time.monotonic()
+                if agora - ultimo_aviso[0] < INTERVALO_PROGRESSO and feitos < total:
+                    return
+                ultimo_aviso[0] = agora
+                progress_comp.value = feitos / max(total, 1)
+                progresso_lados.value = f"Comparando conteúdo: {feitos}/{total} arquivos"
+                page.update()
             
-            # Compara as estruturas
-            resultados = comparar_estruturas(estrutura1, estrutura2, pasta1, pasta2)
+            token = iniciar_tarefa("comparacao", "Comparação de pastas")
+            if fluxo_comp.value:
+                comparar_em_fluxo(pasta1, pasta2, token, ao_progredir_lado)
+                return
+            try:
+                # Varre as duas pastas ao mesmo tempo
+                estrutura1, estrutura2 = gerar_estruturas(pasta1, pasta2, token, ao_progredir_lado)
+                progress_comp.value = None
+                page.update()
+                
+                # Compara as estruturas
+                resultados = comparar_estruturas(estrutura1, estrutura2, pasta1, pasta2, token,
+                                                 modo_comp.value or MODO_METADADOS, ao_progredir)
+            except OperacaoCancelada:
+                resultados = None
+            finally:
+                finalizar_tarefa("comparacao", token)
             
             # Exibe os resultados
             container_resultado_comp.visible = True
             resultado_comp.controls.clear()
             
-            if not resultados["diferenças"]:
+            if resultados is None:
+                resultado_comp.controls.append(
+                    ft.Text("Comparação cancelada.", italic=True)
+                )
+            elif not resultados["diferenças"]:
                 resultado_comp.controls.append(
                     ft.Text("As estruturas das pastas são idênticas!", color=ft.Colors.GREEN)
                 )
             else:
                 # Título e resumo
-                resultado_comp.controls.append(
-                    ft.Text(f"Resumo da comparação:", weight=ft.FontWeight.BOLD, size=16)
-                )
-                resultado_comp.controls.append(
-                    ft.Text(f"• Total de arquivos na pasta 1: {resultados['stats']['pasta1']['arquivos']}")
-                )
-                resultado_comp.controls.append(
-                    ft.Text(f"• Total de arquivos na pasta 2: {resultados['stats']['pasta2']['arquivos']}")
-                )
-                resultado_comp.controls.append(
-                    ft.Text(f"• Total de pastas na pasta 1: {resultados['stats']['pasta1']['pastas']}")
-                )
-                resultado_comp.controls.append(
-                    ft.Text(f"• Total de pastas na pasta 2: {resultados['stats']['pasta2']['pastas']}")
-                )
-                resultado_comp.controls.append(
-                    ft.Text(f"• Diferenças encontradas: {len(resultados['diferenças'])}")
+                resultado_comp.controls.extend(
+                    linhas_resumo(resultados["stats"], len(resultados["diferenças"]), resultados["modo"])
                 )
                 
                 resultado_comp.controls.append(ft.Divider())
@@ -256,19 +546,8 @@ def main(page: ft.Page):
                 )
                 
                 # Lista as diferenças
-                for i, diff in enumerate(resultados["diferenças"][:50]):  # Limita a 50 diferenças para performance
-                    if diff["tipo"] == "ausente_1":
-                        resultado_comp.controls.append(
-                            ft.Text(f"• Ausente na pasta 1: {diff['caminho']}", color=ft.Colors.RED_400)
-                        )
-                    elif diff["tipo"] == "ausente_2":
-                        resultado_comp.controls.append(
-                            ft.Text(f"• Ausente na pasta 2: {diff['caminho']}", color=ft.Colors.BLUE_400)
-                        )
-                    elif diff["tipo"] == "modificado":
-                        resultado_comp.controls.append(
-                            ft.Text(f"• Modificado: {diff['caminho']} (tamanho, data)")
-                        )
+                for diff in resultados["diferenças"][:50]:  # Limita a 50 diferenças para performance
+                    resultado_comp.controls.append(linha_diferenca(diff))
                 
                 # Se houver mais diferenças, mostrar aviso
                 if len(resultados["diferenças"]) > 50:
@@ -288,6 +567,7 @@ def main(page: ft.Page):
             
             # Esconde a barra de progresso
             progress_comp.visible = False
+            progresso_lados.visible = False
             page.update()
             
             # Exibe o diálogo
@@ -295,114 +575,11 @@ def main(page: ft.Page):
             page.dialog.open = True
             page.update()
     
-    def gerar_estrutura_para_comparacao(pasta_raiz):
-        """Gera um dicionário com a estrutura da pasta para comparação"""
-        estrutura = {
-            "pastas": {},
-            "arquivos": {},
-            "stats": {"pastas": 0, "arquivos": 0}
-        }
-        
-        for root, dirs, files in os.walk(pasta_raiz):
-            caminho_relativo = os.path.relpath(root, pasta_raiz)
-            if caminho_relativo == ".":
-                caminho_relativo = ""
-            
-            # Registra a pasta
-            if caminho_relativo:
-                estrutura["pastas"][caminho_relativo] = {
-                    "modificado": os.path.getmtime(root)
-                }
-                estrutura["stats"]["pastas"] += 1
-            
-            # Registra os arquivos
-            for file in files:
-                file_path = os.path.join(root, file)
-                file_relpath = os.path.join(caminho_relativo, file).replace("\\", "/")
-                
-                try:
-                    estrutura["arquivos"][file_relpath] = {
-                        "tamanho": os.path.getsize(file_path),
-                        "modificado": os.path.getmtime(file_path)
-                    }
-                    estrutura["stats"]["arquivos"] += 1
-                except Exception as e:
-                    print(f"Erro ao processar arquivo {file_path}: {e}")
-        
-        return estrutura
-    
-    def comparar_estruturas(estrutura1, estrutura2, pasta1, pasta2):
-        """Compara duas estruturas de pastas e retorna as diferenças"""
-        resultados = {
-            "stats": {
-                "pasta1": estrutura1["stats"],
-                "pasta2": estrutura2["stats"]
-            },
-            "diferenças": []
-        }
-        
-        # Compara arquivos
-        for arquivo, info in estrutura1["arquivos"].items():
-            if arquivo not in estrutura2["arquivos"]:
-                resultados["diferenças"].append({
-                    "tipo": "ausente_2",
-                    "caminho": arquivo
-                })
-            else:
-                # Verifica se o arquivo foi modificado
-                info2 = estrutura2["arquivos"][arquivo]
-                if info["tamanho"] != info2["tamanho"] or abs(info["modificado"] - info2["modificado"]) > 1:
-                    resultados["diferenças"].append({
-                        "tipo": "modificado",
-                        "caminho": arquivo,
-                        "diferença": {
-                            "tamanho1": info["tamanho"],
-                            "tamanho2": info2["tamanho"],
-                            "modificado1": info["modificado"],
-                            "modificado2": info2["modificado"]
-                        }
-                    })
-        
-        # Verifica arquivos presentes em estrutura2 mas não em estrutura1
-        for arquivo in estrutura2["arquivos"]:
-            if arquivo not in estrutura1["arquivos"]:
-                resultados["diferenças"].append({
-                    "tipo": "ausente_1",
-                    "caminho": arquivo
-                })
-        
-        # Compara pastas
-        for pasta in estrutura1["pastas"]:
-            if pasta not in estrutura2["pastas"]:
-                resultados["diferenças"].append({
-                    "tipo": "ausente_2",
-                    "caminho": pasta + "/"
-                })
-        
-        for pasta in estrutura2["pastas"]:
-            if pasta not in estrutura1["pastas"]:
-                resultados["diferenças"].append({
-                    "tipo": "ausente_1",
-                    "caminho": pasta + "/"
-                })
-        
-        # Ordena as diferenças por caminho
-        resultados["diferenças"].sort(key=lambda x: x["caminho"])
-        
-        return resultados
-    
     def exportar_resultados_comparacao(resultados, pasta1, pasta2):
         """Exporta os resultados da comparação para um arquivo JSON"""
         try:
-            # Gera nome do arquivo baseado nas pastas
-            nome_pasta1 = os.path.basename(pasta1)
-            nome_pasta2 = os.path.basename(pasta2)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # Diretório de saída será o mesmo da pasta1
-            diretorio_saida = os.path.dirname(pasta1)
-            nome_arquivo = f"comparacao_{nome_pasta1}_vs_{nome_pasta2}_{timestamp}.json"
-            caminho_completo = os.path.join(diretorio_saida, nome_arquivo)
+            # Gera nome do arquivo baseado nas pastas, no mesmo diretório da pasta1
+            caminho_completo = caminho_exportacao(pasta1, pasta2)
             
             # Dados para exportar
             dados_exportacao = {
@@ -436,9 +613,34 @@ def main(page: ft.Page):
     btn_export_pdf = ft.ElevatedButton("Exportar PDF", on_click=lambda e: exportar_para_pdf(txt_pasta, page))
     btn_export_md = ft.ElevatedButton("Exportar Markdown", on_click=lambda e: exportar_para_md(txt_pasta, page))
     btn_export_json = ft.ElevatedButton("Exportar JSON", on_click=lambda e: exportar_para_json(txt_pasta, page))
+    btn_export_ndjson = ft.ElevatedButton("Exportar NDJSON", on_click=lambda e: exportar_para_ndjson(txt_pasta, page))
+    btn_export_snapshot = ft.ElevatedButton("Exportar snapshot", on_click=lambda e: exportar_para_snapshot(txt_pasta, page))
+    btn_export_tudo = ft.ElevatedButton("Exportar tudo", on_click=lambda e: exportar_tudo(txt_pasta, page))
     btn_zipar = ft.ElevatedButton("Compactar ZIP", on_click=lambda e: zipar_pasta(txt_pasta, page))
     btn_stats = ft.ElevatedButton("📊 Estatísticas", on_click=lambda e: gerar_estatisticas(txt_pasta, page))
+    btn_duplicados = ft.ElevatedButton("🧬 Duplicados", on_click=lambda e: gerar_duplicados(txt_pasta, page), tooltip="Procurar arquivos duplicados")
     btn_comparar = ft.ElevatedButton("🔄 Comparar", on_click=comparar_pastas, tooltip="Comparar com outra pasta")
+    btn_observar = ft.IconButton(
+        icon=ft.Icons.VISIBILITY if config.get("modo_observacao", False) else ft.Icons.VISIBILITY_OFF,
+        on_click=alternar_observacao,
+        tooltip="Observar alterações da pasta em tempo real"
+    )
+    btn_cancelar = ft.IconButton(
+        icon=ft.Icons.CANCEL,
+        icon_color=ft.Colors.RED_400,
+        on_click=lambda e: cancelar_tarefas(),
+        tooltip="Cancelar operações em andamento",
+        visible=False
+    )
+    
+    def ao_mudar_tarefas(ativas):
+        # Mostra o botão de cancelar apenas enquanto houver operações em andamento
+        btn_cancelar.visible = bool(ativas)
+        btn_cancelar.tooltip = "Cancelar: " + ", ".join(ativas) if ativas else "Cancelar operações em andamento"
+        if btn_cancelar.page:
+            btn_cancelar.update()
+    
+    observar_tarefas(ao_mudar_tarefas)
     btn_tema = ft.IconButton(
         icon=ft.Icons.DARK_MODE if config.get("tema_escuro", True) else ft.Icons.LIGHT_MODE,
         on_click=alternar_tema,
@@ -463,12 +665,15 @@ def main(page: ft.Page):
     seletor_pasta = ft.Container(
         content=ft.Row([
             ft.ElevatedButton("Selecionar Pasta", icon=ft.Icons.FOLDER_OPEN, on_click=selecionar_pasta),
+            ft.ElevatedButton("Abrir exportação", icon=ft.Icons.FILE_OPEN, on_click=abrir_exportacao),
             txt_pasta,
             ft.IconButton(
                 icon=ft.Icons.REFRESH,
                 tooltip="Atualizar visualização (F5)",
                 on_click=atualizar_visualizacao
-            )
+            ),
+            btn_observar,
+            btn_cancelar
         ]),
         padding=10,
         bgcolor=ft.Colors.BLUE_GREY_800,
@@ -509,7 +714,7 @@ def main(page: ft.Page):
     # Barra de ações
     barra_acoes = ft.Container(
         content=ft.Row(
-            [btn_export_txt, btn_export_pdf, btn_export_md, btn_export_json, btn_zipar, btn_stats, btn_comparar],
+            [btn_export_txt, btn_export_pdf, btn_export_md, btn_export_json, btn_export_ndjson, btn_export_snapshot, btn_export_tudo, btn_zipar, btn_stats, btn_duplicados, btn_comparar],
             scroll=ft.ScrollMode.ALWAYS,
             alignment=ft.MainAxisAlignment.CENTER
         ),
@@ -559,4 +764,7 @@ def main(page: ft.Page):
     page.add(layout)
     page.update()
 
-ft.app(target=main)
\ No newline at end of file
+if __name__ == "__main__":
+    # Necessário para os processos de exportação no executável empacotado
+    multiprocessing.freeze_support()
+    ft.app(target=main)
@@ -0,0 +1,63 @@
+"""Mede a velocidade (linhas/s) das exportações TXT e Markdown.
+
+Uso, a partir da raiz do projeto:
+
+    python scripts/benchmark_exportacao.py            # árvore sintética (1.010.101 entradas)
+    python scripts/benchmark_exportacao.py PASTA      # uma pasta real
+
+A árvore sintética tem 100 x 100 pastas com 100 arquivos cada e é montada
+direto em memória, sem tocar no disco; só a gravação dos arquivos
+exportados (numa pasta temporária) entra na medição.
+"""
+import os
+import stat
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.exporter import TAMANHO_BUFFER, escrever_md, escrever_txt
+from utils.scanner import SnapshotArvore, obter_snapshot
+
+EXTENSOES = [".py", ".txt", ".jpg", ".md", ".zip", ".mp3", ""]
+
+def arvore_sintetica(pastas_nivel1=100, pastas_nivel2=100, arquivos_por_pasta=100):
+    """Snapshot com dois níveis de pastas e arquivos no terceiro"""
+    snapshot = SnapshotArvore("/sintetico/raiz")
+    modo_pasta = stat.S_IFDIR | 0o755
+    modo_arquivo = stat.S_IFREG | 0o644
+    snapshot.adicionar("raiz", -1, modo_pasta, 0, 0)
+    fila = [(0, 1)]
+    for pai, nivel in fila:
+        snapshot.primeiro_filho[pai] = len(snapshot)
+        if nivel < 3:
+            snapshot.qtd_filhos[pai] = pastas_nivel1 if nivel == 1 else pastas_nivel2
+            for k in range(snapshot.qtd_filhos[pai]):
+                fila.append((snapshot.adicionar(f"pasta_{nivel}_{k}", pai, modo_pasta, 0, 0), nivel + 1))
+        else:
+            snapshot.qtd_filhos[pai] = arquivos_por_pasta
+            for k in range(arquivos_por_pasta):
+                snapshot.adicionar(f"arquivo_{k}{EXTENSOES[k % len(EXTENSOES)]}", pai, modo_arquivo, k, 0)
+    snapshot.tabela_nomes.congelar()
+    return snapshot
+
+def medir(escrever, snapshot, caminho):
+    inicio = time.perf_counter()
+    with open(caminho, "w", encoding="utf-8", buffering=TAMANHO_BUFFER) as arquivo:
+        escrever(snapshot, arquivo)
+    duracao = time.perf_counter() - inicio
+    with open(caminho, encoding="utf-8") as arquivo:
+        linhas = sum(1 for _ in arquivo)
+    return linhas, duracao
+
+def main():
+    snapshot = obter_snapshot(sys.argv[1]) if len(sys.argv) > 1 else arvore_sintetica()
+    print(f"Entradas: {len(snapshot):,}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome, escrever, extensao in (("TXT", escrever_txt, "txt"), ("MD", escrever_md, "md")):
+            linhas, duracao = medir(escrever, snapshot, os.path.join(pasta, f"arvore.{extensao}"))
+            print(f"{nome}: {linhas:,} linhas em {duracao:.2f}s ({linhas / duracao:,.0f} linhas/s)")
+
+if __name__ == "__main__":
+    main()
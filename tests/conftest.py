@@ -0,0 +1,79 @@
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scanner import escanear
+
+# Árvore usada pela maioria dos testes: pastas são dicts, arquivos são bytes
+ESTRUTURA = {
+    "Src": {
+        "a.py": b"x" * 20,
+        "b.txt": b"",
+        "sub": {"c.py": b"y" * 5, "dados.bin": b"z" * 300},
+    },
+    "docs": {"leia.md": b"# leia\n", "vazia": {}},
+    "z.log": b"1" * 100,
+}
+
+def criar_arvore(raiz, estrutura):
+    """Cria em ``raiz`` as pastas e arquivos descritos em ``estrutura``"""
+    for nome, conteudo in estrutura.items():
+        caminho = os.path.join(raiz, nome)
+        if isinstance(conteudo, dict):
+            os.makedirs(caminho, exist_ok=True)
+            criar_arvore(caminho, conteudo)
+        else:
+            with open(caminho, "wb") as arquivo:
+                arquivo.write(conteudo)
+
+def alterar_arvore(raiz):
+    """Altera a árvore ESTRUTURA em ``raiz`` (inclusões, remoções e uma edição).
+
+    O mtime das pastas alteradas é adiantado explicitamente: em alguns
+    sistemas de arquivos ele tem resolução grossa e poderia não mudar.
+    """
+    caminho = lambda *partes: os.path.join(raiz, *partes)
+    with open(caminho("Src", "sub", "novo.py"), "wb") as arquivo:
+        arquivo.write(b"n" * 7)
+    os.remove(caminho("Src", "b.txt"))
+    shutil.rmtree(caminho("docs", "vazia"))
+    criar_arvore(caminho("docs"), {"nova": {"dentro": {"x.txt": b"xx"}}})
+    with open(caminho("z.log"), "ab") as arquivo:
+        arquivo.write(b"2" * 50)
+    adiantado = time.time() + 10
+    for pasta in (caminho("Src", "sub"), caminho("Src"), caminho("docs"), raiz):
+        os.utime(pasta, (adiantado, adiantado))
+
+def entradas(snapshot):
+    """Conjunto (caminho, pasta?, tamanho, mtime) das entradas, sem a raiz.
+
+    Também confere a estrutura: os filhos de cada pasta são contíguos e
+    apontam para ela como pai.
+    """
+    for indice in range(len(snapshot)):
+        for filho in snapshot.filhos(indice):
+            assert snapshot.pais[filho] == indice
+    resultado = set()
+    for indice, _, _ in snapshot.percorrer():
+        eh_pasta = snapshot.eh_pasta(indice)
+        resultado.add((snapshot.caminho_relativo(indice).replace(os.sep, "/"), eh_pasta,
+                       0 if eh_pasta else snapshot.tamanhos[indice], snapshot.mtimes[indice]))
+    assert len(resultado) == len(snapshot) - 1
+    return resultado
+
+@pytest.fixture
+def pasta(tmp_path):
+    """Pasta temporária com a árvore ESTRUTURA"""
+    raiz = tmp_path / "raiz"
+    raiz.mkdir()
+    criar_arvore(str(raiz), ESTRUTURA)
+    return str(raiz)
+
+@pytest.fixture
+def snapshot(pasta):
+    return escanear(pasta, workers=1)
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from utils.arquivo_snapshot import (ErroArquivoSnapshot, abrir_exportacao, abrir_snapshot, eh_exportacao,
+                                    gravar_snapshot)
+from utils.exporter import escrever_json, escrever_ndjson
+from utils.jobs import OperacaoCancelada, TokenCancelamento
+
+def arvore(snapshot, precisao_mtime=1):
+    """Entradas em pré-ordem: (nível, nome, pasta?, tamanho, mtime arredondado, erro)"""
+    resultado = [(0, None, True, 0, None, snapshot.erros.get(0))]
+    for indice, nivel, _ in snapshot.percorrer():
+        eh_pasta = snapshot.eh_pasta(indice)
+        resultado.append((nivel + 1, snapshot.nomes[indice], eh_pasta, 0 if eh_pasta else snapshot.tamanhos[indice],
+                          int(snapshot.mtimes[indice] // precisao_mtime), snapshot.erros.get(indice)))
+    return resultado
+
+def test_fsnap_ida_e_volta(snapshot, tmp_path):
+    snapshot.erros[snapshot.localizar("docs/vazia")] = "Sem permissão de acesso"
+    caminho = str(tmp_path / "arvore.fsnap")
+    gravar_snapshot(snapshot, caminho)
+    assert sorted(os.listdir(tmp_path)) == ["arvore.fsnap", "raiz"]
+    with abrir_snapshot(caminho) as aberto:
+        assert aberto.raiz == snapshot.raiz
+        for nome, _ in snapshot.COLUNAS:
+            assert list(getattr(aberto, nome)) == list(getattr(snapshot, nome))
+        assert aberto.erros == snapshot.erros
+        assert aberto.localizar("Src/sub/c.py") == snapshot.localizar("Src/sub/c.py")
+    with pytest.raises(ValueError):
+        aberto.nomes[1]
+
+def test_fsnap_invalido(tmp_path):
+    caminho = tmp_path / "ruim.fsnap"
+    caminho.write_bytes(b"nada disso")
+    with pytest.raises(ErroArquivoSnapshot):
+        abrir_snapshot(str(caminho))
+
+def test_fsnap_cancelado_nao_deixa_temporario(snapshot, tmp_path):
+    token = TokenCancelamento()
+    token.cancelar()
+    with pytest.raises(OperacaoCancelada):
+        gravar_snapshot(snapshot, str(tmp_path / "arvore.fsnap"), token)
+    assert os.listdir(tmp_path) == ["raiz"]
+
+@pytest.mark.parametrize("ext, escrever", [("json", escrever_json), ("ndjson", escrever_ndjson)])
+def test_exportacao_ida_e_volta(snapshot, tmp_path, ext, escrever):
+    snapshot.erros[snapshot.localizar("docs/vazia")] = "Sem permissão de acesso"
+    caminho = str(tmp_path / f"arvore.{ext}")
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        escrever(snapshot, arquivo)
+    assert eh_exportacao(caminho)
+    aberto = abrir_exportacao(caminho)
+    assert aberto.exportacao == caminho
+    assert aberto.raiz == snapshot.raiz
+    # As exportações guardam a data em segundos
+    assert arvore(aberto) == arvore(snapshot)
+    assert aberto.caminho(aberto.localizar("Src/sub/c.py")) == snapshot.caminho(snapshot.localizar("Src/sub/c.py"))
+
+def test_exportacao_de_formato_desconhecido(tmp_path):
+    caminho = tmp_path / "arvore.txt"
+    caminho.write_text("nada")
+    assert not eh_exportacao(str(caminho))
+    with pytest.raises(ErroArquivoSnapshot):
+        abrir_exportacao(str(caminho))
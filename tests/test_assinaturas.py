@@ -0,0 +1,30 @@
+from conftest import alterar_arvore
+from utils import assinaturas as modulo
+from utils.assinaturas import assinaturas_de
+from utils.scanner import atualizar_snapshot, escanear
+
+def test_pastas_iguais_tem_a_mesma_assinatura(pasta):
+    primeira = escanear(pasta, workers=1)
+    segunda = escanear(pasta, workers=1)
+    assinaturas1, assinaturas2 = assinaturas_de(primeira), assinaturas_de(segunda)
+    for indice in primeira.pastas():
+        assert assinaturas1.assinatura(indice) == assinaturas2.assinatura(indice)
+    assert assinaturas1.contagem(0) == (6, 4)
+    assert assinaturas1.contagem(primeira.localizar("docs/vazia")) == (0, 0)
+
+def test_alteracao_muda_so_os_ancestrais(snapshot, pasta):
+    antes = assinaturas_de(snapshot)
+    alterar_arvore(pasta)
+    novo = atualizar_snapshot(snapshot, workers=1)
+    depois = assinaturas_de(novo)
+    assert depois.assinatura(0) != antes.assinatura(0)
+    assert depois.assinatura(novo.localizar("Src/sub")) != antes.assinatura(snapshot.localizar("Src/sub"))
+
+def test_assinaturas_incrementais_iguais_ao_recalculo(snapshot, pasta):
+    assinaturas_de(snapshot)
+    alterar_arvore(pasta)
+    novo = atualizar_snapshot(snapshot, workers=1)
+    # Derivadas pelo ouvinte da varredura
+    derivadas = modulo._ASSINATURAS[novo]
+    assert assinaturas_de(novo) is derivadas
+    assert derivadas.subarvores == modulo._assinar_tudo(novo).subarvores
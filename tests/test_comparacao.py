@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import ESTRUTURA, criar_arvore
+from utils.comparacao import (MODO_CONTEUDO, MODO_METADADOS, ComparacaoEmFluxo, comparar_estruturas)
+from utils.scanner import escanear
+
+@pytest.fixture
+def pastas(tmp_path):
+    """Duas cópias de ESTRUTURA com algumas diferenças entre elas"""
+    pasta1, pasta2 = str(tmp_path / "um"), str(tmp_path / "dois")
+    criar_arvore(pasta1, ESTRUTURA)
+    shutil.copytree(pasta1, pasta2, copy_function=shutil.copy2)
+    with open(os.path.join(pasta2, "Src", "a.py"), "ab") as arquivo:
+        arquivo.write(b"mais")
+    os.remove(os.path.join(pasta2, "Src", "b.txt"))
+    criar_arvore(pasta2, {"extra": {"e.txt": b"e"}, "docs": {"vazia": {"v": b""}}})
+    # Mesmo tamanho e conteúdo, data diferente
+    data = os.path.getmtime(os.path.join(pasta1, "z.log")) - 3600
+    os.utime(os.path.join(pasta2, "z.log"), (data, data))
+    return pasta1, pasta2
+
+def diferencas(pasta1, pasta2, modo=MODO_METADADOS, **opcoes):
+    comparacao = ComparacaoEmFluxo(escanear(pasta1, workers=1), escanear(pasta2, workers=1), modo=modo, **opcoes)
+    return list(comparacao), comparacao
+
+def resumo(lista):
+    return [(d["tipo"], d["caminho"], d.get("motivo")) for d in lista]
+
+def test_diferencas_em_fluxo(pastas):
+    lista, comparacao = diferencas(*pastas)
+    assert sorted(resumo(lista)) == sorted([
+        ("modificado", "Src/a.py", "tamanho"),
+        ("ausente_2", "Src/b.txt", None),
+        ("ausente_1", "docs/vazia/v", None),
+        ("ausente_1", "extra/", None),
+        ("ausente_1", "extra/e.txt", None),
+        ("modificado", "z.log", "data"),
+    ])
+    # Src/sub é igual dos dois lados e foi pulada pela assinatura
+    assert comparacao.podadas == 1
+    assert comparacao.stats == {"pasta1": {"pastas": 4, "arquivos": 6}, "pasta2": {"pastas": 5, "arquivos": 7}}
+
+def test_fluxo_igual_a_comparacao_ordenada(pastas):
+    pasta1, pasta2 = pastas
+    lista, comparacao = diferencas(pasta1, pasta2)
+    estruturas = [{"snapshot": escanear(pasta, workers=1), "stats": {}} for pasta in pastas]
+    resultado = comparar_estruturas(*estruturas, pasta1, pasta2)
+    assert resultado["diferenças"] == sorted(lista, key=lambda d: d["caminho"])
+    assert resultado["modo"] == MODO_METADADOS
+
+def test_pastas_iguais_sem_diferencas(pasta):
+    lista, comparacao = diferencas(pasta, pasta)
+    assert lista == []
+    assert comparacao.podadas == 1
+    assert comparacao.stats["pasta1"] == {"pastas": 4, "arquivos": 6}
+
+@pytest.mark.parametrize("lote_conteudo", [1, None])
+def test_modo_conteudo(pastas, lote_conteudo):
+    pasta1, pasta2 = pastas
+    # Mesmo tamanho e data diferente, mas conteúdo diferente
+    caminho = os.path.join(pasta2, "Src", "sub", "c.py")
+    with open(caminho, "wb") as arquivo:
+        arquivo.write(b"w" * 5)
+    data = os.path.getmtime(caminho) + 3600
+    os.utime(caminho, (data, data))
+    lista, _ = diferencas(pasta1, pasta2, MODO_CONTEUDO, lote_conteudo=lote_conteudo, workers=1)
+    modificados = sorted(r for r in resumo(lista) if r[0] == "modificado")
+    # z.log só mudou de data: o conteúdo é o mesmo
+    assert modificados == [("modificado", "Src/a.py", "tamanho"), ("modificado", "Src/sub/c.py", "conteúdo")]
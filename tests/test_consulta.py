@@ -0,0 +1,43 @@
+import pytest
+
+from utils.consulta import Consulta, ErroConsulta, executar_consulta
+
+def caminhos(snapshot, texto):
+    return sorted(snapshot.caminho_relativo(i) for i in executar_consulta(snapshot, texto))
+
+def test_texto_e_extensao(snapshot):
+    assert caminhos(snapshot, "leia") == ["docs/leia.md"]
+    assert caminhos(snapshot, "ext:py") == ["Src/a.py", "Src/sub/c.py"]
+    assert caminhos(snapshot, "ext:py -name:c*") == ["Src/a.py"]
+
+def test_glob_e_regex(snapshot):
+    assert caminhos(snapshot, "*.log") == ["z.log"]
+    assert caminhos(snapshot, "re:/^[ab]\\./") == ["Src/a.py", "Src/b.txt"]
+    assert caminhos(snapshot, "type:d") == ["Src", "Src/sub", "docs", "docs/vazia"]
+
+@pytest.mark.parametrize("texto", ["size:>" + "9" * 400, "mtime:<" + "9" * 400 + "d"])
+def test_numero_grande_demais(texto):
+    with pytest.raises(ErroConsulta):
+        Consulta(texto)
+
+@pytest.mark.parametrize("texto", ["a[]b", "name:[z-a]", "path:src/[z-a]*", "*[z-a].py", "re:/(/"])
+def test_padrao_invalido_vira_erro_consulta(texto):
+    with pytest.raises(ErroConsulta):
+        Consulta(texto)
+
+def test_caminho_ignora_maiusculas_no_prefixo(snapshot):
+    assert caminhos(snapshot, "path:src/**") == ["Src/a.py", "Src/b.txt", "Src/sub", "Src/sub/c.py",
+                                                  "Src/sub/dados.bin"]
+    assert caminhos(snapshot, "path:SRC/*.py") == ["Src/a.py"]
+    assert caminhos(snapshot, "path:**/*.PY") == ["Src/a.py", "Src/sub/c.py"]
+
+def test_caminho_sem_curinga_inclui_a_propria_entrada(snapshot):
+    assert caminhos(snapshot, "path:Src/a.py") == ["Src/a.py"]
+    assert caminhos(snapshot, "path:src/sub") == ["Src/sub", "Src/sub/c.py", "Src/sub/dados.bin"]
+    assert caminhos(snapshot, "-path:src type:f") == ["docs/leia.md", "z.log"]
+    assert caminhos(snapshot, "path:nada/a.py") == []
+
+def test_tamanho_so_de_arquivos(snapshot):
+    assert caminhos(snapshot, "size:>10") == ["Src/a.py", "Src/sub/dados.bin", "z.log"]
+    assert caminhos(snapshot, "-size:>10") == ["Src/b.txt", "Src/sub/c.py", "docs/leia.md"]
+    assert caminhos(snapshot, "size:>100b ext:bin") == ["Src/sub/dados.bin"]
@@ -0,0 +1,39 @@
+from conftest import alterar_arvore
+from utils import estatisticas
+from utils.estatisticas import AgregadosEstatisticas, agregados_de, calcular_estatisticas
+from utils.scanner import atualizar_snapshot
+
+def totais(snapshot, agregados):
+    """Campos comparáveis dos agregados; notáveis pelo valor, não pelo índice"""
+    resultado = {campo: getattr(agregados, campo) for campo in AgregadosEstatisticas.SOMAS}
+    for campo in AgregadosEstatisticas.CONTAGENS:
+        resultado[campo] = +getattr(agregados, campo)
+    for campo, (coluna, _) in AgregadosEstatisticas.NOTAVEIS.items():
+        indice = agregados.notaveis[campo]
+        resultado[campo] = None if indice is None else getattr(snapshot, coluna)[indice]
+    return resultado
+
+def test_estatisticas(snapshot):
+    resultado = calcular_estatisticas(snapshot)
+    assert resultado["total_arquivos"] == 6
+    assert resultado["total_diretorios"] == 4
+    assert resultado["total_tamanho"] == 20 + 5 + 300 + 7 + 100
+    assert resultado["arquivos_vazios"] == 1
+    assert resultado["extensoes"][".py"] == 2
+    assert resultado["maior_arquivo"]["nome"] == "dados.bin"
+    assert resultado["profundidade_max"] == 2
+
+def test_agregados_incrementais_iguais_ao_recalculo(snapshot, pasta):
+    agregados_de(snapshot)
+    alterar_arvore(pasta)
+    novo = atualizar_snapshot(snapshot, workers=1)
+    # Derivados pelo ouvinte da varredura, sem percorrer a árvore toda
+    derivados = estatisticas._AGREGADOS[novo]
+    assert agregados_de(novo) is derivados
+    assert totais(novo, derivados) == totais(novo, estatisticas._agregar_tudo(novo))
+
+def test_sem_totais_anteriores_nada_e_derivado(snapshot, pasta):
+    alterar_arvore(pasta)
+    novo = atualizar_snapshot(snapshot, workers=1)
+    assert novo not in estatisticas._AGREGADOS
+    assert calcular_estatisticas(novo)["total_arquivos"] == 7
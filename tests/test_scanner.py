@@ -0,0 +1,57 @@
+import os
+
+from conftest import ESTRUTURA, alterar_arvore, entradas
+from utils import scanner
+from utils.scanner import atualizar_snapshot, escanear
+
+def test_varredura_completa(snapshot, pasta):
+    assert snapshot.raiz == pasta
+    assert [snapshot.nomes[i] for i in snapshot.filhos(0)] == ["Src", "docs", "z.log"]
+    # Pastas primeiro, depois arquivos, cada grupo em ordem alfabética
+    src = snapshot.localizar("Src")
+    assert [snapshot.nomes[i] for i in snapshot.filhos(src)] == ["sub", "a.py", "b.txt"]
+    assert snapshot.tamanhos[snapshot.localizar("Src/sub/dados.bin")] == 300
+    assert snapshot.localizar("Src/nada") is None
+    assert len(snapshot) == 1 + 10
+
+def test_varredura_paralela_igual_a_sequencial(pasta):
+    sequencial = escanear(pasta, workers=1)
+    paralela = escanear(pasta, workers=4)
+    assert list(paralela.ids_nomes) == list(sequencial.ids_nomes)
+    assert list(paralela.pais) == list(sequencial.pais)
+    assert entradas(paralela) == entradas(sequencial)
+
+def test_sem_alteracoes_reaproveita_o_snapshot(snapshot):
+    assert atualizar_snapshot(snapshot, workers=1) is snapshot
+
+def test_varredura_incremental_igual_a_completa(snapshot, pasta):
+    alterar_arvore(pasta)
+    incremental = atualizar_snapshot(snapshot, workers=1)
+    completa = escanear(pasta, workers=1)
+    assert incremental is not snapshot
+    assert entradas(incremental) == entradas(completa)
+    # Só as pastas cujo mtime mudou foram listadas de novo
+    relistadas = {incremental.caminho_relativo(i).replace(os.sep, "/") for i in incremental.pastas_listadas}
+    assert relistadas == {"", "Src", "Src/sub", "docs", "docs/nova", "docs/nova/dentro"}
+    assert "Src/b.txt" not in {caminho for caminho, *_ in entradas(incremental)}
+
+def test_tabela_de_nomes_do_snapshot_anterior_continua_valida(snapshot, pasta):
+    antes = entradas(snapshot)
+    alterar_arvore(pasta)
+    atualizar_snapshot(snapshot, workers=1)
+    assert entradas(snapshot) == antes
+
+def test_erro_de_leitura_fica_no_snapshot(pasta, monkeypatch):
+    listar = scanner.listar_pasta
+
+    def listar_com_erro(caminho):
+        if os.path.basename(caminho) == "sub":
+            raise PermissionError(caminho)
+        if os.path.basename(caminho) == "docs":
+            raise OSError(5, "Input/output error")
+        return listar(caminho)
+    monkeypatch.setattr(scanner, "listar_pasta", listar_com_erro)
+    snapshot = escanear(pasta, workers=1)
+    assert snapshot.erros[snapshot.localizar("Src/sub")] == "Sem permissão de acesso"
+    assert "Input/output error" in snapshot.erros[snapshot.localizar("docs")]
+    assert set(ESTRUTURA) == {snapshot.nomes[i] for i in snapshot.filhos(0)}
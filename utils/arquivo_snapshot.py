@@ -0,0 +1,437 @@
+"""Arquivos de snapshot: o formato binário (.fsnap) e a leitura de exportações.
+
+Uma exportação (.fsnap, JSON ou NDJSON) pode ser reaberta como um
+SnapshotArvore somente leitura, para navegar, ver estatísticas e comparar
+sem a pasta original (veja ``abrir_exportacao``).
+
+Formato binário, lido de volta com mmap.
+
+Layout do arquivo:
+
+    assinatura      8 bytes, b"FSNAP\\x00\\x00\\x01"
+    tam_cabecalho   uint32 little-endian
+    cabecalho       JSON UTF-8 com versao, ordem_bytes, raiz, entradas,
+                    gravado_em, erros ({indice: mensagem}) e colunas
+                    ([{nome, typecode, itemsize, inicio, tamanho}])
+    colunas         bytes brutos de cada coluna de ``para_colunas``
+                    (incluindo a tabela de nomes internados), cada uma
+                    começando em um múltiplo de 8
+
+As colunas são gravadas exatamente como estão na memória, então gravar é
+uma cópia direta e abrir é só mapear o arquivo: as colunas viram
+memoryviews sobre o mmap e as páginas são lidas do disco conforme o uso.
+"""
+import json
+import mmap
+import os
+import re
+import stat
+import struct
+import sys
+import time
+import weakref
+from array import array
+from utils.scanner import SnapshotArvore
+from utils.jobs import verificar
+
+EXTENSAO = "fsnap"
+ASSINATURA = b"FSNAP\x00\x00\x01"
+VERSAO = 1
+ALINHAMENTO = 8
+
+_TAMANHO = struct.Struct("<I")
+
+# Colunas gravadas além das de SnapshotArvore.COLUNAS
+_COLUNAS_NOMES = (("nomes_dados", "B"), ("nomes_inicios", "q"))
+
+class ErroArquivoSnapshot(ValueError):
+    """O arquivo não é um snapshot válido (ou é de uma versão incompatível)"""
+
+def _alinhar(posicao):
+    return -(-posicao // ALINHAMENTO) * ALINHAMENTO
+
+def _buffers(snapshot):
+    """Colunas do snapshot como objetos com o protocolo de buffer, sem cópia"""
+    buffers = [(nome, typecode, getattr(snapshot, nome)) for nome, typecode in SnapshotArvore.COLUNAS]
+    tabela = snapshot.tabela_nomes
+    buffers.append(("nomes_dados", "B", tabela.dados))
+    buffers.append(("nomes_inicios", "q", tabela.inicios))
+    return buffers
+
+def gravar_snapshot(snapshot, caminho, token=None):
+    """Grava ``snapshot`` em ``caminho`` no formato .fsnap.
+
+    O arquivo é montado num temporário ao lado do destino, removido se a
+    gravação falhar ou for cancelada.
+    """
+    buffers = _buffers(snapshot)
+    colunas = []
+    # O cabeçalho é montado com posições relativas ao fim dele mesmo, que
+    # só são conhecidas depois de serializá-lo; as posições absolutas são
+    # calculadas na leitura
+    posicao = 0
+    for nome, typecode, dados in buffers:
+        tamanho = memoryview(dados).nbytes
+        colunas.append({
+            "nome": nome,
+            "typecode": typecode,
+            "itemsize": array(typecode).itemsize,
+            "inicio": posicao,
+            "tamanho": tamanho,
+        })
+        posicao = _alinhar(posicao + tamanho)
+    cabecalho = json.dumps({
+        "versao": VERSAO,
+        "ordem_bytes": sys.byteorder,
+        "raiz": snapshot.raiz,
+        "entradas": len(snapshot),
+        "gravado_em": time.time(),
+        "erros": snapshot.erros,
+        "colunas": colunas,
+    }, ensure_ascii=False).encode("utf-8")
+
+    temporario = caminho + ".tmp"
+    try:
+        with open(temporario, "wb") as f:
+            f.write(ASSINATURA)
+            f.write(_TAMANHO.pack(len(cabecalho)))
+            f.write(cabecalho)
+            inicio_dados = _alinhar(f.tell())
+            for (_, _, dados), coluna in zip(buffers, colunas):
+                verificar(token)
+                f.seek(inicio_dados + coluna["inicio"])
+                f.write(dados)
+            f.truncate(inicio_dados + posicao)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+def ler_cabecalho(caminho):
+    """Lê apenas o cabeçalho de um arquivo .fsnap"""
+    with open(caminho, "rb") as f:
+        return _ler_cabecalho(f)[0]
+
+def _ler_cabecalho(f):
+    if f.read(len(ASSINATURA)) != ASSINATURA:
+        raise ErroArquivoSnapshot("Arquivo não é um snapshot do File Synapses")
+    tamanho, = _TAMANHO.unpack(f.read(_TAMANHO.size))
+    cabecalho = json.loads(f.read(tamanho).decode("utf-8"))
+    if cabecalho.get("versao") != VERSAO:
+        raise ErroArquivoSnapshot(f"Versão de snapshot não suportada: {cabecalho.get('versao')}")
+    return cabecalho, _alinhar(len(ASSINATURA) + _TAMANHO.size + tamanho)
+
+def abrir_snapshot(caminho):
+    """Abre um arquivo .fsnap como SnapshotArvore somente leitura.
+
+    Na mesma ordem de bytes da máquina, as colunas apontam diretamente
+    para o arquivo mapeado (nada é lido antes de ser usado); caso
+    contrário, são copiadas e convertidas. O arquivo fica mapeado até
+    ``snapshot.fechar()`` (ou o fim de um bloco ``with``) ou até o
+    snapshot ser descartado.
+    """
+    with open(caminho, "rb") as f:
+        cabecalho, inicio_dados = _ler_cabecalho(f)
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Toda visão sobre o mapa precisa ser liberada antes de fechá-lo
+    visoes = [memoryview(mapa)]
+    try:
+        mesma_ordem = cabecalho["ordem_bytes"] == sys.byteorder
+        colunas = {}
+        for coluna in cabecalho["colunas"]:
+            typecode = coluna["typecode"]
+            if array(typecode).itemsize != coluna["itemsize"]:
+                raise ErroArquivoSnapshot(f"Coluna {coluna['nome']} com tamanho de item incompatível")
+            inicio = inicio_dados + coluna["inicio"]
+            dados = visoes[0][inicio:inicio + coluna["tamanho"]]
+            visoes.append(dados)
+            if mesma_ordem:
+                colunas[coluna["nome"]] = dados.cast(typecode)
+                visoes.append(colunas[coluna["nome"]])
+            else:
+                convertida = array(typecode)
+                convertida.frombytes(dados)
+                convertida.byteswap()
+                colunas[coluna["nome"]] = memoryview(convertida)
+
+        esperadas = [nome for nome, _ in SnapshotArvore.COLUNAS] + [nome for nome, _ in _COLUNAS_NOMES]
+        if any(nome not in colunas for nome in esperadas):
+            raise ErroArquivoSnapshot("Snapshot incompleto")
+        erros = {int(indice): mensagem for indice, mensagem in cabecalho["erros"].items()}
+        snapshot = SnapshotArvore.de_buffers(cabecalho["raiz"], colunas, erros)
+    except BaseException:
+        _fechar_mapa(visoes, mapa)
+        raise
+    # O mapa é fechado em ``snapshot.fechar()`` ou, no mais tardar, quando o
+    # snapshot é descartado
+    snapshot._liberar = weakref.finalize(snapshot, _fechar_mapa, visoes, mapa)
+    return snapshot
+
+def _fechar_mapa(visoes, mapa):
+    """Libera as visões sobre o arquivo mapeado e fecha o mapa"""
+    for visao in reversed(visoes):
+        visao.release()
+    try:
+        mapa.close()
+    except BufferError:
+        # Ainda há uma visão em uso fora do snapshot; o mapa é fechado
+        # quando ela for descartada
+        pass
+
+# Leitura de exportações JSON e NDJSON
+
+# Texto lido por vez ao percorrer um JSON
+TAMANHO_LEITURA = 1024 * 1024
+
+# Entradas lidas entre duas verificações de cancelamento
+LOTE_LEITURA = 4096
+
+class _MontadorSnapshot:
+    """Monta um SnapshotArvore a partir de entradas em pré-ordem.
+
+    As exportações trazem a árvore em profundidade, mas o snapshot exige
+    que os filhos de cada pasta ocupem índices contíguos. Os filhos de uma
+    pasta ficam pendentes até ela ser fechada e então são gravados juntos;
+    só as pastas do caminho atual ficam em memória, além das colunas. Os
+    pais de cada entrada são preenchidos ao final.
+    """
+
+    def __init__(self, token=None):
+        self.snapshot = None
+        self._token = token
+        self._lidas = 0
+        # Pastas abertas: (linha, linhas dos filhos)
+        self._abertas = []
+        self._datas = {}
+
+    def _timestamp(self, data):
+        if not data:
+            return 0.0
+        valor = self._datas.get(data)
+        if valor is None:
+            try:
+                partes = [int(parte) for parte in re.split(r"[-: ]", data)]
+                valor = time.mktime((*partes[:6], 0, 0, -1))
+            except (ValueError, TypeError, OverflowError):
+                valor = 0.0
+            self._datas[data] = valor
+        return valor
+
+    def entrada(self, nivel, campos):
+        """Acrescenta uma entrada no ``nivel`` indicado (0 é a raiz).
+
+        Retorna a linha da entrada; o erro de leitura de uma pasta pode ser
+        definido depois, em ``linha[6]``, enquanto a pasta não for fechada.
+        """
+        self._lidas += 1
+        if self._lidas % LOTE_LEITURA == 0:
+            verificar(self._token)
+        caminho = campos.get("caminho") or ""
+        eh_pasta = campos.get("tipo") == "diretorio"
+        modo = (stat.S_IFDIR | 0o100) if eh_pasta else stat.S_IFREG
+        if campos.get("permissao_leitura"):
+            modo |= 0o400
+        if campos.get("permissao_escrita"):
+            modo |= 0o200
+        linha = [
+            campos.get("nome") or os.path.basename(caminho) or caminho,
+            modo,
+            campos.get("tamanho_bytes") or 0,
+            self._timestamp(campos.get("ultima_modificacao")),
+            0, 0,
+            campos.get("erro"),
+        ]
+        if nivel == 0:
+            if self.snapshot is not None:
+                raise ErroArquivoSnapshot("A exportação tem mais de uma raiz")
+            self.snapshot = SnapshotArvore(caminho or linha[0])
+            self.snapshot.adicionar(linha[0], -1, linha[1], linha[2], linha[3])
+        else:
+            if self.snapshot is None or len(self._abertas) < nivel:
+                raise ErroArquivoSnapshot("Entrada fora de uma pasta na exportação")
+            while len(self._abertas) > nivel:
+                self._fechar()
+            self._abertas[-1][1].append(linha)
+        if eh_pasta:
+            self._abertas.append((linha, []))
+        return linha
+
+    def _fechar(self):
+        linha, filhos = self._abertas.pop()
+        snapshot = self.snapshot
+        primeiro = len(snapshot)
+        for nome, modo, tamanho, mtime, primeiro_filho, qtd_filhos, erro in filhos:
+            indice = snapshot.adicionar(nome, 0, modo, tamanho, mtime)
+            snapshot.primeiro_filho[indice] = primeiro_filho
+            snapshot.qtd_filhos[indice] = qtd_filhos
+            if erro is not None:
+                snapshot.erros[indice] = erro
+        linha[4], linha[5] = primeiro, len(filhos)
+        if not self._abertas:
+            # Raiz
+            snapshot.primeiro_filho[0], snapshot.qtd_filhos[0] = primeiro, len(filhos)
+            if linha[6] is not None:
+                snapshot.erros[0] = linha[6]
+
+    def concluir(self):
+        """Fecha as pastas restantes e retorna o snapshot montado"""
+        if self.snapshot is None:
+            raise ErroArquivoSnapshot("A exportação não tem nenhuma entrada")
+        while self._abertas:
+            self._fechar()
+        snapshot = self.snapshot
+        for indice in range(len(snapshot)):
+            qtd = snapshot.qtd_filhos[indice]
+            if qtd:
+                inicio = snapshot.primeiro_filho[indice]
+                snapshot.pais[inicio:inicio + qtd] = array("i", [indice]) * qtd
+        snapshot.tabela_nomes.congelar()
+        return snapshot
+
+# Um token do JSON: string (com ":" se for uma chave), delimitador, literal
+# (número, true, false, null) ou separador
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_TOKEN_JSON = re.compile(rf'\s*(?:({_STRING})(\s*:)?|([{{}}\[\]])|([^\s,:{{}}\[\]"]+)|[,:])', re.S)
+
+# Objeto sem listas ou objetos internos (como as entradas de arquivos), que
+# é decodificado de uma vez pelo módulo json
+_OBJETO_PLANO = re.compile(
+    rf'\{{(?:\s*{_STRING}\s*:\s*(?:{_STRING}|[^\s,{{}}\[\]"]+)\s*,?)*\s*\}}', re.S)
+
+_DECODIFICADOR = json.JSONDecoder()
+
+def _tokens_json(arquivo):
+    """Gera (texto, eh_chave, delimitador, valor) lendo o arquivo em partes.
+
+    Objetos planos são entregues já decodificados, como delimitador "{}".
+    """
+    texto = ""
+    posicao = 0
+    fim = False
+    while True:
+        token = _TOKEN_JSON.match(texto, posicao)
+        # Um token no fim do texto lido pode estar incompleto
+        if not fim and (token is None or token.end() > len(texto) - 256):
+            parte = arquivo.read(TAMANHO_LEITURA)
+            texto = texto[posicao:] + parte
+            posicao = 0
+            fim = not parte
+            continue
+        if token is None:
+            if texto[posicao:].strip():
+                raise ErroArquivoSnapshot(f"JSON inválido perto de: {texto[posicao:posicao + 40]!r}")
+            return
+        string, dois_pontos, delimitador, literal = token.groups()
+        if delimitador == "{":
+            plano = _OBJETO_PLANO.match(texto, token.end() - 1)
+            if plano is not None and (fim or plano.end() <= len(texto) - 256):
+                posicao = plano.end()
+                yield None, False, "{}", _DECODIFICADOR.decode(plano.group())
+                continue
+        posicao = token.end()
+        if string is not None:
+            yield _DECODIFICADOR.decode(string), dois_pontos is not None, None, None
+        elif delimitador is not None:
+            yield None, False, delimitador, None
+        elif literal is not None:
+            yield None, False, None, _DECODIFICADOR.decode(literal)
+
+def _ler_json(arquivo, montador):
+    """Lê uma exportação JSON aninhada sem carregá-la inteira.
+
+    As entradas ("estrutura" e os itens de cada "filhos") são repassadas ao
+    montador assim que os seus campos simples são conhecidos; os demais
+    valores (metadados) são montados normalmente.
+    """
+    # Quadros: [tipo, valor, chave pendente, nível, linha]
+    pilha = []
+
+    def atribuir(valor):
+        if not pilha:
+            return
+        quadro = pilha[-1]
+        tipo, chave = quadro[0], quadro[2]
+        if tipo == "lista":
+            quadro[1].append(valor)
+        elif tipo == "objeto":
+            quadro[1][chave] = valor
+        elif tipo == "entrada":
+            if quadro[4] is not None:
+                # Campos depois de "filhos" (o erro de leitura da pasta)
+                if chave == "erro":
+                    quadro[4][6] = valor
+            else:
+                quadro[1][chave] = valor
+
+    for string, eh_chave, delimitador, valor in _tokens_json(arquivo):
+        if eh_chave:
+            pilha[-1][2] = string
+        elif delimitador == "{}":
+            topo = pilha[-1] if pilha else None
+            if topo is not None and topo[0] == "filhos":
+                montador.entrada(topo[3] + 1, valor)
+            elif topo is not None and len(pilha) == 1 and topo[0] == "objeto" and topo[2] == "estrutura":
+                montador.entrada(0, valor)
+            else:
+                atribuir(valor)
+        elif delimitador == "{":
+            topo = pilha[-1] if pilha else None
+            if topo is not None and topo[0] == "filhos":
+                pilha.append(["entrada", {}, None, topo[3] + 1, None])
+            elif topo is not None and len(pilha) == 1 and topo[0] == "objeto" and topo[2] == "estrutura":
+                pilha.append(["entrada", {}, None, 0, None])
+            else:
+                pilha.append(["objeto", {}, None, 0, None])
+        elif delimitador == "[":
+            topo = pilha[-1] if pilha else None
+            if topo is not None and topo[0] == "entrada" and topo[2] == "filhos":
+                if topo[4] is None:
+                    topo[4] = montador.entrada(topo[3], topo[1])
+                pilha.append(["filhos", None, None, topo[3], None])
+            else:
+                pilha.append(["lista", [], None, 0, None])
+        elif delimitador in ("}", "]"):
+            quadro = pilha.pop()
+            if quadro[0] == "entrada":
+                if quadro[4] is None:
+                    montador.entrada(quadro[3], quadro[1])
+            elif quadro[0] != "filhos":
+                atribuir(quadro[1])
+        else:
+            atribuir(string if string is not None else valor)
+
+def _ler_ndjson(arquivo, montador):
+    for linha in arquivo:
+        if linha.strip():
+            campos = json.loads(linha)
+            montador.entrada(campos.get("nivel", 0), campos)
+
+def abrir_exportacao(caminho, token=None):
+    """Abre uma exportação (.fsnap, .json ou .ndjson) como snapshot.
+
+    O .fsnap é mapeado em memória; JSON e NDJSON são lidos em fluxo e
+    convertidos para as colunas do snapshot (algumas dezenas de bytes por
+    entrada, bem menos que o próprio arquivo). O snapshot guarda os
+    caminhos originais, que podem ser de outra máquina.
+    """
+    ext = os.path.splitext(caminho)[1].lower()
+    if ext == f".{EXTENSAO}":
+        snapshot = abrir_snapshot(caminho)
+    else:
+        montador = _MontadorSnapshot(token)
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            if ext == ".ndjson":
+                _ler_ndjson(arquivo, montador)
+            elif ext == ".json":
+                _ler_json(arquivo, montador)
+            else:
+                raise ErroArquivoSnapshot(f"Formato de exportação não suportado: {ext}")
+        snapshot = montador.concluir()
+    snapshot.exportacao = os.path.abspath(caminho)
+    return snapshot
+
+def eh_exportacao(caminho):
+    """Indica se ``caminho`` é um arquivo de exportação que pode ser aberto"""
+    return os.path.isfile(caminho) and os.path.splitext(caminho)[1].lower() in (f".{EXTENSAO}", ".json", ".ndjson")
@@ -0,0 +1,230 @@
+"""Assinaturas das pastas de um snapshot, para pular subárvores idênticas.
+
+A assinatura de uma pasta é um hash (Merkle) dos seus filhos ordenados
+pelo nome: nome, tipo, tamanho e data (em segundos inteiros) de cada
+arquivo e a assinatura de cada subpasta. Duas pastas com a mesma
+assinatura têm subárvores iguais para a comparação por metadados, que
+pode pulá-las sem olhar nenhum arquivo. Cada pasta guarda também quantos
+arquivos e pastas há na sua subárvore.
+
+As assinaturas ficam guardadas por snapshot. Quando uma varredura
+reaproveita um snapshot, só as pastas relistadas e os seus ancestrais são
+assinados de novo; as do snapshot da sessão são gravadas no cache em
+disco, então a próxima sessão também só reassina o que mudou.
+"""
+import hashlib
+import struct
+import threading
+import weakref
+import zlib
+from array import array
+from utils.jobs import verificar
+from utils.scanner import (SnapshotArvore, ler_assinaturas_persistidas, observar_atualizacoes,
+                           persistir_assinaturas, snapshot_em_memoria)
+
+# Assinaturas já calculadas, por snapshot (descartadas junto com o snapshot)
+_ASSINATURAS = weakref.WeakKeyDictionary()
+_TRAVA = threading.Lock()
+
+TAMANHO_DIGEST = 16
+
+# Cabeçalho de cada filho na assinatura: tamanho do nome e tipo
+_NOME = struct.Struct("<IB")
+_ARQUIVO = struct.Struct("<qd")
+
+# Bits de tipo do modo (stat.S_IFMT) e o valor das pastas
+_TIPO = 0o170000
+_PASTA = 0o040000
+
+class AssinaturasPastas:
+    """Assinatura e (arquivos, pastas) da subárvore de cada pasta de um snapshot"""
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        # indice da pasta -> (digest, arquivos, pastas)
+        self.subarvores = {}
+        self.persistidas = False
+
+    def assinatura(self, indice):
+        return self.subarvores[indice][0]
+
+    def contagem(self, indice):
+        """Retorna (arquivos, pastas) abaixo da pasta, sem contar ela mesma"""
+        _, arquivos, pastas = self.subarvores[indice]
+        return arquivos, pastas
+
+    def para_bytes(self):
+        pastas = array("i", self.subarvores)
+        contagens = array("q")
+        for _, arquivos, subpastas in self.subarvores.values():
+            contagens.append(arquivos)
+            contagens.append(subpastas)
+        digests = b"".join(digest for digest, _, _ in self.subarvores.values())
+        return {"pastas": pastas.tobytes(), "digests": digests, "contagens": contagens.tobytes()}
+
+    @classmethod
+    def de_bytes(cls, dados, tamanho):
+        assinaturas = cls(tamanho)
+        pastas = array("i")
+        pastas.frombytes(dados["pastas"])
+        contagens = array("q")
+        contagens.frombytes(dados["contagens"])
+        digests = dados["digests"]
+        for posicao, indice in enumerate(pastas):
+            inicio = posicao * TAMANHO_DIGEST
+            assinaturas.subarvores[indice] = (digests[inicio:inicio + TAMANHO_DIGEST],
+                                              contagens[2 * posicao], contagens[2 * posicao + 1])
+        return assinaturas
+
+def _verificacao(snapshot):
+    """Soma de verificação das colunas do snapshot e dos nomes usados por elas.
+
+    A tabela de nomes é compartilhada com os snapshots seguintes e só
+    recebe acréscimos, então entram só os nomes até o maior id usado.
+    """
+    valor = 0
+    for nome, _ in SnapshotArvore.COLUNAS:
+        valor = zlib.crc32(getattr(snapshot, nome), valor)
+    tabela = snapshot.tabela_nomes
+    qtd_nomes = max(snapshot.ids_nomes, default=-1) + 1
+    return zlib.crc32(memoryview(tabela.dados)[:tabela.inicios[qtd_nomes]], valor)
+
+def _assinar_pasta(snapshot, indice, subarvores):
+    """(digest, arquivos, pastas) de uma pasta cujas subpastas já foram assinadas.
+
+    Os nomes entram como estão na tabela (UTF-8), sem decodificar, e os
+    filhos são ordenados por esses bytes.
+    """
+    dados, inicios = snapshot.tabela_nomes.dados, snapshot.tabela_nomes.inicios
+    ids, modos, tamanhos, mtimes = snapshot.ids_nomes, snapshot.modos, snapshot.tamanhos, snapshot.mtimes
+    filhos = []
+    for filho in snapshot.filhos(indice):
+        id_nome = ids[filho]
+        filhos.append((bytes(dados[inicios[id_nome]:inicios[id_nome + 1]]), filho))
+    filhos.sort()
+    partes = []
+    arquivos = pastas = 0
+    for nome, filho in filhos:
+        if modos[filho] & _TIPO == _PASTA:
+            digest, arquivos_filho, pastas_filho = subarvores[filho]
+            arquivos += arquivos_filho
+            pastas += pastas_filho + 1
+            partes.extend((_NOME.pack(len(nome), 1), nome, digest))
+        else:
+            arquivos += 1
+            # Datas na mesma fração de segundo estão dentro da tolerância da comparação
+            partes.extend((_NOME.pack(len(nome), 0), nome, _ARQUIVO.pack(tamanhos[filho], mtimes[filho] // 1)))
+    digest = hashlib.blake2b(b"".join(partes), digest_size=TAMANHO_DIGEST).digest()
+    return digest, arquivos, pastas
+
+def _assinar_tudo(snapshot, token=None):
+    assinaturas = AssinaturasPastas(len(snapshot))
+    modos = snapshot.modos
+    pastas = []
+    pilha = [0]
+    while pilha:
+        indice = pilha.pop()
+        pastas.append(indice)
+        pilha.extend(filho for filho in snapshot.filhos(indice) if modos[filho] & _TIPO == _PASTA)
+    # Em ordem invertida cada pasta vem depois de todas as suas subpastas
+    for posicao, indice in enumerate(reversed(pastas)):
+        if posicao % 1024 == 0:
+            verificar(token)
+        assinaturas.subarvores[indice] = _assinar_pasta(snapshot, indice, assinaturas.subarvores)
+    return assinaturas
+
+def _carregar(snapshot):
+    """Lê do cache em disco as assinaturas de ``snapshot``, se forem dele"""
+    dados = ler_assinaturas_persistidas(snapshot.raiz)
+    if dados is None or dados["qtd_entradas"] != len(snapshot):
+        return None
+    if _verificacao(snapshot) != dados["verificacao"]:
+        return None
+    assinaturas = AssinaturasPastas.de_bytes(dados, len(snapshot))
+    assinaturas.persistidas = True
+    return assinaturas
+
+def _herdar(novo, anterior, base, indice, antigo, subarvores):
+    """Copia as assinaturas de uma subárvore que a varredura copiou inteira"""
+    pilha = [(indice, antigo)]
+    while pilha:
+        indice, antigo = pilha.pop()
+        subarvores[indice] = base.subarvores[antigo]
+        inicio, inicio_antigo = novo.primeiro_filho[indice], anterior.primeiro_filho[antigo]
+        for deslocamento in range(novo.qtd_filhos[indice]):
+            # Os filhos copiados têm a mesma ordem, com as pastas primeiro
+            if not novo.eh_pasta(inicio + deslocamento):
+                break
+            pilha.append((inicio + deslocamento, inicio_antigo + deslocamento))
+
+def _derivar(anterior, novo):
+    """Deriva as assinaturas de ``novo`` das de ``anterior`` (ouvinte das varreduras).
+
+    Só faz algo se as assinaturas de ``anterior`` já foram calculadas (na
+    sessão ou em disco). São assinadas de novo só as pastas relistadas e
+    os seus ancestrais; as demais copiam a assinatura anterior.
+    """
+    with _TRAVA:
+        base = _ASSINATURAS.get(anterior)
+    if base is None:
+        base = _carregar(anterior)
+    if base is None or base.tamanho != len(anterior):
+        return
+
+    # Pastas cuja subárvore mudou: as relistadas e os seus ancestrais
+    listadas = set(novo.pastas_listadas)
+    alteradas = set()
+    for indice in novo.pastas_listadas:
+        while indice >= 0 and indice not in alteradas:
+            alteradas.add(indice)
+            indice = novo.pais[indice]
+
+    # Desce pelas pastas alteradas, pareando cada pasta com a do snapshot
+    # anterior; as demais subárvores herdam a assinatura anterior
+    assinaturas = AssinaturasPastas(len(novo))
+    ordem = []
+    pilha = [(0, 0)]
+    while pilha:
+        indice, antigo = pilha.pop()
+        ordem.append(indice)
+        if antigo < 0:
+            pares = [(filho, -1) for filho in novo.filhos(indice)]
+        elif indice in listadas:
+            antigos = {anterior.nomes[i]: i for i in anterior.filhos(antigo) if anterior.listavel(i)}
+            pares = [(filho, antigos.get(novo.nomes[filho], -1)) for filho in novo.filhos(indice)]
+        else:
+            # Filhos copiados do snapshot anterior, na mesma ordem
+            pares = zip(novo.filhos(indice), anterior.filhos(antigo))
+        for filho, antigo_filho in pares:
+            if not novo.eh_pasta(filho):
+                continue
+            if filho in alteradas or antigo_filho < 0 or not novo.listavel(filho):
+                pilha.append((filho, antigo_filho))
+            else:
+                _herdar(novo, anterior, base, filho, antigo_filho, assinaturas.subarvores)
+    for indice in reversed(ordem):
+        assinaturas.subarvores[indice] = _assinar_pasta(novo, indice, assinaturas.subarvores)
+    with _TRAVA:
+        _ASSINATURAS[novo] = assinaturas
+
+observar_atualizacoes(_derivar)
+
+def assinaturas_de(snapshot, token=None):
+    """Retorna as assinaturas das pastas de ``snapshot``, calculando-as uma única vez.
+
+    As do snapshot da sessão são gravadas no cache em disco e, numa nova
+    sessão, lidas de lá se o snapshot não tiver mudado.
+    """
+    with _TRAVA:
+        assinaturas = _ASSINATURAS.get(snapshot)
+    if assinaturas is None or assinaturas.tamanho != len(snapshot):
+        assinaturas = _carregar(snapshot) or _assinar_tudo(snapshot, token)
+        with _TRAVA:
+            _ASSINATURAS[snapshot] = assinaturas
+    if not assinaturas.persistidas and snapshot is snapshot_em_memoria(snapshot.raiz):
+        dados = assinaturas.para_bytes()
+        dados["qtd_entradas"] = len(snapshot)
+        dados["verificacao"] = _verificacao(snapshot)
+        persistir_assinaturas(snapshot.raiz, dados)
+        assinaturas.persistidas = True
+    return assinaturas
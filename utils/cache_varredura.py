@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Versão do layout das colunas; caches de versões diferentes são ignorados
+VERSAO_CACHE = 1
+
+def _conectar(caminho_cache):
+    os.makedirs(os.path.dirname(caminho_cache) or ".", exist_ok=True)
+    conexao = sqlite3.connect(caminho_cache)
+    conexao.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            raiz TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL,
+            ordem_bytes TEXT NOT NULL,
+            gravado_em REAL NOT NULL,
+            colunas TEXT NOT NULL,
+            erros TEXT NOT NULL
+        )
+    """)
+    conexao.execute("""
+        CREATE TABLE IF NOT EXISTS colunas (
+            raiz TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            dados BLOB NOT NULL,
+            PRIMARY KEY (raiz, nome)
+        )
+    """)
+    conexao.execute("""
+        CREATE TABLE IF NOT EXISTS indices (
+            raiz TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL,
+            ordem_bytes TEXT NOT NULL,
+            qtd_nomes INTEGER NOT NULL,
+            verificacao INTEGER NOT NULL,
+            chaves BLOB NOT NULL,
+            tamanhos BLOB NOT NULL,
+            ids BLOB NOT NULL
+        )
+    """)
+    conexao.execute("""
+        CREATE TABLE IF NOT EXISTS assinaturas (
+            raiz TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL,
+            ordem_bytes TEXT NOT NULL,
+            qtd_entradas INTEGER NOT NULL,
+            verificacao INTEGER NOT NULL,
+            pastas BLOB NOT NULL,
+            digests BLOB NOT NULL,
+            contagens BLOB NOT NULL
+        )
+    """)
+    return conexao
+
+def ler_colunas(caminho_cache, raiz):
+    """Lê o último snapshot gravado para ``raiz``.
+
+    Retorna (colunas, erros) ou None se não houver um snapshot compatível.
+    """
+    if not os.path.exists(caminho_cache):
+        return None
+    conexao = _conectar(caminho_cache)
+    try:
+        linha = conexao.execute(
+            "SELECT versao, ordem_bytes, colunas, erros FROM snapshots WHERE raiz = ?", (raiz,)
+        ).fetchone()
+        if linha is None:
+            return None
+        versao, ordem_bytes, nomes_colunas, erros = linha
+        if versao != VERSAO_CACHE or ordem_bytes != sys.byteorder:
+            return None
+
+        colunas = dict(conexao.execute("SELECT nome, dados FROM colunas WHERE raiz = ?", (raiz,)))
+        if any(nome not in colunas for nome in json.loads(nomes_colunas)):
+            return None
+        erros = {int(indice): mensagem for indice, mensagem in json.loads(erros).items()}
+        return colunas, erros
+    finally:
+        conexao.close()
+
+def gravar_colunas(caminho_cache, raiz, colunas, erros):
+    """Grava (substituindo) o snapshot de ``raiz`` no cache"""
+    conexao = _conectar(caminho_cache)
+    try:
+        with conexao:
+            conexao.execute("DELETE FROM colunas WHERE raiz = ?", (raiz,))
+            conexao.executemany(
+                "INSERT INTO colunas (raiz, nome, dados) VALUES (?, ?, ?)",
+                [(raiz, nome, dados) for nome, dados in colunas.items()]
+            )
+            conexao.execute(
+                "INSERT OR REPLACE INTO snapshots (raiz, versao, ordem_bytes, gravado_em, colunas, erros) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (raiz, VERSAO_CACHE, sys.byteorder, time.time(), json.dumps(list(colunas)), json.dumps(erros))
+            )
+    finally:
+        conexao.close()
+
+def ler_indice(caminho_cache, raiz):
+    """Lê o índice de trigramas gravado para ``raiz`` (ou None)"""
+    if not os.path.exists(caminho_cache):
+        return None
+    conexao = _conectar(caminho_cache)
+    try:
+        linha = conexao.execute(
+            "SELECT versao, ordem_bytes, qtd_nomes, verificacao, chaves, tamanhos, ids FROM indices WHERE raiz = ?",
+            (raiz,)
+        ).fetchone()
+        if linha is None:
+            return None
+        versao, ordem_bytes, qtd_nomes, verificacao, chaves, tamanhos, ids = linha
+        if versao != VERSAO_CACHE or ordem_bytes != sys.byteorder:
+            return None
+        return {"qtd_nomes": qtd_nomes, "verificacao": verificacao, "chaves": chaves, "tamanhos": tamanhos, "ids": ids}
+    finally:
+        conexao.close()
+
+def gravar_indice(caminho_cache, raiz, dados):
+    """Grava (substituindo) o índice de trigramas de ``raiz``.
+
+    ``dados`` tem as chaves qtd_nomes, verificacao (soma dos nomes
+    indexados), chaves, tamanhos e ids.
+    """
+    conexao = _conectar(caminho_cache)
+    try:
+        with conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO indices (raiz, versao, ordem_bytes, qtd_nomes, verificacao, chaves, tamanhos, ids) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (raiz, VERSAO_CACHE, sys.byteorder, dados["qtd_nomes"], dados["verificacao"],
+                 dados["chaves"], dados["tamanhos"], dados["ids"])
+            )
+    finally:
+        conexao.close()
+
+def ler_assinaturas(caminho_cache, raiz):
+    """Lê as assinaturas de pastas gravadas para ``raiz`` (ou None)"""
+    if not os.path.exists(caminho_cache):
+        return None
+    conexao = _conectar(caminho_cache)
+    try:
+        linha = conexao.execute(
+            "SELECT versao, ordem_bytes, qtd_entradas, verificacao, pastas, digests, contagens FROM assinaturas WHERE raiz = ?",
+            (raiz,)
+        ).fetchone()
+        if linha is None:
+            return None
+        versao, ordem_bytes, qtd_entradas, verificacao, pastas, digests, contagens = linha
+        if versao != VERSAO_CACHE or ordem_bytes != sys.byteorder:
+            return None
+        return {"qtd_entradas": qtd_entradas, "verificacao": verificacao,
+                "pastas": pastas, "digests": digests, "contagens": contagens}
+    finally:
+        conexao.close()
+
+def gravar_assinaturas(caminho_cache, raiz, dados):
+    """Grava (substituindo) as assinaturas de pastas de ``raiz``.
+
+    ``dados`` tem as chaves qtd_entradas, verificacao (soma das colunas do
+    snapshot assinado), pastas, digests e contagens.
+    """
+    conexao = _conectar(caminho_cache)
+    try:
+        with conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO assinaturas (raiz, versao, ordem_bytes, qtd_entradas, verificacao, pastas, digests, contagens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (raiz, VERSAO_CACHE, sys.byteorder, dados["qtd_entradas"], dados["verificacao"],
+                 dados["pastas"], dados["digests"], dados["contagens"])
+            )
+    finally:
+        conexao.close()
+
+def remover(caminho_cache, raiz):
+    """Remove o snapshot de ``raiz`` do cache"""
+    if not os.path.exists(caminho_cache):
+        return
+    conexao = _conectar(caminho_cache)
+    try:
+        with conexao:
+            conexao.execute("DELETE FROM colunas WHERE raiz = ?", (raiz,))
+            conexao.execute("DELETE FROM snapshots WHERE raiz = ?", (raiz,))
+            conexao.execute("DELETE FROM indices WHERE raiz = ?", (raiz,))
+            conexao.execute("DELETE FROM assinaturas WHERE raiz = ?", (raiz,))
+    finally:
+        conexao.close()
@@ -0,0 +1,370 @@
+"""Comparação da estrutura (e, opcionalmente, do conteúdo) de duas pastas.
+
+No modo de metadados um arquivo é modificado se o tamanho mudou ou se a
+data difere em mais de um segundo. Nos modos de conteúdo arquivos de
+mesmo tamanho são comparados pelo hash: só os de data diferente
+(MODO_CONTEUDO) ou todos (MODO_CONTEUDO_TOTAL). Os hashes são calculados
+em paralelo e guardados por (caminho, tamanho, mtime, inode), então
+comparar de novo as mesmas árvores quase não lê nada do disco.
+
+Pastas com a mesma assinatura (veja utils.assinaturas) são puladas
+inteiras, exceto em MODO_CONTEUDO_TOTAL, então comparar árvores quase
+iguais custa o proporcional ao que difere entre elas.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from datetime import datetime
+from utils.assinaturas import assinaturas_de
+from utils.duplicados import WORKERS_LEITURA, hash_conteudo, processar_em_paralelo
+from utils.jobs import TokenCancelamento, verificar
+from utils.scanner import obter_snapshot
+
+# Buffer do arquivo de resultados gravado em fluxo
+TAMANHO_BUFFER = 1024 * 1024
+
+MODO_METADADOS = "metadados"
+MODO_CONTEUDO = "conteudo"
+MODO_CONTEUDO_TOTAL = "conteudo_total"
+
+# Diferença de data, em segundos, tolerada entre dois arquivos iguais
+TOLERANCIA_MTIME = 1
+
+# Hashes já calculados: (caminho, tamanho, mtime_ns, inode) -> hash
+_HASHES = {}
+_TRAVA = threading.Lock()
+MAX_HASHES = 500000
+
+def _hash_em_cache(caminho, tamanho, token):
+    """Hash do conteúdo de ``caminho``, reaproveitado enquanto o arquivo não mudar"""
+    info = os.stat(caminho)
+    chave = (caminho, info.st_size, info.st_mtime_ns, info.st_ino)
+    with _TRAVA:
+        digest = _HASHES.get(chave)
+    if digest is not None:
+        return digest
+    digest = hash_conteudo(caminho, info.st_size, token)
+    if digest is not None:
+        with _TRAVA:
+            _HASHES[chave] = digest
+            # Descarta os mais antigos (ordem de inserção)
+            while len(_HASHES) > MAX_HASHES:
+                del _HASHES[next(iter(_HASHES))]
+    return digest
+
+def _obter_snapshot(pasta_raiz, token=None, ao_progredir=None):
+    """obter_snapshot com o progresso como ``ao_progredir(fracao, entradas)``"""
+    def progresso_varredura(snapshot):
+        processadas, conhecidas = snapshot.progresso_varredura
+        ao_progredir(processadas / max(conhecidas, 1), len(snapshot))
+
+    snapshot = obter_snapshot(pasta_raiz, token=token,
+                              ao_progredir=progresso_varredura if ao_progredir else None)
+    if ao_progredir is not None:
+        ao_progredir(1.0, len(snapshot))
+    return snapshot
+
+def gerar_estrutura_para_comparacao(pasta_raiz, token=None, ao_progredir=None):
+    """Gera um dicionário com o snapshot da pasta e as suas contagens.
+
+    As assinaturas das pastas são calculadas (ou reaproveitadas) aqui, na
+    thread do lado, e dão as contagens sem percorrer a árvore.
+    ``ao_progredir(fracao, entradas)`` acompanha a varredura da pasta.
+    """
+    snapshot = _obter_snapshot(pasta_raiz, token, ao_progredir)
+    arquivos, pastas = assinaturas_de(snapshot, token).contagem(0)
+    return {
+        "snapshot": snapshot,
+        "stats": {"pastas": pastas, "arquivos": arquivos}
+    }
+
+def gerar_estruturas(pasta1, pasta2, token=None, ao_progredir=None):
+    """Gera as estruturas das duas pastas ao mesmo tempo, uma thread por lado.
+
+    Os lados costumam estar em dispositivos diferentes (ex.: uma pasta
+    local e a sua cópia na rede), então as duas varreduras se sobrepõem.
+    ``ao_progredir(lado, fracao, entradas)`` recebe o progresso de cada
+    lado (0 ou 1). Se um lado falhar, o outro é cancelado.
+    """
+    return _nos_dois_lados(gerar_estrutura_para_comparacao, pasta1, pasta2, token, ao_progredir)
+
+def obter_snapshots(pasta1, pasta2, token=None, ao_progredir=None):
+    """Como ``gerar_estruturas``, mas retorna só os snapshots das duas pastas"""
+    return _nos_dois_lados(_obter_snapshot, pasta1, pasta2, token, ao_progredir)
+
+def _nos_dois_lados(funcao, pasta1, pasta2, token, ao_progredir):
+    if token is None:
+        token = TokenCancelamento("comparação")
+
+    def progresso(lado):
+        if ao_progredir is None:
+            return None
+        return lambda fracao, entradas: ao_progredir(lado, fracao, entradas)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futuros = [executor.submit(funcao, pasta, token, progresso(lado))
+                   for lado, pasta in enumerate((pasta1, pasta2))]
+        feitos, _ = wait(futuros, return_when=FIRST_EXCEPTION)
+        erros = [futuro.exception() for futuro in feitos if futuro.exception() is not None]
+        if erros:
+            # O erro do lado que falhou, não o cancelamento do outro
+            token.cancelar()
+            raise erros[0]
+        return [futuro.result() for futuro in futuros]
+
+# Resultado de _motivo para arquivos que precisam ter o conteúdo comparado
+_COMPARAR_CONTEUDO = "hash"
+
+def _motivo(modo, snapshot1, indice1, snapshot2, indice2):
+    """Por que o arquivo foi modificado ("tamanho", "data"), None se não foi
+    ou _COMPARAR_CONTEUDO se só o conteúdo pode dizer"""
+    data_diferente = abs(snapshot1.mtimes[indice1] - snapshot2.mtimes[indice2]) > TOLERANCIA_MTIME
+    if snapshot1.tamanhos[indice1] != snapshot2.tamanhos[indice2]:
+        return "tamanho"
+    if modo == MODO_CONTEUDO_TOTAL or (modo == MODO_CONTEUDO and data_diferente):
+        return _COMPARAR_CONTEUDO
+    if data_diferente and modo == MODO_METADADOS:
+        return "data"
+    return None
+
+def _resolver_conteudo(pendentes, snapshot1, snapshot2, token, ao_progredir, workers):
+    """Diferenças entre os pares (arquivo, indice1, indice2) que dependem do conteúdo"""
+    diferencas = []
+    iguais = _conteudos_iguais(pendentes, snapshot1, snapshot2, token, ao_progredir, workers)
+    for arquivo, indice1, indice2 in pendentes:
+        igual = iguais.get(arquivo)
+        if igual is None:
+            # Sem acesso ao conteúdo: vale a comparação por data
+            if abs(snapshot1.mtimes[indice1] - snapshot2.mtimes[indice2]) > TOLERANCIA_MTIME:
+                diferencas.append(_modificado(arquivo, snapshot1, indice1, snapshot2, indice2, "data"))
+        elif not igual:
+            diferencas.append(_modificado(arquivo, snapshot1, indice1, snapshot2, indice2, "conteúdo"))
+    return diferencas
+
+def _conteudos_iguais(pendentes, snapshot1, snapshot2, token, ao_progredir, workers):
+    """Compara pelo hash os pares (arquivo, indice1, indice2) de mesmo tamanho.
+
+    Retorna {arquivo: bool}; pares que não puderam ser lidos ficam de fora.
+    """
+    itens = set()
+    for _, indice1, indice2 in pendentes:
+        itens.add((snapshot1.caminho(indice1), snapshot1.tamanhos[indice1]))
+        itens.add((snapshot2.caminho(indice2), snapshot2.tamanhos[indice2]))
+    hashes = processar_em_paralelo(_hash_em_cache, sorted(itens), workers, token, ao_progredir)
+    iguais = {}
+    for arquivo, indice1, indice2 in pendentes:
+        hash1 = hashes.get((snapshot1.caminho(indice1), snapshot1.tamanhos[indice1]))
+        hash2 = hashes.get((snapshot2.caminho(indice2), snapshot2.tamanhos[indice2]))
+        if hash1 is not None and hash2 is not None:
+            iguais[arquivo] = hash1 == hash2
+    return iguais
+
+def comparar_estruturas(estrutura1, estrutura2, pasta1, pasta2, token=None, modo=MODO_METADADOS,
+                        ao_progredir=None, workers=WORKERS_LEITURA):
+    """Compara duas estruturas de pastas e retorna as diferenças.
+
+    ``modo`` escolhe como os arquivos presentes nos dois lados são
+    comparados (veja o início do módulo); os modos de conteúdo só valem
+    quando os dois lados são pastas, não exportações. ``ao_progredir``
+    recebe (feitos, total) durante o cálculo dos hashes. As diferenças
+    vêm ordenadas pelo caminho.
+    """
+    comparacao = ComparacaoEmFluxo(estrutura1["snapshot"], estrutura2["snapshot"], token, modo, workers,
+                                   ao_progredir, lote_conteudo=None)
+    diferencas = sorted(comparacao, key=lambda x: x["caminho"])
+    return {
+        "stats": {
+            "pasta1": estrutura1["stats"],
+            "pasta2": estrutura2["stats"]
+        },
+        "modo": comparacao.modo,
+        "diferenças": diferencas
+    }
+
+def _modificado(arquivo, snapshot1, indice1, snapshot2, indice2, motivo):
+    return {
+        "tipo": "modificado",
+        "caminho": arquivo,
+        "motivo": motivo,
+        "diferença": {
+            "tamanho1": snapshot1.tamanhos[indice1],
+            "tamanho2": snapshot2.tamanhos[indice2],
+            "modificado1": snapshot1.mtimes[indice1],
+            "modificado2": snapshot2.mtimes[indice2]
+        }
+    }
+
+# Pares de arquivos acumulados antes de ler o conteúdo, na comparação em fluxo
+LOTE_CONTEUDO_FLUXO = 256
+
+class ComparacaoEmFluxo:
+    """Comparação de dois snapshots por merge-join, gerando as diferenças em fluxo.
+
+    Os filhos de cada par de pastas são ordenados pelo nome e percorridos
+    lado a lado; cada diferença é gerada assim que aparece, pasta a pasta
+    em pré-ordem. Além dos próprios snapshots, a memória usada depende só
+    da profundidade (e da largura) das pastas, não da quantidade de
+    arquivos: nenhum dicionário de caminhos nem lista de diferenças é
+    montado. ``stats`` é atualizado durante a iteração e fica completo
+    no fim.
+
+    Pares de pastas com a mesma assinatura não são percorridos (só contados
+    em ``stats``, e em ``podadas``). Os arquivos que dependem do conteúdo
+    são resolvidos em lotes de ``lote_conteudo`` (None: todos no fim, com
+    ``ao_progredir(feitos, total)``).
+    """
+
+    def __init__(self, snapshot1, snapshot2, token=None, modo=MODO_METADADOS, workers=WORKERS_LEITURA,
+                 ao_progredir=None, lote_conteudo=LOTE_CONTEUDO_FLUXO):
+        self.snapshot1 = snapshot1
+        self.snapshot2 = snapshot2
+        self.token = token
+        if snapshot1.exportacao is not None or snapshot2.exportacao is not None:
+            # A raiz de uma exportação é a pasta original, que pode existir
+            # nesta máquina com outro conteúdo: só os metadados valem
+            modo = MODO_METADADOS
+        self.modo = modo
+        self.workers = workers
+        self.ao_progredir = ao_progredir
+        self.lote_conteudo = lote_conteudo
+        self.stats = {
+            "pasta1": {"pastas": 0, "arquivos": 0},
+            "pasta2": {"pastas": 0, "arquivos": 0}
+        }
+        self.podadas = 0
+
+    def _filhos_ordenados(self, snapshot, indice, lado):
+        filhos = sorted((snapshot.nomes[i], i) for i in snapshot.filhos(indice))
+        contagem = self.stats[lado]
+        for _, filho in filhos:
+            contagem["pastas" if snapshot.eh_pasta(filho) else "arquivos"] += 1
+        return filhos
+
+    def _ausentes(self, snapshot, indice, caminho, lado, tipo):
+        """Diferenças de uma entrada (e, se for pasta, de toda a subárvore) de um lado só"""
+        if not snapshot.eh_pasta(indice):
+            yield {"tipo": tipo, "caminho": caminho}
+            return
+        yield {"tipo": tipo, "caminho": caminho + "/"}
+        contagem = self.stats[lado]
+        partes = [caminho]
+        for posicao, (filho, nivel, _) in enumerate(snapshot.percorrer(indice)):
+            if posicao % 4096 == 0:
+                verificar(self.token)
+            del partes[nivel + 1:]
+            partes.append(snapshot.nomes[filho])
+            relativo = "/".join(partes)
+            if snapshot.eh_pasta(filho):
+                contagem["pastas"] += 1
+                yield {"tipo": tipo, "caminho": relativo + "/"}
+            else:
+                contagem["arquivos"] += 1
+                yield {"tipo": tipo, "caminho": relativo}
+
+    def _iguais(self, assinaturas1, assinaturas2, pasta1, pasta2):
+        """Conta e indica se as subárvores das duas pastas são iguais pela assinatura"""
+        if assinaturas1 is None or assinaturas1.assinatura(pasta1) != assinaturas2.assinatura(pasta2):
+            return False
+        for lado, assinaturas, pasta in (("pasta1", assinaturas1, pasta1), ("pasta2", assinaturas2, pasta2)):
+            arquivos, pastas = assinaturas.contagem(pasta)
+            self.stats[lado]["arquivos"] += arquivos
+            self.stats[lado]["pastas"] += pastas
+        self.podadas += 1
+        return True
+
+    def __iter__(self):
+        snapshot1, snapshot2 = self.snapshot1, self.snapshot2
+        assinaturas1 = assinaturas2 = None
+        if self.modo != MODO_CONTEUDO_TOTAL:
+            # Nesse modo todo arquivo tem o conteúdo lido: nada pode ser pulado
+            assinaturas1 = assinaturas_de(snapshot1, self.token)
+            assinaturas2 = assinaturas_de(snapshot2, self.token)
+        pendentes = []
+        # Pares de pastas a visitar; a pilha tem só as pastas irmãs ainda
+        # não visitadas de cada nível do caminho atual
+        pilha = [(0, 0, "")]
+        while pilha:
+            verificar(self.token)
+            pasta1, pasta2, prefixo = pilha.pop()
+            if self._iguais(assinaturas1, assinaturas2, pasta1, pasta2):
+                continue
+            filhos1 = self._filhos_ordenados(snapshot1, pasta1, "pasta1")
+            filhos2 = self._filhos_ordenados(snapshot2, pasta2, "pasta2")
+            subpastas = []
+            i = j = 0
+            while i < len(filhos1) or j < len(filhos2):
+                nome1, indice1 = filhos1[i] if i < len(filhos1) else (None, -1)
+                nome2, indice2 = filhos2[j] if j < len(filhos2) else (None, -1)
+                if nome2 is None or (nome1 is not None and nome1 < nome2):
+                    yield from self._ausentes(snapshot1, indice1, prefixo + nome1, "pasta1", "ausente_2")
+                    i += 1
+                    continue
+                if nome1 is None or nome2 < nome1:
+                    yield from self._ausentes(snapshot2, indice2, prefixo + nome2, "pasta2", "ausente_1")
+                    j += 1
+                    continue
+                i += 1
+                j += 1
+                caminho = prefixo + nome1
+                eh_pasta1, eh_pasta2 = snapshot1.eh_pasta(indice1), snapshot2.eh_pasta(indice2)
+                if eh_pasta1 and eh_pasta2:
+                    subpastas.append((indice1, indice2, caminho + "/"))
+                elif eh_pasta1 or eh_pasta2:
+                    # Arquivo de um lado e pasta do outro
+                    yield from self._ausentes(snapshot1, indice1, caminho, "pasta1", "ausente_2")
+                    yield from self._ausentes(snapshot2, indice2, caminho, "pasta2", "ausente_1")
+                else:
+                    motivo = _motivo(self.modo, snapshot1, indice1, snapshot2, indice2)
+                    if motivo == _COMPARAR_CONTEUDO:
+                        pendentes.append((caminho, indice1, indice2))
+                        if self.lote_conteudo and len(pendentes) >= self.lote_conteudo:
+                            yield from _resolver_conteudo(pendentes, snapshot1, snapshot2, self.token,
+                                                          self.ao_progredir, self.workers)
+                            pendentes = []
+                    elif motivo is not None:
+                        yield _modificado(caminho, snapshot1, indice1, snapshot2, indice2, motivo)
+            # Em ordem inversa, para visitar as subpastas em ordem alfabética
+            pilha.extend(reversed(subpastas))
+        if pendentes:
+            yield from _resolver_conteudo(pendentes, snapshot1, snapshot2, self.token, self.ao_progredir, self.workers)
+
+def caminho_exportacao(pasta1, pasta2):
+    """Caminho do JSON de resultados, ao lado de ``pasta1``"""
+    nome_pasta1 = os.path.basename(pasta1)
+    nome_pasta2 = os.path.basename(pasta2)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    nome_arquivo = f"comparacao_{nome_pasta1}_vs_{nome_pasta2}_{timestamp}.json"
+    return os.path.join(os.path.dirname(pasta1), nome_arquivo)
+
+def exportar_em_fluxo(comparacao, caminho, pasta1, pasta2, ao_diferenca=None):
+    """Grava as diferenças de uma ComparacaoEmFluxo em JSON à medida que aparecem.
+
+    O arquivo tem os mesmos campos da exportação dos resultados, com as
+    estatísticas no fim (só são conhecidas depois de percorrer tudo).
+    ``ao_diferenca`` recebe cada diferença, para exibição. Retorna a
+    quantidade de diferenças; se a comparação for interrompida, o arquivo
+    parcial é removido.
+    """
+    total = 0
+    try:
+        with open(caminho, "w", encoding="utf-8", buffering=TAMANHO_BUFFER) as arquivo:
+            arquivo.write("{\n")
+            arquivo.write(f'  "data_comparacao": {json.dumps(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))},\n')
+            arquivo.write(f'  "pasta1": {json.dumps(pasta1, ensure_ascii=False)},\n')
+            arquivo.write(f'  "pasta2": {json.dumps(pasta2, ensure_ascii=False)},\n')
+            arquivo.write('  "diferencas": [')
+            for diferenca in comparacao:
+                arquivo.write(",\n    " if total else "\n    ")
+                arquivo.write(json.dumps(diferenca, ensure_ascii=False))
+                total += 1
+                if ao_diferenca is not None:
+                    ao_diferenca(diferenca)
+            arquivo.write("\n  ],\n" if total else "],\n")
+            arquivo.write(f'  "estatisticas": {json.dumps(comparacao.stats)}\n')
+            arquivo.write("}\n")
+    except BaseException:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        raise
+    return total
@@ -5,7 +5,7 @@ def carregar_config(path):
     if os.path.exists(path):
         with open(path, "r") as f:
             return json.load(f)
-    return {"tema_escuro": True, "ultima_pasta": ""}
+    return {"tema_escuro": True, "ultima_pasta": "", "workers_varredura": 8, "modo_observacao": False}
 
 def salvar_config(path, data):
     os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -0,0 +1,341 @@
+import functools
+import math
+import re
+import stat
+import time
+from datetime import datetime
+from utils.indice_nomes import indice_de
+from utils.jobs import verificar
+
+class ErroConsulta(ValueError):
+    """Consulta com sintaxe inválida"""
+
+# Nomes aceitos para cada filtro
+_CHAVES = {
+    "ext": "ext", "extensao": "ext",
+    "size": "size", "tamanho": "size",
+    "mtime": "mtime", "data": "mtime",
+    "path": "path", "caminho": "path",
+    "name": "name", "nome": "name",
+    "re": "re",
+    "type": "type", "tipo": "type",
+}
+
+_UNIDADES_TAMANHO = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2,
+                     "g": 1024 ** 3, "gb": 1024 ** 3, "t": 1024 ** 4, "tb": 1024 ** 4}
+
+_UNIDADES_TEMPO = {"s": 1, "min": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "sem": 7 * 86400,
+                   "m": 30 * 86400, "mes": 30 * 86400, "y": 365 * 86400, "a": 365 * 86400}
+
+_OPERADORES = {">": ">", ">=": ">=", "<": "<", "<=": "<=", "=": "==", "": "=="}
+
+# Operador equivalente quando os lados são trocados (idade -> data)
+_INVERSO = {">": "<", ">=": "<=", "<": ">", "<=": ">=", "==": "=="}
+
+_COMPARACAO = re.compile(r"^(>=|<=|>|<|=)?\s*(.+)$")
+_NUMERO_UNIDADE = re.compile(r"^(\d+(?:\.\d+)?)\s*([a-z]*)$")
+
+def _tokenizar(texto):
+    """Divide a consulta em (negado, chave, valor).
+
+    Valores podem vir entre aspas; ``re:`` aceita /padrão/ ou /padrão/i, com
+    espaços e barras escapadas.
+    """
+    tokens = []
+    posicao = 0
+    while posicao < len(texto):
+        if texto[posicao].isspace():
+            posicao += 1
+            continue
+        negado = texto[posicao] == "-" and posicao + 1 < len(texto) and not texto[posicao + 1].isspace()
+        if negado:
+            posicao += 1
+        chave = None
+        encontrado = re.match(r"(\w+):", texto[posicao:])
+        if encontrado and encontrado.group(1).lower() in _CHAVES:
+            chave = _CHAVES[encontrado.group(1).lower()]
+            posicao += encontrado.end()
+        if chave == "re" and texto.startswith("/", posicao):
+            fim = posicao + 1
+            while fim < len(texto) and texto[fim] != "/":
+                fim += 2 if texto[fim] == "\\" else 1
+            if fim >= len(texto):
+                raise ErroConsulta("Expressão regular sem a barra final")
+            fim += 1
+            if texto.startswith("i", fim) and (fim + 1 == len(texto) or texto[fim + 1].isspace()):
+                fim += 1
+            valor = texto[posicao:fim]
+        elif texto.startswith('"', posicao):
+            fim = texto.find('"', posicao + 1)
+            if fim == -1:
+                raise ErroConsulta("Aspas sem fechamento")
+            valor = texto[posicao + 1:fim]
+            fim += 1
+        else:
+            fim = posicao
+            while fim < len(texto) and not texto[fim].isspace():
+                fim += 1
+            valor = texto[posicao:fim]
+        if not valor and chave is None:
+            raise ErroConsulta("Termo vazio")
+        tokens.append((negado, chave, valor))
+        posicao = fim
+    return tokens
+
+def _glob_para_regex(padrao):
+    """Converte um glob (com ``**``) numa regex para caminhos com "/" """
+    partes = []
+    i = 0
+    while i < len(padrao):
+        caractere = padrao[i]
+        if padrao.startswith("**/", i):
+            partes.append("(?:.*/)?")
+            i += 3
+            continue
+        if padrao.startswith("**", i):
+            partes.append(".*")
+            i += 2
+            continue
+        if caractere == "*":
+            partes.append("[^/]*")
+        elif caractere == "?":
+            partes.append("[^/]")
+        elif caractere == "[":
+            fim = padrao.find("]", i + 1)
+            if fim == -1:
+                partes.append(re.escape(caractere))
+            else:
+                classe = padrao[i + 1:fim]
+                if classe.startswith("!"):
+                    classe = "^" + classe[1:]
+                partes.append("[" + classe.replace("\\", "\\\\") + "]")
+                i = fim
+        else:
+            partes.append(re.escape(caractere))
+        i += 1
+    return "".join(partes) + r"\Z"
+
+def _compilar_glob(padrao):
+    """Compila o glob; classes inválidas (ex.: ``[z-a]``) viram ErroConsulta"""
+    try:
+        return re.compile(_glob_para_regex(padrao))
+    except re.error as e:
+        raise ErroConsulta(f"Padrão inválido: {padrao!r} ({e})") from None
+
+def _comparacao(valor, chave):
+    encontrado = _COMPARACAO.match(valor.strip())
+    if not encontrado:
+        raise ErroConsulta(f"Valor inválido para {chave}: {valor!r}")
+    return _OPERADORES[encontrado.group(1) or ""], encontrado.group(2).strip().lower()
+
+def _finito(numero, valor):
+    """Rejeita números que estouram o float (ex.: uma sequência enorme de dígitos)"""
+    if not math.isfinite(numero):
+        raise ErroConsulta(f"Valor grande demais: {valor!r}")
+    return numero
+
+def _condicao_tamanho(valor):
+    operador, numero = _comparacao(valor, "size")
+    encontrado = _NUMERO_UNIDADE.match(numero)
+    if not encontrado or encontrado.group(2) not in _UNIDADES_TAMANHO:
+        raise ErroConsulta(f"Tamanho inválido: {valor!r} (ex.: size:>10MB)")
+    limite = int(_finito(float(encontrado.group(1)) * _UNIDADES_TAMANHO[encontrado.group(2)], valor))
+    return f"tamanhos[i] {operador} {limite!r}"
+
+def _condicao_mtime(valor, agora):
+    operador, numero = _comparacao(valor, "mtime")
+    encontrado = _NUMERO_UNIDADE.match(numero)
+    if encontrado and encontrado.group(2) in _UNIDADES_TEMPO:
+        # Idade: mtime:<30d = modificado há menos de 30 dias
+        idade = _finito(float(encontrado.group(1)) * _UNIDADES_TEMPO[encontrado.group(2)], valor)
+        return f"mtimes[i] {_INVERSO[operador]} {agora - idade!r}"
+    try:
+        # Data: mtime:>2024-01-31 = modificado depois dessa data
+        data = datetime.strptime(numero, "%Y-%m-%d").timestamp()
+    except ValueError:
+        raise ErroConsulta(f"Data inválida: {valor!r} (ex.: mtime:<30d ou mtime:>2024-01-31)") from None
+    if operador == "==":
+        return f"{data!r} <= mtimes[i] < {data + 86400!r}"
+    if operador in (">", "<="):
+        # O dia inteiro conta como "até a data"
+        data += 86400
+    return f"mtimes[i] {operador} {data!r}"
+
+def _condicao_tipo(valor):
+    valor = valor.lower()
+    if valor in ("f", "file", "arquivo"):
+        return "not S_ISDIR(modos[i])"
+    if valor in ("d", "dir", "pasta"):
+        return "S_ISDIR(modos[i])"
+    raise ErroConsulta(f"Tipo inválido: {valor!r} (use type:f ou type:d)")
+
+def _regex(valor):
+    flags = 0
+    if len(valor) >= 2 and valor.startswith("/"):
+        if valor.endswith("/i"):
+            valor, flags = valor[1:-2], re.IGNORECASE
+        else:
+            valor = valor[1:-1]
+    try:
+        return re.compile(valor, flags)
+    except re.error as e:
+        raise ErroConsulta(f"Expressão regular inválida: {e}") from None
+
+class Consulta:
+    """Consulta compilada sobre um SnapshotArvore.
+
+    Termos sobre o nome (texto, ``ext:``, ``name:``, ``re:``) são avaliados
+    uma vez por nome distinto, pelo índice de nomes; ``path:`` percorre só a
+    subárvore do prefixo literal do glob. Os termos sobre colunas
+    (``size:``, ``mtime:``, ``type:``) viram uma única função gerada, que
+    filtra os candidatos numa passada pelas colunas do snapshot.
+    """
+
+    def __init__(self, texto, agora=None):
+        self.texto = texto
+        agora = time.time() if agora is None else agora
+        # Termos de nome/caminho: (negado, tipo, argumento)
+        self.termos = []
+        condicoes = []
+        for negado, chave, valor in _tokenizar(texto):
+            if chave == "size":
+                # Só arquivos têm tamanho; o de uma pasta é o da entrada de diretório
+                condicao = _condicao_tamanho(valor)
+                condicoes.append(f"(S_ISREG(modos[i]) and {'not ' if negado else ''}({condicao}))")
+            elif chave in ("mtime", "type"):
+                if chave == "mtime":
+                    condicao = _condicao_mtime(valor, agora)
+                else:
+                    condicao = _condicao_tipo(valor)
+                condicoes.append(f"not ({condicao})" if negado else f"({condicao})")
+            elif chave == "ext":
+                extensoes = [e.lower().lstrip(".") for e in valor.split(",") if e.strip(". ")]
+                if not extensoes:
+                    raise ErroConsulta("Informe a extensão (ex.: ext:py)")
+                self.termos.append((negado, "ext", extensoes))
+            elif chave == "re":
+                self.termos.append((negado, "re", _regex(valor)))
+            elif chave == "path":
+                padrao = valor.strip("/").lower()
+                partes = padrao.split("/") if padrao else []
+                if not any(c in padrao for c in "*?["):
+                    # path:src = a própria entrada src e tudo o que está dentro dela
+                    self.termos.append((negado, "path", (partes, None)))
+                elif len(partes) == 1:
+                    self.termos.append((negado, "name", _compilar_glob(padrao)))
+                else:
+                    literais = []
+                    for parte in partes[:-1]:
+                        if any(c in parte for c in "*?["):
+                            break
+                        literais.append(parte)
+                    regex = _compilar_glob("/".join(partes[len(literais):]))
+                    self.termos.append((negado, "path", (literais, regex)))
+            elif chave == "name" or any(c in valor for c in "*?["):
+                self.termos.append((negado, "name", _compilar_glob(valor.lower())))
+            elif valor.startswith("~"):
+                self.termos.append((negado, "aproximado", valor[1:]))
+            else:
+                self.termos.append((negado, "texto", valor))
+
+        self._filtrar = None
+        if condicoes:
+            fonte = ("def filtrar(indices, tamanhos, mtimes, modos):\n"
+                     f"    return [i for i in indices if {' and '.join(condicoes)}]\n")
+            namespace = {"S_ISDIR": stat.S_ISDIR, "S_ISREG": stat.S_ISREG}
+            exec(compile(fonte, "<consulta>", "exec"), namespace)
+            self._filtrar = namespace["filtrar"]
+
+    def _entradas_do_termo(self, snapshot, indice, tipo, argumento, token):
+        if tipo == "texto":
+            return indice.entradas_de(indice.ids_com(argumento))
+        if tipo == "aproximado":
+            return indice.buscar_aproximado(argumento)
+        if tipo == "ext":
+            ids = set()
+            for extensao in argumento:
+                ids.update(indice.ids_terminados_em("." + extensao))
+            return indice.entradas_de(ids)
+        if tipo == "name":
+            return indice.entradas_de(indice.ids_onde(lambda nome: argumento.match(nome)))
+        if tipo == "re":
+            return indice.entradas_de(indice.ids_onde(lambda nome: argumento.search(nome), minusculas=False))
+        literais, regex = argumento
+        return self._entradas_caminho(snapshot, literais, regex, token)
+
+    def _entradas_caminho(self, snapshot, literais, regex, token):
+        """Entradas abaixo do prefixo ``literais`` cujo caminho casa com ``regex``.
+
+        O prefixo é resolvido sem diferenciar maiúsculas, como o resto do
+        glob, e pode levar a mais de uma pasta. Sem ``regex``, retorna as
+        entradas do prefixo e tudo o que está dentro delas.
+        """
+        nomes = snapshot.nomes
+        qtd_filhos = snapshot.qtd_filhos
+        bases = [0]
+        for literal in literais:
+            bases = [filho for base in bases for filho in snapshot.filhos(base)
+                     if nomes[filho].lower() == literal]
+        encontrados = [] if regex is not None else list(bases)
+        for base in bases:
+            verificar(token)
+            if regex is None:
+                encontrados.extend(indice for indice, _, _ in snapshot.percorrer(base))
+                continue
+            # Caminho (relativo à base) da pasta aberta em cada nível do percurso
+            prefixos = [""]
+            for posicao, (indice, nivel, _) in enumerate(snapshot.percorrer(base)):
+                if posicao % 65536 == 0:
+                    verificar(token)
+                del prefixos[nivel + 1:]
+                caminho = prefixos[nivel] + nomes[indice].lower()
+                if regex.match(caminho):
+                    encontrados.append(indice)
+                if qtd_filhos[indice]:
+                    prefixos.append(caminho + "/")
+        return encontrados
+
+    def executar(self, snapshot, token=None):
+        """Retorna, em ordem crescente, as entradas que satisfazem a consulta"""
+        indice = indice_de(snapshot)
+        candidatos = None
+        excluidos = set()
+        for negado, tipo, argumento in self.termos:
+            verificar(token)
+            entradas = self._entradas_do_termo(snapshot, indice, tipo, argumento, token)
+            if negado:
+                excluidos.update(entradas)
+            elif candidatos is None:
+                candidatos = set(entradas)
+            else:
+                candidatos.intersection_update(entradas)
+        if candidatos is None:
+            indices = range(1, len(snapshot))
+        else:
+            candidatos.discard(0)
+            indices = sorted(candidatos)
+        if excluidos:
+            indices = [i for i in indices if i not in excluidos]
+        verificar(token)
+        if self._filtrar is not None:
+            indices = self._filtrar(indices, snapshot.tamanhos, snapshot.mtimes, snapshot.modos)
+        return list(indices)
+
+@functools.lru_cache(maxsize=64)
+def _compilar(texto, minuto):
+    return Consulta(texto)
+
+def compilar_consulta(texto):
+    """Compila (com cache) a consulta; levanta ErroConsulta se for inválida.
+
+    Exemplos: ``relatorio``, ``~relatoro``, ``ext:py,js``, ``size:>10MB``,
+    ``mtime:<30d``, ``mtime:>2024-01-31``, ``path:src/**``, ``*.log``,
+    ``re:/test_.*\\.py/``, ``type:d``, ``-ext:pyc``. Os termos são combinados
+    com "e"; ``-`` nega um termo.
+    """
+    # Idades (mtime:<30d) são relativas ao momento da compilação
+    return _compilar(texto.strip(), int(time.time() // 60))
+
+def executar_consulta(snapshot, texto, token=None):
+    """Compila e executa ``texto`` sobre ``snapshot``"""
+    return compilar_consulta(texto).executar(snapshot, token)
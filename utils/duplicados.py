@@ -0,0 +1,155 @@
+"""Busca de arquivos duplicados em etapas, da mais barata para a mais cara.
+
+1. Os arquivos do snapshot são agrupados pelo tamanho, sem ler nada.
+2. Nos tamanhos repetidos, compara-se o hash de uma amostra do início e
+   do fim de cada arquivo.
+3. Os arquivos que continuam empatados têm o conteúdo inteiro comparado.
+
+As leituras de cada etapa são feitas em paralelo por um
+ThreadPoolExecutor (o hashlib libera o GIL em blocos grandes) e o
+conteúdo inteiro é lido por mmap.
+"""
+import hashlib
+import mmap
+import os
+import stat
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.jobs import verificar
+
+# Bytes lidos do início e do fim de cada arquivo na segunda etapa
+TAMANHO_AMOSTRA = 64 * 1024
+
+# Bytes do mmap passados ao hash entre duas verificações de cancelamento
+TAMANHO_BLOCO = 8 * 1024 * 1024
+
+# Leituras em andamento ao mesmo tempo
+WORKERS_LEITURA = 8
+
+# Arquivos amostrados por tarefa: agrupar dilui o custo de cada tarefa do
+# executor, que é da ordem do custo de amostrar um arquivo pequeno
+LOTE_AMOSTRAS = 64
+
+def _novo_hash():
+    return hashlib.blake2b(digest_size=16)
+
+def _abrir(caminho, tamanho):
+    """Abre ``caminho`` se ele ainda tiver o tamanho do snapshot (senão None)"""
+    arquivo = open(caminho, "rb", buffering=0)
+    info = os.fstat(arquivo.fileno())
+    if info.st_size != tamanho:
+        arquivo.close()
+        return None, None
+    return arquivo, (info.st_dev, info.st_ino)
+
+def _hash_amostra(caminho, tamanho, token):
+    """Hash do início e do fim do arquivo e a identidade (dispositivo, inode)"""
+    verificar(token)
+    arquivo, identidade = _abrir(caminho, tamanho)
+    if arquivo is None:
+        return None, None
+    with arquivo:
+        h = _novo_hash()
+        h.update(arquivo.read(TAMANHO_AMOSTRA))
+        if tamanho > TAMANHO_AMOSTRA:
+            arquivo.seek(max(tamanho - TAMANHO_AMOSTRA, TAMANHO_AMOSTRA))
+            h.update(arquivo.read(TAMANHO_AMOSTRA))
+    return h.digest(), identidade
+
+def hash_conteudo(caminho, tamanho, token=None):
+    """Hash do conteúdo inteiro, lido por mmap em blocos de TAMANHO_BLOCO.
+
+    Retorna None se o arquivo não tiver mais ``tamanho`` bytes.
+    """
+    arquivo, _ = _abrir(caminho, tamanho)
+    if arquivo is None:
+        return None
+    h = _novo_hash()
+    if not tamanho:
+        # Arquivos vazios não podem ser mapeados
+        arquivo.close()
+        return h.digest()
+    with arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        with memoryview(mapa) as visao:
+            for inicio in range(0, tamanho, TAMANHO_BLOCO):
+                verificar(token)
+                with visao[inicio:inicio + TAMANHO_BLOCO] as bloco:
+                    h.update(bloco)
+    return h.digest()
+
+def _processar_lote(funcao, lote, token):
+    resultados = []
+    for caminho, tamanho in lote:
+        try:
+            resultados.append(((caminho, tamanho), funcao(caminho, tamanho, token)))
+        except OSError:
+            # Arquivo removido ou sem permissão desde a varredura
+            pass
+    return resultados
+
+def processar_em_paralelo(funcao, itens, workers, token, ao_progredir=None, lote=1):
+    """Aplica ``funcao(caminho, tamanho, token)`` aos itens (caminho, tamanho).
+
+    Cada tarefa do executor processa ``lote`` itens. Retorna {item: resultado};
+    itens que não puderam ser lidos ficam de fora.
+    """
+    resultados = {}
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+    try:
+        futuros = {executor.submit(_processar_lote, funcao, itens[i:i + lote], token): min(lote, len(itens) - i)
+                   for i in range(0, len(itens), lote)}
+        feitos = 0
+        for futuro in as_completed(futuros):
+            verificar(token)
+            resultados.update(futuro.result())
+            feitos += futuros[futuro]
+            if ao_progredir is not None:
+                ao_progredir(feitos, len(itens))
+    finally:
+        executor.shutdown(cancel_futures=True)
+    return resultados
+
+def encontrar_duplicados(snapshot, token=None, ao_progredir=None, workers=WORKERS_LEITURA):
+    """Retorna os grupos de arquivos de conteúdo idêntico do snapshot.
+
+    Cada grupo é um dicionário com "tamanho", "caminhos" (em ordem) e
+    "recuperavel", os bytes liberados mantendo uma única cópia; os grupos
+    vêm do maior recuperável para o menor. Arquivos vazios e links não
+    entram, e links físicos para o mesmo arquivo contam como uma cópia só.
+    ``ao_progredir(etapa, feitos, total)`` acompanha as leituras.
+    """
+    # Etapa 1: tamanhos repetidos, direto das colunas do snapshot
+    por_tamanho = defaultdict(list)
+    modos, tamanhos, flags = snapshot.modos, snapshot.tamanhos, snapshot.flags
+    for indice in range(1, len(snapshot)):
+        if tamanhos[indice] > 0 and stat.S_ISREG(modos[indice]) and not flags[indice] & snapshot.FLAG_LINK:
+            por_tamanho[tamanhos[indice]].append(indice)
+    verificar(token)
+    candidatos = [(snapshot.caminho(i), tamanho)
+                  for tamanho, indices in por_tamanho.items() if len(indices) > 1 for i in indices]
+
+    # Etapa 2: amostras do início e do fim
+    progresso = (lambda feitos, total: ao_progredir("amostras", feitos, total)) if ao_progredir else None
+    amostras = processar_em_paralelo(_hash_amostra, candidatos, workers, token, progresso, LOTE_AMOSTRAS)
+    grupos = defaultdict(dict)
+    for (caminho, tamanho), (digest, identidade) in amostras.items():
+        if digest is not None:
+            # Links físicos do mesmo arquivo ocupam o espaço uma vez só
+            copias = grupos[(tamanho, digest)]
+            copias[identidade] = min(caminho, copias.get(identidade, caminho))
+    grupos = [(tamanho, sorted(copias.values())) for (tamanho, _), copias in grupos.items() if len(copias) > 1]
+
+    # Etapa 3: conteúdo inteiro, só quando a amostra não cobriu o arquivo todo
+    duplicados = [(tamanho, caminhos) for tamanho, caminhos in grupos if tamanho <= 2 * TAMANHO_AMOSTRA]
+    restantes = [(caminho, tamanho) for tamanho, caminhos in grupos if tamanho > 2 * TAMANHO_AMOSTRA for caminho in caminhos]
+    progresso = (lambda feitos, total: ao_progredir("conteúdo", feitos, total)) if ao_progredir else None
+    completos = defaultdict(list)
+    for (caminho, tamanho), digest in processar_em_paralelo(hash_conteudo, restantes, workers, token, progresso).items():
+        if digest is not None:
+            completos[(tamanho, digest)].append(caminho)
+    duplicados.extend((tamanho, sorted(caminhos)) for (tamanho, _), caminhos in completos.items() if len(caminhos) > 1)
+
+    resultado = [{"tamanho": tamanho, "caminhos": caminhos, "recuperavel": tamanho * (len(caminhos) - 1)}
+                 for tamanho, caminhos in duplicados]
+    resultado.sort(key=lambda grupo: (-grupo["recuperavel"], grupo["caminhos"][0]))
+    return resultado
@@ -0,0 +1,370 @@
+"""Cálculo das estatísticas de um snapshot, separado da interface.
+
+As contas são feitas por colunas: as colunas de arquivos são filtradas
+de uma vez (itertools.compress), extensões e arquivos ocultos são
+avaliados uma vez por nome distinto da tabela de nomes e o mês de cada
+data é localizado por busca binária nos limites dos meses, calculados uma
+única vez.
+
+Os totais ficam guardados por snapshot. Eles são somas das contribuições
+de cada pasta (os seus filhos diretos), então quando uma varredura
+reaproveita um snapshot só as contribuições das pastas relistadas ou
+removidas são subtraídas e as das pastas listadas somadas.
+"""
+import os
+import threading
+import weakref
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from datetime import datetime
+from itertools import compress, repeat
+from utils.jobs import verificar
+from utils.scanner import observar_atualizacoes
+
+# Categorias de arquivo pela extensão
+MAPA_CATEGORIAS = {
+    "código": ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c', '.h', '.php'],
+    "imagem": ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp'],
+    "documento": ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.txt', '.md', '.odt', '.ods'],
+    "áudio": ['.mp3', '.wav', '.flac', '.aac', '.ogg'],
+    "vídeo": ['.mp4', '.avi', '.mkv', '.mov', '.webm'],
+    "compactado": ['.zip', '.rar', '.7z', '.tar', '.gz']
+}
+CATEGORIAS_EXTENSOES = {ext: categoria for categoria, exts in MAPA_CATEGORIAS.items() for ext in exts}
+
+LIMITE_PEQUENO = 10 * 1024  # Arquivos menores que 10KB
+LIMITE_GRANDE = 10 * 1024 * 1024  # Arquivos maiores que 10MB
+
+_TIPO = 0o170000
+_PASTA = 0o040000
+
+# Totais já calculados, por snapshot (descartados junto com o snapshot)
+_AGREGADOS = weakref.WeakKeyDictionary()
+_TRAVA = threading.Lock()
+
+class AgregadosEstatisticas:
+    """Totais das estatísticas de um conjunto de entradas.
+
+    Somas e contagens podem ser somadas e subtraídas; os arquivos notáveis
+    (índices no snapshot) não, e são reavaliados quando o arquivo que
+    ocupava a posição some.
+    """
+
+    SOMAS = ("total_arquivos", "total_tamanho", "arquivos_vazios", "arquivos_pequenos",
+             "arquivos_grandes", "arquivos_ocultos", "arquivos_somente_leitura")
+    CONTAGENS = ("extensoes", "arquivos_por_mes", "tamanho_por_mes", "pastas_por_nivel")
+    # Arquivo notável -> (coluna comparada, se vale o maior valor)
+    NOTAVEIS = {
+        "maior_arquivo": ("tamanhos", True),
+        "arquivo_mais_recente": ("mtimes", True),
+        "arquivo_mais_antigo": ("mtimes", False),
+    }
+
+    def __init__(self):
+        for campo in self.SOMAS:
+            setattr(self, campo, 0)
+        for campo in self.CONTAGENS:
+            setattr(self, campo, Counter())
+        self.notaveis = dict.fromkeys(self.NOTAVEIS)
+        # Quantidade de entradas do snapshot quando os totais foram calculados
+        self.tamanho = 0
+
+    def copiar(self):
+        copia = AgregadosEstatisticas()
+        for campo in self.SOMAS:
+            setattr(copia, campo, getattr(self, campo))
+        for campo in self.CONTAGENS:
+            setattr(copia, campo, Counter(getattr(self, campo)))
+        copia.notaveis = dict(self.notaveis)
+        copia.tamanho = self.tamanho
+        return copia
+
+    def somar(self, outro, sinal=1):
+        for campo in self.SOMAS:
+            setattr(self, campo, getattr(self, campo) + sinal * getattr(outro, campo))
+        for campo in self.CONTAGENS:
+            contagem = getattr(self, campo)
+            for chave, valor in getattr(outro, campo).items():
+                contagem[chave] += sinal * valor
+        if sinal < 0:
+            self._limpar()
+
+    def subtrair(self, outro):
+        self.somar(outro, -1)
+
+    def _limpar(self):
+        """Remove as chaves que ficaram sem entradas depois de uma subtração"""
+        for contagem in (self.extensoes, self.pastas_por_nivel):
+            for chave in [c for c, qtd in contagem.items() if qtd <= 0]:
+                del contagem[chave]
+        for mes in [m for m, qtd in self.arquivos_por_mes.items() if qtd <= 0]:
+            del self.arquivos_por_mes[mes]
+            self.tamanho_por_mes.pop(mes, None)
+
+def _melhor(coluna, indices, maior):
+    """Primeiro índice com o maior (ou menor) valor em ``coluna`` (ou None)"""
+    if not indices:
+        return None
+    return (max if maior else min)(indices, key=coluna.__getitem__)
+
+def _meses(mtimes, tamanhos):
+    """Quantidade e tamanho dos arquivos por mês de modificação (AAAA-MM, hora local)"""
+    arquivos_por_mes = defaultdict(int)
+    tamanho_por_mes = defaultdict(int)
+    if not mtimes:
+        return arquivos_por_mes, tamanho_por_mes
+    # Início de cada mês (a partir do segundo) entre a data mais antiga e a mais recente
+    inicio = datetime.fromtimestamp(min(mtimes))
+    fim = datetime.fromtimestamp(max(mtimes))
+    rotulos, limites = [], []
+    ano, mes = inicio.year, inicio.month
+    while (ano, mes) <= (fim.year, fim.month):
+        rotulos.append(f"{ano:04d}-{mes:02d}")
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+        limites.append(datetime(ano, mes, 1).timestamp() if ano <= 9999 else float("inf"))
+    posicoes = list(map(bisect_right, repeat(limites), mtimes))
+    somas = [0] * len(rotulos)
+    for posicao, tamanho in zip(posicoes, tamanhos):
+        somas[posicao] += tamanho
+    for posicao, qtd in Counter(posicoes).items():
+        arquivos_por_mes[rotulos[posicao]] = qtd
+        tamanho_por_mes[rotulos[posicao]] = somas[posicao]
+    return arquivos_por_mes, tamanho_por_mes
+
+def _somar_arquivos(agregados, snapshot, indices, tamanhos, mtimes, modos, ids_nomes):
+    """Soma aos agregados os arquivos ``indices`` (com as colunas já filtradas)"""
+    agregados.total_arquivos += len(indices)
+    agregados.total_tamanho += sum(tamanhos)
+
+    # Faixas de tamanho e permissões
+    agregados.arquivos_vazios += tamanhos.count(0)
+    agregados.arquivos_pequenos += sum(1 for t in tamanhos if 0 < t < LIMITE_PEQUENO)
+    agregados.arquivos_grandes += sum(1 for t in tamanhos if t > LIMITE_GRANDE)
+    agregados.arquivos_somente_leitura += sum(1 for m in modos if m & 0o600 == 0o400)
+
+    # Extensões e ocultos: uma vez por nome distinto
+    tabela = snapshot.tabela_nomes
+    for id_nome, qtd in Counter(ids_nomes).items():
+        nome = tabela[id_nome]
+        if nome.startswith("."):
+            agregados.arquivos_ocultos += qtd
+        agregados.extensoes[os.path.splitext(nome)[1].lower()] += qtd
+
+    arquivos_por_mes, tamanho_por_mes = _meses(mtimes, tamanhos)
+    agregados.arquivos_por_mes.update(arquivos_por_mes)
+    agregados.tamanho_por_mes.update(tamanho_por_mes)
+
+    # Arquivos notáveis, pela posição nas listas filtradas
+    for campo, (coluna, maior) in agregados.NOTAVEIS.items():
+        valores = tamanhos if coluna == "tamanhos" else mtimes
+        posicao = _melhor(valores, range(len(indices)), maior)
+        agregados.notaveis[campo] = indices[posicao] if posicao is not None else None
+
+def _agregar_tudo(snapshot, token=None):
+    """Agregados de todas as entradas do snapshot (sem a raiz)"""
+    modos = snapshot.modos
+    n = len(snapshot)
+    agregados = AgregadosEstatisticas()
+    agregados.tamanho = n
+
+    # Máscara dos arquivos; a raiz fica de fora
+    eh_arquivo = [m & _TIPO != _PASTA for m in modos]
+    if n:
+        eh_arquivo[0] = False
+    indices = list(compress(range(n), eh_arquivo))
+    tamanhos = list(compress(snapshot.tamanhos, eh_arquivo))
+    mtimes = list(compress(snapshot.mtimes, eh_arquivo))
+    modos_arquivos = list(compress(modos, eh_arquivo))
+    ids_nomes = compress(snapshot.ids_nomes, eh_arquivo)
+    verificar(token)
+    _somar_arquivos(agregados, snapshot, indices, tamanhos, mtimes, modos_arquivos, ids_nomes)
+    verificar(token)
+    if n:
+        agregados.pastas_por_nivel = _pastas_por_nivel(snapshot, eh_arquivo)
+    return agregados
+
+def _pastas_por_nivel(snapshot, eh_arquivo):
+    """Quantidade de pastas em cada nível abaixo da raiz (filhos da raiz: nível 1)"""
+    primeiro_filho, qtd_filhos = snapshot.primeiro_filho, snapshot.qtd_filhos
+    niveis = Counter()
+    profundidade = 0
+    nivel = [0]
+    while nivel:
+        proximo = []
+        for pasta in nivel:
+            qtd = qtd_filhos[pasta]
+            if qtd:
+                inicio = primeiro_filho[pasta]
+                proximo.extend(i for i in range(inicio, inicio + qtd) if not eh_arquivo[i])
+        if proximo:
+            profundidade += 1
+            niveis[profundidade] = len(proximo)
+        nivel = proximo
+    return niveis
+
+def _nivel(snapshot, indice):
+    """Quantidade de pastas entre a raiz e ``indice`` (a raiz está no nível 0)"""
+    nivel = 0
+    pais = snapshot.pais
+    while indice > 0:
+        indice = pais[indice]
+        nivel += 1
+    return nivel
+
+def _agregar_pastas(snapshot, pastas):
+    """Agregados dos filhos diretos de ``pastas`` (a contribuição dessas pastas)"""
+    agregados = AgregadosEstatisticas()
+    modos, tamanhos, mtimes, ids_nomes = snapshot.modos, snapshot.tamanhos, snapshot.mtimes, snapshot.ids_nomes
+    arquivos = []
+    for pasta in pastas:
+        qtd = snapshot.qtd_filhos[pasta]
+        if not qtd:
+            continue
+        inicio = snapshot.primeiro_filho[pasta]
+        filhos = range(inicio, inicio + qtd)
+        subpastas = sum(1 for i in filhos if modos[i] & _TIPO == _PASTA)
+        if subpastas:
+            agregados.pastas_por_nivel[_nivel(snapshot, pasta) + 1] += subpastas
+        arquivos.extend(i for i in filhos if modos[i] & _TIPO != _PASTA)
+    arquivos.sort()
+    _somar_arquivos(agregados, snapshot, arquivos,
+                    [tamanhos[i] for i in arquivos], [mtimes[i] for i in arquivos],
+                    [modos[i] for i in arquivos], [ids_nomes[i] for i in arquivos])
+    return agregados
+
+def _derivar(anterior, novo):
+    """Deriva os totais de ``novo`` dos de ``anterior`` (ouvinte das varreduras).
+
+    Só faz algo se os totais de ``anterior`` já foram calculados; o custo
+    é proporcional às pastas relistadas, não ao tamanho da árvore.
+    """
+    with _TRAVA:
+        base = _AGREGADOS.get(anterior)
+        if base is None or base.tamanho != len(anterior):
+            return
+
+        # Pastas do snapshot anterior cujos filhos diretos mudaram ou sumiram
+        removidas = set()
+        for indice, antigo in zip(novo.pastas_listadas, novo.antigos_listadas):
+            if antigo < 0:
+                continue
+            removidas.add(antigo)
+            atuais = {novo.nomes[i] for i in novo.filhos(indice) if novo.listavel(i)}
+            for filho in anterior.filhos(antigo):
+                if anterior.listavel(filho) and anterior.nomes[filho] not in atuais:
+                    # Subpasta removida: toda a subárvore sai dos totais
+                    removidas.add(filho)
+                    removidas.update(i for i, _, _ in anterior.percorrer(filho) if anterior.listavel(i))
+
+        agregados = base.copiar()
+        agregados.subtrair(_agregar_pastas(anterior, sorted(removidas)))
+        acrescidos = _agregar_pastas(novo, novo.pastas_listadas)
+        agregados.somar(acrescidos)
+        agregados.tamanho = len(novo)
+
+        # Um notável continua valendo se a sua pasta não mudou; ele é
+        # localizado pelo caminho e comparado aos arquivos acrescentados
+        arquivos = None
+        for campo, (coluna, maior) in agregados.NOTAVEIS.items():
+            candidatos = [acrescidos.notaveis[campo]]
+            indice = base.notaveis[campo]
+            if indice is not None:
+                if anterior.pais[indice] in removidas:
+                    if arquivos is None:
+                        arquivos = [i for i in range(1, len(novo)) if novo.modos[i] & _TIPO != _PASTA]
+                    candidatos = arquivos
+                else:
+                    candidatos.append(novo.localizar(anterior.caminho_relativo(indice)))
+            candidatos = sorted(i for i in candidatos if i is not None)
+            agregados.notaveis[campo] = _melhor(getattr(novo, coluna), candidatos, maior)
+        _AGREGADOS[novo] = agregados
+
+observar_atualizacoes(_derivar)
+
+def agregados_de(snapshot, token=None):
+    """Retorna os totais de ``snapshot``, calculando-os uma única vez.
+
+    Um snapshot ainda em construção tem os totais recalculados sempre que
+    tiver recebido novas entradas.
+    """
+    with _TRAVA:
+        agregados = _AGREGADOS.get(snapshot)
+        if agregados is not None and agregados.tamanho == len(snapshot):
+            return agregados
+    agregados = _agregar_tudo(snapshot, token)
+    with _TRAVA:
+        _AGREGADOS[snapshot] = agregados
+    return agregados
+
+def _previsao(total_tamanho, meses_ordenados, tamanho_por_mes):
+    """Taxa de crescimento (último mês vs. penúltimo) e previsão para 6 meses"""
+    taxa_crescimento = 0
+    previsao_tamanho_6meses = total_tamanho
+    if len(meses_ordenados) >= 2:
+        ultimo_mes = meses_ordenados[-1]
+        penultimo_mes = meses_ordenados[-2]
+        if tamanho_por_mes[penultimo_mes] > 0:
+            taxa_crescimento = (tamanho_por_mes[ultimo_mes] - tamanho_por_mes[penultimo_mes]) / tamanho_por_mes[penultimo_mes] * 100
+        # Crescimento composto
+        if taxa_crescimento > 0:
+            previsao_tamanho_6meses = total_tamanho * (1 + taxa_crescimento/100) ** 6
+    return taxa_crescimento, previsao_tamanho_6meses
+
+def calcular_estatisticas(snapshot, token=None):
+    """Calcula as estatísticas dos arquivos e pastas do snapshot (sem a raiz).
+
+    Retorna um dicionário com totais, contagens por extensão, categoria,
+    faixa de tamanho e mês de modificação, os arquivos notáveis e a
+    previsão de crescimento. Os totais vêm de ``agregados_de``; aqui só são
+    montados os resultados.
+    """
+    agregados = agregados_de(snapshot, token)
+    n = len(snapshot)
+
+    tipos_arquivos = defaultdict(int)
+    for ext, qtd in agregados.extensoes.items():
+        tipos_arquivos[CATEGORIAS_EXTENSOES.get(ext, "outro")] += qtd
+
+    # Arquivos notáveis
+    def notavel(indice, **campos):
+        return {"nome": snapshot.nomes[indice], **campos, "caminho": snapshot.caminho(indice)}
+    maior_arquivo = {"nome": "", "tamanho": 0, "caminho": ""}
+    arquivo_mais_recente = {"nome": "", "data": 0, "caminho": ""}
+    arquivo_mais_antigo = {"nome": "", "data": datetime.now().timestamp(), "caminho": ""}
+    indice = agregados.notaveis["maior_arquivo"]
+    if indice is not None and snapshot.tamanhos[indice] > 0:
+        maior_arquivo = notavel(indice, tamanho=snapshot.tamanhos[indice])
+    indice = agregados.notaveis["arquivo_mais_recente"]
+    if indice is not None:
+        arquivo_mais_recente = notavel(indice, data=snapshot.mtimes[indice])
+    indice = agregados.notaveis["arquivo_mais_antigo"]
+    if indice is not None and snapshot.mtimes[indice] < arquivo_mais_antigo["data"]:
+        arquivo_mais_antigo = notavel(indice, data=snapshot.mtimes[indice])
+
+    arquivos_por_mes = defaultdict(int, agregados.arquivos_por_mes)
+    tamanho_por_mes = defaultdict(int, agregados.tamanho_por_mes)
+    meses_ordenados = sorted(arquivos_por_mes)
+    total_tamanho = agregados.total_tamanho
+    taxa_crescimento, previsao_tamanho_6meses = _previsao(total_tamanho, meses_ordenados, tamanho_por_mes)
+
+    return {
+        "total_arquivos": agregados.total_arquivos,
+        "total_diretorios": max(n - 1 - agregados.total_arquivos, 0),
+        "total_tamanho": total_tamanho,
+        "maior_arquivo": maior_arquivo,
+        "arquivo_mais_recente": arquivo_mais_recente,
+        "arquivo_mais_antigo": arquivo_mais_antigo,
+        "extensoes": Counter(agregados.extensoes),
+        "tipos_arquivos": tipos_arquivos,
+        "profundidade_max": max(agregados.pastas_por_nivel, default=0),
+        "arquivos_por_mes": arquivos_por_mes,
+        "tamanho_por_mes": tamanho_por_mes,
+        "meses_ordenados": meses_ordenados,
+        "arquivos_vazios": agregados.arquivos_vazios,
+        "arquivos_pequenos": agregados.arquivos_pequenos,
+        "arquivos_grandes": agregados.arquivos_grandes,
+        "arquivos_ocultos": agregados.arquivos_ocultos,
+        "arquivos_somente_leitura": agregados.arquivos_somente_leitura,
+        "taxa_crescimento": taxa_crescimento,
+        "previsao_tamanho_6meses": previsao_tamanho_6meses,
+    }
@@ -1,6 +1,13 @@
 import os
+import stat
+import threading
+from array import array
 import flet as ft
 from flet import Colors, Icons
+from utils.scanner import obter_snapshot, snapshot_em_memoria, listar_pasta
+from utils.jobs import OperacaoCancelada
+from utils.indice_nomes import indice_de
+from utils.consulta import executar_consulta
 
 IGNORAR_PASTAS = {".git", "__pycache__"}
 
@@ -51,25 +58,191 @@ ICONES_EXTENSOES = {
     '': (Icons.DESCRIPTION, Colors.GREY_500)
 }
 
-def listar_estrutura_pasta(raiz):
-    estrutura = []
+# Acima deste número de entradas a árvore é desenhada em modo virtualizado
+LIMITE_ARVORE_VIRTUAL = 2000
+
+# Altura fixa de cada linha da árvore virtualizada
+ALTURA_LINHA = 32
+
+# Árvores virtualizadas na tela, pela raiz
+_ARVORES_VIRTUAIS = {}
+
+# Árvores tradicionais na tela, pela raiz: (nó raiz, coluna, termo de busca)
+_ARVORES_TRADICIONAIS = {}
+
+# Serializa as buscas, que redesenham os mesmos nós da árvore
+_TRAVA_BUSCA = threading.Lock()
+
+class NoArvore:
+    """Nó da árvore tradicional, com filhos carregados sob demanda.
+
+    Os filhos só são listados quando o nó é expandido e ficam memorizados,
+    inclusive depois de recolhido. Se a pasta já está no snapshot da sessão,
+    a listagem vem dele; caso contrário é feita com um único os.scandir,
+    que também fornece a quantidade de itens.
+    """
+
+    def __init__(self, caminho, nome, eh_pasta, pai=None, snapshot=None, indice=None):
+        self.caminho = caminho
+        self.nome = nome
+        self.eh_pasta = eh_pasta
+        self.pai = pai
+        self.snapshot = snapshot
+        self.indice = indice
+        self.filhos = None
+        self.erro = None
+        self.expandido = False
+        # Controles desenhados para o nó (memorizados junto com os filhos)
+        self.controles_filhos = None
+        self.nivel_filhos = 0
+        self.filtro = None
+        self.conteudo = None
+        self.contagem = None
+        # Mapas nome -> filho, refeitos quando o snapshot ou a lista de filhos mudam
+        self._indices_filhos = (None, None)
+        self._nos_filhos = (None, None)
+
+    @classmethod
+    def raiz(cls, caminho, snapshot=None):
+        return cls(caminho, os.path.basename(caminho) or caminho, True, snapshot=snapshot, indice=0 if snapshot else None)
+
+    @property
+    def qtd_itens(self):
+        """Quantidade de itens da pasta, se já conhecida (sem listar a pasta)"""
+        if self.filhos is not None:
+            return len(self.filhos)
+        self._sincronizar_snapshot()
+        if self.snapshot is not None and self.indice is not None and self.snapshot.listavel(self.indice):
+            return self.snapshot.qtd_filhos[self.indice]
+        return None
+
+    def caminho_relativo(self):
+        partes = []
+        no = self
+        while no.pai is not None:
+            partes.append(no.nome)
+            no = no.pai
+        return os.path.join(*reversed(partes)) if partes else ""
+
+    def _sincronizar_snapshot(self, atual=None):
+        """Passa a usar o snapshot mais recente da sessão, se houver um.
+
+        O novo índice vem do mapa nome -> índice dos filhos do pai, montado
+        uma vez por pasta e snapshot, em vez de percorrer os irmãos.
+        """
+        if atual is None:
+            raiz = self
+            while raiz.pai is not None:
+                raiz = raiz.pai
+            atual = snapshot_em_memoria(raiz.caminho)
+        if atual is None or atual is self.snapshot:
+            return
+        indice = 0 if self.pai is None else self.pai._indice_filho(atual, self.nome)
+        self.snapshot, self.indice = atual, indice
 
-    def walk(dir_path, nivel):
+    def _indice_filho(self, snapshot, nome):
+        """Índice em ``snapshot`` do filho ``nome`` desta pasta (ou None)"""
+        self._sincronizar_snapshot(snapshot)
+        if self.snapshot is not snapshot or self.indice is None:
+            return None
+        anterior, indices = self._indices_filhos
+        if anterior is not snapshot:
+            indices = {snapshot.nomes[i]: i for i in snapshot.filhos(self.indice)}
+            self._indices_filhos = (snapshot, indices)
+        return indices.get(nome)
+
+    def carregar(self):
+        """Lista os filhos do nó uma única vez e os memoriza"""
+        if self.filhos is not None:
+            return self.filhos
+        self._sincronizar_snapshot()
+        snapshot, indice = self.snapshot, self.indice
+        self.erro = None
+        if snapshot is not None and indice is not None and snapshot.listavel(indice):
+            if indice in snapshot.erros:
+                self.erro = snapshot.erros[indice]
+                self.filhos = []
+            else:
+                self.filhos = [
+                    NoArvore(os.path.join(self.caminho, snapshot.nomes[i]), snapshot.nomes[i],
+                             snapshot.eh_pasta(i), self, snapshot, i)
+                    for i in snapshot.filhos(indice)
+                ]
+            return self.filhos
         try:
-            for item in sorted(os.listdir(dir_path)):
-                caminho = os.path.join(dir_path, item)
-                if os.path.isdir(caminho) and item not in IGNORAR_PASTAS:
-                    estrutura.append((nivel, f"📁 {item}"))
-                    walk(caminho, nivel + 1)
-                elif os.path.isfile(caminho):
-                    estrutura.append((nivel, f"📄 {item}"))
+            self.filhos = [
+                NoArvore(os.path.join(self.caminho, nome), nome, stat.S_ISDIR(modo), self)
+                for nome, modo, _, _, _ in listar_pasta(self.caminho)
+            ]
         except PermissionError:
-            estrutura.append((nivel, "🚫 Sem permissão"))
+            self.erro = "Sem permissão de acesso"
+            self.filhos = []
+        except OSError as e:
+            self.erro = str(e)
+            self.filhos = []
+        return self.filhos
+
+    def erro_conhecido(self):
+        """Erro de leitura da pasta, se já conhecido (sem listar a pasta)"""
+        if self.erro:
+            return self.erro
+        self._sincronizar_snapshot()
+        if self.snapshot is not None and self.indice is not None:
+            return self.snapshot.erros.get(self.indice)
+        return None
+
+    def invalidar(self):
+        """Descarta os filhos memorizados (a pasta mudou no disco)"""
+        self.filhos = None
+        self.controles_filhos = None
+        self.erro = None
+
+    def localizar(self, caminho_relativo):
+        """Procura um descendente já carregado pelo caminho relativo"""
+        no = self
+        for parte in caminho_relativo.replace("\\", "/").split("/"):
+            if not parte or parte == ".":
+                continue
+            if no.filhos is None:
+                return None
+            filhos, por_nome = no._nos_filhos
+            if filhos is not no.filhos:
+                por_nome = {f.nome: f for f in no.filhos}
+                no._nos_filhos = (no.filhos, por_nome)
+            no = por_nome.get(parte)
+            if no is None:
+                return None
+        return no
+
+def listar_estrutura_pasta(raiz):
+    snapshot = obter_snapshot(raiz)
+    estrutura = []
+    ignorados = set()
 
-    walk(raiz, 0)
+    if 0 in snapshot.erros:
+        estrutura.append((0, "🚫 Sem permissão"))
+    for indice, nivel, _ in snapshot.percorrer():
+        pai = snapshot.pais[indice]
+        if pai in ignorados:
+            ignorados.add(indice)
+            continue
+        if snapshot.eh_pasta(indice):
+            if snapshot.nomes[indice] in IGNORAR_PASTAS:
+                ignorados.add(indice)
+                continue
+            estrutura.append((nivel, f"📁 {snapshot.nomes[indice]}"))
+            if indice in snapshot.erros:
+                estrutura.append((nivel + 1, "🚫 Sem permissão"))
+        else:
+            estrutura.append((nivel, f"📄 {snapshot.nomes[indice]}"))
     return estrutura
 
-def gerar_arvore(txt_pasta, container, termo_busca=""):
+def gerar_arvore(txt_pasta, container, termo_busca="", forcar=False, token=None, snapshot=None):
+    """Desenha a árvore de ``txt_pasta`` em ``container``.
+
+    ``snapshot`` evita obter (e revalidar) de novo um snapshot que quem
+    chama já tem.
+    """
     container.controls.clear()
     if not txt_pasta.value:
         container.controls.append(ft.Text("Selecione uma pasta para visualizar"))
@@ -79,131 +252,197 @@ def gerar_arvore(txt_pasta, container, termo_busca=""):
     try:
         raiz_caminho = txt_pasta.value
         nome_raiz = os.path.basename(raiz_caminho) or raiz_caminho
+        if snapshot is None:
+            snapshot = obter_snapshot(raiz_caminho, forcar=forcar, token=token)
         
         # Adiciona o título da pasta raiz
-        container.controls.append(
-            ft.Container(
-                content=ft.Row([
-                    ft.Icon(Icons.FOLDER, color=Colors.BLUE_400, size=24),
-                    ft.Text(nome_raiz, size=18, weight=ft.FontWeight.BOLD)
-                ]),
-                padding=10,
-                bgcolor=Colors.BLUE_GREY_800,
-                border_radius=10
-            )
-        )
+        container.controls.append(_cabecalho_raiz(nome_raiz))
         
         # Cria os itens da árvore
-        itens = criar_itens_arvore(raiz_caminho, termo_busca)
-        for item in itens:
-            container.controls.append(item)
+        raiz_abs = os.path.abspath(raiz_caminho)
+        _ARVORES_TRADICIONAIS.pop(raiz_abs, None)
+        _ARVORES_VIRTUAIS.pop(raiz_abs, None)
+        
+        if len(snapshot) > LIMITE_ARVORE_VIRTUAL:
+            # Pastas grandes: só as linhas visíveis viram controles
+            arvore = ArvoreVirtual(snapshot, termo_busca)
+            _ARVORES_VIRTUAIS[raiz_abs] = arvore
+            container.controls.append(arvore.controle)
+            return
+        
+        no_raiz = NoArvore.raiz(raiz_caminho, snapshot)
+        coluna_raiz = ft.Column(criar_itens_arvore(no_raiz, _filtro_busca(snapshot, termo_busca)), spacing=10)
+        _ARVORES_TRADICIONAIS[raiz_abs] = (no_raiz, coluna_raiz, termo_busca)
+        container.controls.append(coluna_raiz)
             
+    except OperacaoCancelada:
+        raise
     except Exception as e:
-        container.controls.append(
-            ft.Container(
-                content=ft.Row([
-                    ft.Icon(Icons.ERROR, color=Colors.RED_400),
-                    ft.Text(f"Erro ao processar a pasta: {str(e)}", color=Colors.RED_400)
-                ]),
-                padding=10,
-                border_radius=8
-            )
+        _mostrar_erro(container, e)
+
+def _mostrar_erro(container, erro):
+    container.controls.append(
+        ft.Container(
+            content=ft.Row([
+                ft.Icon(Icons.ERROR, color=Colors.RED_400),
+                ft.Text(f"Erro ao processar a pasta: {str(erro)}", color=Colors.RED_400)
+            ]),
+            padding=10,
+            border_radius=8
         )
+    )
+
+def _cabecalho_raiz(nome_raiz):
+    return ft.Container(
+        content=ft.Row([
+            ft.Icon(Icons.FOLDER, color=Colors.BLUE_400, size=24),
+            ft.Text(nome_raiz, size=18, weight=ft.FontWeight.BOLD)
+        ]),
+        padding=10,
+        bgcolor=Colors.BLUE_GREY_800,
+        border_radius=10
+    )
 
-def criar_itens_arvore(caminho_pasta, termo_busca="", nivel=0):
-    """Cria os itens da árvore recursivamente sem usar ExpansionTile"""
+def gerar_arvore_progressiva(txt_pasta, container, termo_busca="", forcar=False,
+                             atualizar_tela=None, token=None):
+    """Versão de ``gerar_arvore`` para rodar fora da thread da interface.
+
+    Se a varredura demorar, as pastas já listadas aparecem numa ArvoreVirtual
+    que é atualizada a cada aviso de progresso, com um contador de itens, e
+    que já pode ser rolada e expandida. Ao final a árvore definitiva é
+    desenhada como em ``gerar_arvore``. Se ``token`` for cancelado, a tela
+    deixa de ser alterada e OperacaoCancelada é levantada.
+    """
+    if not txt_pasta.value:
+        gerar_arvore(txt_pasta, container, termo_busca)
+        if atualizar_tela:
+            atualizar_tela()
+        return
+    raiz_caminho = txt_pasta.value
+    atualizar_tela = atualizar_tela or (lambda: None)
+    parcial = {"arvore": None}
+
+    def ao_progredir(snapshot):
+        if token is not None and token.cancelado:
+            return
+        arvore = parcial["arvore"]
+        if arvore is None:
+            arvore = ArvoreVirtual(snapshot, termo_busca, varrendo=True)
+            parcial["arvore"] = arvore
+            container.controls.clear()
+            container.controls.append(_cabecalho_raiz(os.path.basename(raiz_caminho) or raiz_caminho))
+            container.controls.append(arvore.controle)
+        else:
+            arvore.trocar_snapshot(snapshot)
+        atualizar_tela()
+
+    try:
+        snapshot = obter_snapshot(raiz_caminho, forcar=forcar, ao_progredir=ao_progredir, token=token)
+    except OperacaoCancelada:
+        raise
+    except Exception as e:
+        if token is not None:
+            token.verificar()
+        container.controls.clear()
+        _mostrar_erro(container, e)
+        atualizar_tela()
+        return
+    if token is not None:
+        token.verificar()
+
+    arvore = parcial["arvore"]
+    if arvore is not None and len(snapshot) > LIMITE_ARVORE_VIRTUAL:
+        # Mantém a árvore parcial (e as pastas abertas durante a varredura)
+        raiz_abs = os.path.abspath(raiz_caminho)
+        _ARVORES_TRADICIONAIS.pop(raiz_abs, None)
+        arvore.varrendo = False
+        arvore.trocar_snapshot(snapshot)
+        _ARVORES_VIRTUAIS[raiz_abs] = arvore
+    else:
+        gerar_arvore(txt_pasta, container, termo_busca, token=token, snapshot=snapshot)
+    atualizar_tela()
+
+def _filtro_busca(snapshot, termo_busca):
+    """Caminhos relativos visíveis numa busca, em qualquer profundidade.
+
+    Retorna None sem busca; senão um dicionário caminho -> bool, que indica
+    se a pasta deve ser aberta por conter algum resultado.
+    """
+    if not termo_busca:
+        return None
+    visiveis = indice_de(snapshot).com_ancestrais(executar_consulta(snapshot, termo_busca))
+    pais = snapshot.pais
+    abertas = {pais[i] for i in visiveis}
+    return {snapshot.caminho_relativo(i): i in abertas for i in visiveis}
+
+def criar_itens_arvore(no, filtro=None, nivel=0):
+    """Cria os itens da árvore recursivamente sem usar ExpansionTile.
+
+    ``filtro`` é o resultado de ``_filtro_busca``: apenas as entradas nele
+    aparecem, e as pastas com resultados já vêm abertas.
+    """
     itens = []
     
     # Limita a profundidade máxima para evitar problemas de performance
     MAX_PROFUNDIDADE = 2
     
     try:
-        entradas = sorted(os.listdir(caminho_pasta))
+        filhos = no.carregar()
+        if no.erro:
+            raise PermissionError(no.erro)
         
-        # Separar pastas e arquivos
-        pastas = [e for e in entradas if os.path.isdir(os.path.join(caminho_pasta, e)) and e not in IGNORAR_PASTAS]
-        arquivos = [e for e in entradas if os.path.isfile(os.path.join(caminho_pasta, e))]
+        # Separar pastas e arquivos (a listagem já traz as pastas primeiro)
+        pastas = [f for f in filhos if f.eh_pasta and f.nome not in IGNORAR_PASTAS]
+        arquivos = [f for f in filhos if not f.eh_pasta]
         
-        # Filtro de busca
-        if termo_busca:
-            termo_busca = termo_busca.lower()
-            pastas_filtradas = []
-            arquivos_filtrados = []
-            
-            # Filtra arquivos diretamente
-            arquivos_filtrados = [a for a in arquivos if termo_busca in a.lower()]
-            
-            # Para pastas, verifica se o nome da pasta contém o termo ou se algum filho contém
-            for pasta in pastas:
-                if termo_busca in pasta.lower():
-                    pastas_filtradas.append(pasta)
-                    continue
-                
-                # Verifica filhos apenas no primeiro nível para não impactar a performance
-                if nivel < 1:
-                    try:
-                        caminho_pasta_filho = os.path.join(caminho_pasta, pasta)
-                        filhos = os.listdir(caminho_pasta_filho)
-                        if any(termo_busca in filho.lower() for filho in filhos):
-                            pastas_filtradas.append(pasta)
-                    except:
-                        pass
-            
-            pastas = pastas_filtradas
-            arquivos = arquivos_filtrados
+        # Filtro de busca (resultados em qualquer profundidade, vindos do índice de nomes)
+        if filtro is not None:
+            pastas = [p for p in pastas if p.caminho_relativo() in filtro]
+            arquivos = [a for a in arquivos if a.caminho_relativo() in filtro]
         
         # Processar pastas
-        for pasta in pastas:
-            caminho_completo = os.path.join(caminho_pasta, pasta)
+        for pasta_no in pastas:
+            pasta = pasta_no.nome
             
             try:
-                qtd_itens = len(os.listdir(caminho_completo))
-                icone_pasta = Icons.FOLDER_SPECIAL if qtd_itens > 50 else Icons.FOLDER
+                erro = pasta_no.erro_conhecido()
+                if erro:
+                    raise PermissionError(erro)
+                qtd_itens = pasta_no.qtd_itens
+                icone_pasta = Icons.FOLDER_SPECIAL if (qtd_itens or 0) > 50 else Icons.FOLDER
                 
                 # Determina se deve expandir a pasta ou mostrar apenas um link para clicar
-                deve_expandir = nivel < MAX_PROFUNDIDADE and (nivel == 0 or termo_busca)
+                if filtro is not None:
+                    deve_expandir = filtro[pasta_no.caminho_relativo()]
+                else:
+                    deve_expandir = nivel < MAX_PROFUNDIDADE and nivel == 0
                 
-                # Cabeçalho da pasta sempre visível
+                # Cabeçalho da pasta sempre visível; a contagem só aparece
+                # quando a pasta já foi listada
+                pasta_no.contagem = ft.Text(_texto_contagem(qtd_itens), size=12, color=Colors.GREY_400)
                 cabecalho_pasta = ft.Container(
                     content=ft.Row([
                         ft.Icon(icone_pasta, color=Colors.BLUE_400, size=20),
                         ft.Text(pasta, weight=ft.FontWeight.BOLD),
-                        ft.Text(f" ({qtd_itens} itens)", size=12, color=Colors.GREY_400)
+                        pasta_no.contagem
                     ]),
                     padding=ft.padding.only(left=5, top=8, bottom=8, right=5),
                     bgcolor=Colors.BLUE_GREY_800,
                     border_radius=ft.border_radius.only(top_left=5, top_right=5),
-                    on_click=lambda e, p=caminho_completo: expandir_pasta(e, p)
+                    on_click=lambda e, n=pasta_no: alternar_pasta(e, n)
                 )
                 
                 # Conteúdo da pasta
+                pasta_no.conteudo = ft.Container(bgcolor=Colors.BLUE_GREY_900,
+                                                 border_radius=ft.border_radius.only(bottom_left=5, bottom_right=5))
+                pasta_no.expandido = bool(deve_expandir)
                 if deve_expandir:
                     # Expande a pasta e mostra o conteúdo
-                    conteudo_pasta = ft.Container(
-                        content=ft.Column(
-                            criar_itens_arvore(caminho_completo, termo_busca, nivel + 1),
-                            spacing=2
-                        ),
-                        padding=ft.padding.only(left=20),
-                        bgcolor=Colors.BLUE_GREY_900,
-                        border_radius=ft.border_radius.only(bottom_left=5, bottom_right=5)
-                    )
-                else:
-                    # Mostra apenas um link para expandir
-                    conteudo_pasta = ft.Container(
-                        content=ft.Column([
-                            ft.Container(
-                                content=ft.Row([
-                                    ft.Icon(Icons.ARROW_FORWARD, color=Colors.BLUE_300, size=14),
-                                    ft.Text("Clique para explorar...", italic=True, color=Colors.BLUE_300)
-                                ]),
-                                on_click=lambda e, p=caminho_completo: expandir_pasta(e, p)
-                            )
-                        ]),
-                        padding=ft.padding.only(left=20, top=5, bottom=5),
-                        bgcolor=Colors.BLUE_GREY_900,
-                        border_radius=ft.border_radius.only(bottom_left=5, bottom_right=5)
-                    )
+                    pasta_no.controles_filhos = criar_itens_arvore(pasta_no, filtro, nivel + 1)
+                    pasta_no.nivel_filhos = nivel + 1
+                    pasta_no.filtro = filtro
+                _desenhar_conteudo(pasta_no)
+                conteudo_pasta = pasta_no.conteudo
                 
                 # Container da pasta completa
                 container_pasta = ft.Container(
@@ -247,8 +486,8 @@ def criar_itens_arvore(caminho_pasta, termo_busca="", nivel=0):
                 itens.append(container_pasta)
         
         # Processar arquivos
-        for arquivo in arquivos:
-            caminho_completo = os.path.join(caminho_pasta, arquivo)
+        for arquivo_no in arquivos:
+            arquivo = arquivo_no.nome
             try:
                 extensao = os.path.splitext(arquivo)[1].lower()
                 icone, cor = ICONES_EXTENSOES.get(extensao, ICONES_EXTENSOES[''])
@@ -291,46 +530,367 @@ def criar_itens_arvore(caminho_pasta, termo_busca="", nivel=0):
         
     return itens
 
-def expandir_pasta(e, caminho):
-    """Expande uma pasta ao clicar nela"""
+def _texto_contagem(qtd_itens):
+    return f" ({qtd_itens} itens)" if qtd_itens is not None else ""
+
+def _desenhar_conteudo(no):
+    """Mostra os filhos memorizados do nó, ou o link para explorá-lo"""
+    if no.expandido and no.controles_filhos is not None:
+        no.conteudo.content = ft.Column(no.controles_filhos, spacing=2)
+        no.conteudo.padding = ft.padding.only(left=20)
+    else:
+        # Mostra apenas um link para expandir
+        no.conteudo.content = ft.Column([
+            ft.Container(
+                content=ft.Row([
+                    ft.Icon(Icons.ARROW_FORWARD, color=Colors.BLUE_300, size=14),
+                    ft.Text("Clique para explorar...", italic=True, color=Colors.BLUE_300)
+                ]),
+                on_click=lambda e, n=no: alternar_pasta(e, n)
+            )
+        ])
+        no.conteudo.padding = ft.padding.only(left=20, top=5, bottom=5)
+
+def alternar_pasta(e, no):
+    """Expande ou recolhe uma pasta ao clicar nela.
+
+    Ao expandir pela primeira vez os filhos são listados e desenhados; ao
+    recolher e expandir de novo, os controles memorizados são reaproveitados.
+    """
     try:
-        # Determina se o clique foi no cabeçalho ou no link "Clique para explorar"
-        # Se foi no link, o parent do control é a coluna, e precisamos do container pai
-        container = e.control
-        
-        # Se o container pai for uma coluna, precisamos subir mais um nível
-        if isinstance(container.content, ft.Row) and "Clique para explorar" in str(container.content.controls):
-            # Foi clicado no link "Clique para explorar"
-            # O pai da coluna é o container da pasta
-            coluna_pai = container.parent
-            if coluna_pai and isinstance(coluna_pai, ft.Column):
-                container_pasta = coluna_pai.parent
-                if container_pasta:
-                    # Substitui o conteúdo do segundo item (o conteúdo da pasta)
-                    coluna = container_pasta.content
-                    if isinstance(coluna, ft.Column) and len(coluna.controls) > 1:
-                        # Substitui o container de conteúdo pelo conteúdo novo
-                        coluna.controls[1] = ft.Container(
-                            content=ft.Column(criar_itens_arvore(caminho), spacing=2),
-                            padding=ft.padding.only(left=20),
-                            bgcolor=Colors.BLUE_GREY_900,
-                            border_radius=ft.border_radius.only(bottom_left=5, bottom_right=5)
-                        )
-                        coluna.update()
+        if no.expandido:
+            no.expandido = False
         else:
-            # Foi clicado no cabeçalho da pasta
-            # Procura o container da pasta (pai da coluna que contém o cabeçalho)
-            container_pasta = container.parent
-            if container_pasta and isinstance(container_pasta, ft.Column):
-                # O container da pasta tem uma coluna com [cabeçalho, conteúdo]
-                if len(container_pasta.controls) > 1:
-                    container_pasta.controls[1] = ft.Container(
-                        content=ft.Column(criar_itens_arvore(caminho), spacing=2),
-                        padding=ft.padding.only(left=20),
-                        bgcolor=Colors.BLUE_GREY_900,
-                        border_radius=ft.border_radius.only(bottom_left=5, bottom_right=5)
-                    )
-                    container_pasta.update()
+            no.expandido = True
+            if no.controles_filhos is None:
+                no.controles_filhos = criar_itens_arvore(no)
+                no.nivel_filhos = 0
+                no.filtro = None
+            if no.contagem is not None:
+                no.contagem.value = _texto_contagem(no.qtd_itens)
+        _desenhar_conteudo(no)
+        if no.conteudo.page:
+            no.conteudo.update()
+            if no.contagem is not None:
+                no.contagem.update()
     except Exception as e:
         print(f"Erro ao expandir pasta: {str(e)}")
         # Não faz nada no caso de erro para evitar quebrar a UI
+
+def atualizar_pastas(raiz, pastas=None):
+    """Redesenha apenas as pastas visíveis afetadas por alterações.
+
+    ``pastas`` é um conjunto de caminhos absolutos de pastas alteradas, ou
+    None para redesenhar todas as pastas visíveis de ``raiz``. Usa o
+    snapshot da sessão, que já deve ter recebido as alterações.
+    """
+    snapshot = snapshot_em_memoria(raiz)
+    if snapshot is None:
+        return
+    raiz_abs = os.path.abspath(raiz)
+    arvore = _ARVORES_VIRTUAIS.get(raiz_abs)
+    if arvore is not None:
+        arvore.trocar_snapshot(snapshot)
+
+    tradicional = _ARVORES_TRADICIONAIS.get(raiz_abs)
+    if tradicional is None:
+        return
+    no_raiz, coluna_raiz, termo_busca = tradicional
+    if pastas is None:
+        relativas = [""]
+    else:
+        relativas = []
+        for pasta in pastas:
+            relativa = os.path.relpath(os.path.abspath(pasta), raiz_abs)
+            relativas.append("" if relativa == "." else relativa)
+
+    for relativa in relativas:
+        no = no_raiz.localizar(relativa)
+        if no is None or not no.eh_pasta:
+            # Pasta ainda não carregada (ou já removida): nada a redesenhar
+            continue
+        try:
+            desenhada = no.controles_filhos is not None
+            no.invalidar()
+            if no is no_raiz:
+                coluna_raiz.controls = criar_itens_arvore(no_raiz, _filtro_busca(snapshot, termo_busca))
+                continue
+            if desenhada:
+                no.controles_filhos = criar_itens_arvore(no, no.filtro, no.nivel_filhos)
+                _desenhar_conteudo(no)
+            if no.contagem is not None:
+                no.contagem.value = _texto_contagem(no.qtd_itens)
+        except Exception as e:
+            print(f"Erro ao atualizar pasta {relativa}: {str(e)}")
+
+def aplicar_busca(raiz, termo_busca, token=None):
+    """Filtra a árvore já desenhada de ``raiz`` sem varrer a pasta de novo.
+
+    A busca usa o índice de nomes do snapshot da sessão e encontra entradas
+    em qualquer profundidade. Se ``token`` for cancelado (busca obsoleta),
+    o resultado é descartado. Retorna False se ``raiz`` ainda não tem uma
+    árvore pronta.
+    """
+    raiz_abs = os.path.abspath(raiz)
+    with _TRAVA_BUSCA:
+        if token is not None and token.cancelado:
+            return True
+        arvore = _ARVORES_VIRTUAIS.get(raiz_abs)
+        if arvore is not None:
+            arvore.buscar(termo_busca)
+            return True
+        tradicional = _ARVORES_TRADICIONAIS.get(raiz_abs)
+        snapshot = snapshot_em_memoria(raiz)
+        if tradicional is None or snapshot is None:
+            return False
+        no_raiz, coluna_raiz, _ = tradicional
+        coluna_raiz.controls = criar_itens_arvore(no_raiz, _filtro_busca(snapshot, termo_busca))
+        _ARVORES_TRADICIONAIS[raiz_abs] = (no_raiz, coluna_raiz, termo_busca)
+        if coluna_raiz.page:
+            coluna_raiz.update()
+        return True
+
+class ArvoreVirtual:
+    """Árvore virtualizada para pastas com muitas entradas.
+
+    As linhas visíveis da árvore ficam em um modelo plano (dois arrays com
+    o índice no snapshot e o nível de cada linha). Só existem controles
+    Flet para as linhas que cabem na janela do ListView; ao rolar, esses
+    mesmos controles são reaproveitados para as novas linhas, e dois
+    espaçadores mantêm a altura total da lista. Todas as linhas têm altura
+    fixa (ALTURA_LINHA), o que permite calcular a linha visível a partir
+    da posição de rolagem.
+    """
+
+    def __init__(self, snapshot, termo_busca="", altura=500, varrendo=False):
+        self.snapshot = snapshot
+        self.altura = altura
+        # Indica que o snapshot ainda está sendo varrido (recebe novas entradas)
+        self.varrendo = varrendo
+        # O modelo de linhas é alterado pela thread da varredura e pelos eventos
+        # da interface. O snapshot em si não usa esta trava: a varredura só
+        # publica os filhos de uma pasta depois de gravá-los (veja _varrer)
+        self._trava = threading.RLock()
+        self.termo_busca = termo_busca or ""
+        self.indices = array("i")
+        self.niveis = array("H")
+        self.primeira = 0
+        self.filtro = None
+        self.expandidos = {0}
+        if self.termo_busca:
+            self._aplicar_busca()
+        else:
+            # Como na árvore tradicional, as pastas do primeiro nível começam abertas
+            self.expandidos.update(i for i in snapshot.filhos(0) if self._visivel(i) and snapshot.eh_pasta(i))
+
+        qtd_controles = altura // ALTURA_LINHA + 10
+        self.espaco_topo = ft.Container(height=0)
+        self.espaco_base = ft.Container(height=0)
+        self.controles = [self._criar_linha() for _ in range(qtd_controles)]
+        self.contador = ft.Text("", size=12, color=Colors.GREY_400)
+        self.lista = ft.ListView(
+            controls=[self.espaco_topo, *self.controles, self.espaco_base],
+            height=altura,
+            spacing=0,
+            on_scroll=self._ao_rolar
+        )
+        self.controle = ft.Column([self.contador, self.lista], spacing=5)
+        self._recalcular()
+
+    def _visivel(self, indice):
+        if self.filtro is not None and indice not in self.filtro:
+            return False
+        return not (self.snapshot.eh_pasta(indice) and self.snapshot.nomes[indice] in IGNORAR_PASTAS)
+
+    def _aplicar_busca(self):
+        """Mantém visíveis as entradas encontradas e todas as pastas que as contêm"""
+        snapshot = self.snapshot
+        self.filtro = indice_de(snapshot).com_ancestrais(executar_consulta(snapshot, self.termo_busca))
+        self.expandidos = {0} | {i for i in self.filtro if snapshot.eh_pasta(i)}
+
+    def buscar(self, termo_busca):
+        """Aplica (ou limpa) uma busca sem recriar a árvore"""
+        with self._trava:
+            self.termo_busca = termo_busca or ""
+            self.primeira = 0
+            if self.termo_busca:
+                self._aplicar_busca()
+            else:
+                self.filtro = None
+                snapshot = self.snapshot
+                self.expandidos = {0} | {i for i in snapshot.filhos(0) if self._visivel(i) and snapshot.eh_pasta(i)}
+            self._recalcular()
+            self._atualizar_tela()
+
+    def _linhas_subarvore(self, indice, nivel):
+        """Retorna as linhas visíveis abaixo de ``indice`` em pré-ordem"""
+        indices = array("i")
+        niveis = array("H")
+        # Usa uma pilha de iteradores para não recursar em árvores profundas
+        pilha = [(iter(self.snapshot.filhos(indice)), nivel)]
+        while pilha:
+            filhos, nivel_atual = pilha[-1]
+            filho = next(filhos, None)
+            if filho is None:
+                pilha.pop()
+                continue
+            if not self._visivel(filho):
+                continue
+            indices.append(filho)
+            niveis.append(nivel_atual)
+            if filho in self.expandidos:
+                pilha.append((iter(self.snapshot.filhos(filho)), nivel_atual + 1))
+        return indices, niveis
+
+    def _recalcular(self):
+        self.indices, self.niveis = self._linhas_subarvore(0, 0)
+        self._redesenhar()
+
+    def _criar_linha(self):
+        icone = ft.Icon(Icons.FOLDER, size=18)
+        seta = ft.Icon(Icons.ARROW_RIGHT, size=16, color=Colors.BLUE_300)
+        nome = ft.Text("", no_wrap=True, overflow=ft.TextOverflow.ELLIPSIS)
+        detalhe = ft.Text("", size=12, color=Colors.GREY_400)
+        return ft.Container(
+            content=ft.Row([seta, icone, nome, detalhe], spacing=5),
+            height=ALTURA_LINHA,
+            padding=ft.padding.only(left=5),
+            on_click=self._ao_clicar,
+            visible=False
+        )
+
+    def _preencher_linha(self, controle, linha):
+        """Reaproveita ``controle`` para exibir a linha ``linha`` do modelo"""
+        snapshot = self.snapshot
+        indice = self.indices[linha]
+        seta, icone, nome, detalhe = controle.content.controls
+        controle.data = linha
+        controle.visible = True
+        controle.padding = ft.padding.only(left=5 + self.niveis[linha] * 20)
+        nome.value = snapshot.nomes[indice]
+        if snapshot.eh_pasta(indice):
+            qtd_itens = snapshot.qtd_filhos[indice]
+            seta.visible = True
+            seta.name = Icons.ARROW_DROP_DOWN if indice in self.expandidos else Icons.ARROW_RIGHT
+            icone.name = Icons.FOLDER_SPECIAL if qtd_itens > 50 else Icons.FOLDER
+            icone.color = Colors.RED_400 if indice in snapshot.erros else Colors.BLUE_400
+            nome.weight = ft.FontWeight.BOLD
+            if indice in snapshot.erros:
+                detalhe.value = f" ({snapshot.erros[indice]})"
+            elif snapshot.pendente(indice):
+                detalhe.value = " (listando...)"
+            else:
+                detalhe.value = f" ({qtd_itens} itens)"
+        else:
+            extensao = os.path.splitext(nome.value)[1].lower()
+            icone.name, icone.color = ICONES_EXTENSOES.get(extensao, ICONES_EXTENSOES[''])
+            seta.visible = False
+            nome.weight = ft.FontWeight.NORMAL
+            detalhe.value = ""
+
+    def _redesenhar(self):
+        total = len(self.indices)
+        self.primeira = max(0, min(self.primeira, total - len(self.controles)))
+        for posicao, controle in enumerate(self.controles):
+            linha = self.primeira + posicao
+            if linha < total:
+                self._preencher_linha(controle, linha)
+            else:
+                controle.visible = False
+        visiveis = min(len(self.controles), max(total - self.primeira, 0))
+        self.espaco_topo.height = self.primeira * ALTURA_LINHA
+        self.espaco_base.height = (total - self.primeira - visiveis) * ALTURA_LINHA
+        if self.varrendo:
+            self.contador.value = f"Varrendo... {len(self.snapshot) - 1} itens encontrados ({total} linhas visíveis)"
+        else:
+            self.contador.value = f"{total} linhas visíveis de {len(self.snapshot) - 1} itens"
+
+    def _atualizar_tela(self):
+        if self.lista.page:
+            self.controle.update()
+
+    def _ao_rolar(self, e):
+        primeira = max(0, int(e.pixels // ALTURA_LINHA) - 5)
+        with self._trava:
+            if primeira != self.primeira:
+                self.primeira = primeira
+                self._redesenhar()
+                self._atualizar_tela()
+
+    def _ao_clicar(self, e):
+        with self._trava:
+            self._alternar_linha(e.control.data)
+
+    def _alternar_linha(self, linha):
+        if linha is None or linha >= len(self.indices):
+            return
+        indice = self.indices[linha]
+        if not self.snapshot.eh_pasta(indice):
+            return
+        nivel = self.niveis[linha]
+        if indice in self.expandidos:
+            # Recolhe: remove as linhas dos descendentes
+            self.expandidos.discard(indice)
+            fim = linha + 1
+            while fim < len(self.niveis) and self.niveis[fim] > nivel:
+                fim += 1
+            del self.indices[linha + 1:fim]
+            del self.niveis[linha + 1:fim]
+        else:
+            # Expande: insere apenas as linhas da subárvore aberta
+            self.expandidos.add(indice)
+            indices, niveis = self._linhas_subarvore(indice, nivel + 1)
+            self.indices[linha + 1:linha + 1] = indices
+            self.niveis[linha + 1:linha + 1] = niveis
+        self._redesenhar()
+        self._atualizar_tela()
+
+    def _mapear_expandidos(self, anterior, snapshot):
+        """Índices em ``snapshot`` das pastas abertas em ``anterior``.
+
+        Desce só pelas pastas abertas e pelos seus ancestrais, procurando
+        cada uma no mapa nome -> índice dos filhos da pasta pai.
+        """
+        # Pastas a parear, por pasta pai (inclui as que estão dentro de pastas fechadas)
+        por_pai = {}
+        for indice in self.expandidos:
+            while indice > 0:
+                pai = anterior.pais[indice]
+                irmas = por_pai.setdefault(pai, set())
+                if indice in irmas:
+                    break
+                irmas.add(indice)
+                indice = pai
+        expandidos = {0}
+        pilha = [(0, 0)]
+        while pilha:
+            antigo, novo = pilha.pop()
+            pastas = por_pai.get(antigo)
+            if not pastas:
+                continue
+            indices = {snapshot.nomes[i]: i for i in snapshot.filhos(novo)}
+            for pasta in pastas:
+                indice = indices.get(anterior.nomes[pasta])
+                if indice is None or not snapshot.eh_pasta(indice):
+                    continue
+                if pasta in self.expandidos:
+                    expandidos.add(indice)
+                pilha.append((pasta, indice))
+        return expandidos
+
+    def trocar_snapshot(self, snapshot):
+        """Passa a exibir ``snapshot`` preservando as pastas abertas.
+
+        Também serve para redesenhar um snapshot que ainda está recebendo
+        entradas: nesse caso os índices já exibidos não mudam.
+        """
+        with self._trava:
+            anterior = self.snapshot
+            self.snapshot = snapshot
+            # Com uma busca ativa as pastas abertas vêm do resultado da busca
+            if snapshot is not anterior and not self.termo_busca:
+                self.expandidos = self._mapear_expandidos(anterior, snapshot)
+            if self.termo_busca:
+                self._aplicar_busca()
+            self._recalcular()
+            self._atualizar_tela()
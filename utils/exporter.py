@@ -1,10 +1,48 @@
 import os
+import stat
 import json
+import time
+import multiprocessing
 import flet as ft
 from flet import Colors, Icons
 from fpdf import FPDF
 from datetime import datetime
-from utils.explorer import listar_estrutura_pasta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from utils.scanner import obter_snapshot, SnapshotArvore, INTERVALO_PROGRESSO
+from utils.explorer import ICONES_EXTENSOES
+from utils.stats import formatar_tamanho
+from utils.arquivo_snapshot import EXTENSAO as EXTENSAO_SNAPSHOT, gravar_snapshot
+from utils.jobs import OperacaoCancelada, TokenCancelamento, iniciar_tarefa, finalizar_tarefa, verificar
+
+# Entradas formatadas entre duas gravações (e verificações de cancelamento)
+LOTE_ESCRITA = 4096
+
+# Buffer dos arquivos exportados
+TAMANHO_BUFFER = 1024 * 1024
+
+# Linhas por volume do PDF (cerca de 450 páginas); árvores maiores geram
+# vários arquivos, já que o FPDF monta o documento inteiro em memória
+LINHAS_POR_VOLUME = 20000
+ALTURA_LINHA_PDF = 6
+
+# A partir deste número de entradas, exportar_formatos usa processos
+MIN_ENTRADAS_PROCESSOS = 50000
+
+# Emoji de cada ícone de ICONES_EXTENSOES nas exportações em texto; ícones
+# fora daqui (texto, descrição e o padrão) ficam com 📄
+_EMOJIS_ICONES = {
+    Icons.CODE: "📝",
+    Icons.IMAGE: "🖼️",
+    Icons.GIF_BOX: "🖼️",
+    Icons.PICTURE_AS_PDF: "📑",
+    Icons.ARTICLE: "📑",
+    Icons.GRID_ON: "📑",
+    Icons.SLIDESHOW: "📑",
+    Icons.AUDIO_FILE: "🎵",
+    Icons.VIDEO_FILE: "🎬",
+    Icons.FOLDER_ZIP: "📦",
+}
+EMOJIS_EXTENSOES = {ext: _EMOJIS_ICONES.get(icone, "📄") for ext, (icone, _) in ICONES_EXTENSOES.items()}
 
 def gerar_nome(caminho, ext):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -12,400 +50,571 @@ def gerar_nome(caminho, ext):
     diretorio_pai = os.path.dirname(caminho)
     return os.path.join(diretorio_pai, f"{nome_pasta}_estrutura_{timestamp}.{ext}")
 
+def _emojis_de(snapshot):
+    """Retorna uma função nome→emoji com cache por id de nome"""
+    cache = {}
+    ids_nomes = snapshot.ids_nomes
+    nomes = snapshot.nomes
+
+    def emoji(indice):
+        id_nome = ids_nomes[indice]
+        valor = cache.get(id_nome)
+        if valor is None:
+            ext = os.path.splitext(nomes[indice])[1].lower()
+            valor = cache[id_nome] = EMOJIS_EXTENSOES.get(ext, "📄")
+        return valor
+    return emoji
+
+def escrever_txt(snapshot, arquivo, token=None):
+    """Escreve a árvore em texto, com linhas conectoras (├──, └──).
+
+    As linhas são formatadas em lotes de LOTE_ESCRITA entradas e gravadas
+    com um único writelines por lote.
+    """
+    arquivo.write(f"Estrutura da pasta: {snapshot.raiz}\n")
+    arquivo.write(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
+    arquivo.write("="*80 + "\n\n")
+    nome_raiz = os.path.basename(snapshot.raiz) or snapshot.raiz
+    arquivo.write(f"📁 {nome_raiz}\n")
+    if 0 in snapshot.erros:
+        arquivo.write(f"⚠️ Erro ao ler a estrutura: {snapshot.erros[0]}\n")
+        return
+
+    nomes = snapshot.nomes
+    modos = snapshot.modos
+    erros = snapshot.erros
+    emoji = _emojis_de(snapshot)
+    # Prefixo (│ e espaços) de cada nível em aberto
+    prefixos = [""]
+    linhas = []
+    for indice, nivel, ultimo in snapshot.percorrer():
+        prefixo = prefixos[nivel]
+        conector = "└── " if ultimo else "├── "
+        if stat.S_ISDIR(modos[indice]):
+            linhas.append(f"{prefixo}{conector}📁 {nomes[indice]}/\n")
+            novo_prefixo = prefixo + ("    " if ultimo else "│   ")
+            del prefixos[nivel + 1:]
+            prefixos.append(novo_prefixo)
+            if indice in erros:
+                linhas.append(f"{novo_prefixo}└── 🚫 {erros[indice]}\n")
+        else:
+            linhas.append(f"{prefixo}{conector}{emoji(indice)} {nomes[indice]}\n")
+        if len(linhas) >= LOTE_ESCRITA:
+            verificar(token)
+            arquivo.writelines(linhas)
+            linhas.clear()
+    arquivo.writelines(linhas)
+
 def exportar_para_txt(txt_pasta, page):
+    _exportar_em_fluxo(txt_pasta, page, "txt", "TXT", escrever_txt)
+
+def _texto_pdf(texto):
+    """Adapta o texto às fontes padrão do PDF, que só cobrem latin-1"""
+    return texto.encode("latin-1", "replace").decode("latin-1")
+
+def _linhas_pdf(snapshot):
+    """Gera as linhas da árvore no PDF, com conectores ASCII"""
+    nome_raiz = os.path.basename(snapshot.raiz) or snapshot.raiz
+    yield _texto_pdf(f"{nome_raiz}/")
+    if 0 in snapshot.erros:
+        yield _texto_pdf(f"`-- [{snapshot.erros[0]}]")
+        return
+
+    nomes = snapshot.nomes
+    modos = snapshot.modos
+    erros = snapshot.erros
+    prefixos = [""]
+    for indice, nivel, ultimo in snapshot.percorrer():
+        prefixo = prefixos[nivel]
+        conector = "`-- " if ultimo else "|-- "
+        if stat.S_ISDIR(modos[indice]):
+            yield _texto_pdf(f"{prefixo}{conector}{nomes[indice]}/")
+            novo_prefixo = prefixo + ("    " if ultimo else "|   ")
+            del prefixos[nivel + 1:]
+            prefixos.append(novo_prefixo)
+            if indice in erros:
+                yield _texto_pdf(f"{novo_prefixo}`-- [{erros[indice]}]")
+        else:
+            yield _texto_pdf(f"{prefixo}{conector}{nomes[indice]}")
+
+def _caminho_volume(caminho, volume, total_volumes):
+    if total_volumes == 1:
+        return caminho
+    base, ext = os.path.splitext(caminho)
+    return f"{base}_vol{volume}{ext}"
+
+def _gravar_volume_pdf(caminho, titulo, volume, total_volumes, linhas):
+    """Grava um volume do PDF com as ``linhas`` indicadas"""
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Configura o título e cabeçalho
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, titulo, 0, 1)
+    pdf.set_font("Arial", "I", 10)
+    volume_texto = f" - volume {volume} de {total_volumes}" if total_volumes > 1 else ""
+    pdf.cell(0, 10, f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}{volume_texto}", 0, 1)
+    pdf.line(10, 30, 200, 30)
+    pdf.ln(10)
+    
+    # Conteúdo
+    pdf.set_font("Courier", "", 10)
+    for linha in linhas:
+        pdf.cell(0, ALTURA_LINHA_PDF, linha, 0, 1)
+    
+    # Adiciona rodapé
+    pdf.ln(10)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(5)
+    pdf.set_font("Arial", "I", 8)
+    pdf.cell(0, 10, "Gerado pelo File Synapses", 0, 0, "C")
+    pdf.output(caminho)
+
+def escrever_pdf(snapshot, caminho, token=None, ao_progredir=None):
+    """Grava a árvore em PDF, dividida em volumes de LINHAS_POR_VOLUME linhas.
+
+    O custo de memória (e de ``FPDF.output``) cresce com o tamanho do
+    documento; com volumes, só um deles fica em memória por vez.
+    ``ao_progredir(linhas_escritas, total_linhas)`` é chamado a cada lote.
+    Retorna os caminhos dos volumes gravados.
+    """
+    total_linhas = len(snapshot) + len(snapshot.erros)
+    total_volumes = max(1, -(-total_linhas // LINHAS_POR_VOLUME))
+    titulo = _texto_pdf(f"Estrutura da pasta: {os.path.basename(snapshot.raiz)}")
+    caminhos = []
+    linhas = _linhas_pdf(snapshot)
+    escritas = 0
     try:
-        caminho = gerar_nome(txt_pasta.value, "txt")
-        
-        # Gera representação ASCII da árvore
-        with open(caminho, "w", encoding="utf-8") as f:
-            # Escreve cabeçalho
-            f.write(f"Estrutura da pasta: {txt_pasta.value}\n")
-            f.write(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-            f.write("="*80 + "\n\n")
-            
-            # Função para gerar a árvore com linhas conectoras
-            def gerar_arvore_txt(diretorio, prefixo=""):
-                itens = sorted(os.listdir(diretorio))
-                # Separar pastas e arquivos para organizar pastas primeiro
-                pastas = [i for i in itens if os.path.isdir(os.path.join(diretorio, i))]
-                arquivos = [i for i in itens if os.path.isfile(os.path.join(diretorio, i))]
-                
-                # Processar pastas
-                for i, pasta in enumerate(pastas):
-                    caminho_completo = os.path.join(diretorio, pasta)
-                    
-                    # Determina se é o último item
-                    is_ultimo = i == len(pastas) - 1 and len(arquivos) == 0
-                    
-                    # Símbolos para conexão
-                    if is_ultimo:
-                        f.write(f"{prefixo}└── 📁 {pasta}/\n")
-                        novo_prefixo = prefixo + "    "
-                    else:
-                        f.write(f"{prefixo}├── 📁 {pasta}/\n")
-                        novo_prefixo = prefixo + "│   "
-                    
-                    try:
-                        gerar_arvore_txt(caminho_completo, novo_prefixo)
-                    except PermissionError:
-                        f.write(f"{novo_prefixo}└── 🚫 Sem permissão de acesso\n")
-                    except Exception as e:
-                        f.write(f"{novo_prefixo}└── ⚠️ Erro: {str(e)}\n")
-                
-                # Processar arquivos
-                for i, arquivo in enumerate(arquivos):
-                    # Determina se é o último item
-                    is_ultimo = i == len(arquivos) - 1
-                    
-                    # Define o emoji baseado na extensão
-                    ext = os.path.splitext(arquivo)[1].lower()
-                    emoji = "📄"
-                    if ext in ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c']:
-                        emoji = "📝"
-                    elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg']:
-                        emoji = "🖼️"
-                    elif ext in ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx']:
-                        emoji = "📑"
-                    elif ext in ['.mp3', '.wav', '.flac', '.aac']:
-                        emoji = "🎵"
-                    elif ext in ['.mp4', '.avi', '.mkv', '.mov']:
-                        emoji = "🎬"
-                    elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
-                        emoji = "📦"
-                    
-                    # Adiciona o item à árvore
-                    if is_ultimo:
-                        f.write(f"{prefixo}└── {emoji} {arquivo}\n")
-                    else:
-                        f.write(f"{prefixo}├── {emoji} {arquivo}\n")
-            
-            # Gera a estrutura de árvore
-            diretorio_raiz = txt_pasta.value
-            nome_raiz = os.path.basename(diretorio_raiz) or diretorio_raiz
-            f.write(f"📁 {nome_raiz}\n")
-            try:
-                gerar_arvore_txt(diretorio_raiz)
-            except Exception as e:
-                f.write(f"⚠️ Erro ao ler a estrutura: {str(e)}\n")
-        
-        # Notifica o usuário
-        page.snack_bar = ft.SnackBar(
-            ft.Text(f"Arquivo exportado para: {caminho} ✅"), 
-            action=ft.TextButton("Ver", on_click=lambda e: os.startfile(caminho)),
-            open=True
-        )
-        page.update()
-    except Exception as e:
-        # Exibe mensagem de erro
-        page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao exportar TXT: {str(e)} ❌"), open=True)
-        page.update()
+        for volume in range(1, total_volumes + 1):
+            lote = []
+            for linha in linhas:
+                lote.append(linha)
+                if len(lote) % LOTE_ESCRITA == 0:
+                    verificar(token)
+                    if ao_progredir:
+                        ao_progredir(escritas + len(lote), total_linhas)
+                if len(lote) == LINHAS_POR_VOLUME and volume < total_volumes:
+                    break
+            verificar(token)
+            caminho_volume = _caminho_volume(caminho, volume, total_volumes)
+            _gravar_volume_pdf(caminho_volume, titulo, volume, total_volumes, lote)
+            caminhos.append(caminho_volume)
+            escritas += len(lote)
+            if ao_progredir:
+                ao_progredir(escritas, total_linhas)
+    except OperacaoCancelada:
+        # Não deixa volumes soltos de uma exportação incompleta
+        for caminho_volume in caminhos:
+            if os.path.exists(caminho_volume):
+                os.remove(caminho_volume)
+        raise
+    return caminhos
 
 def exportar_para_pdf(txt_pasta, page):
+    token = iniciar_tarefa("pdf", "Exportação PDF")
+    aviso = ft.SnackBar(ft.Text("Gerando PDF..."), open=True)
+    ultimo_aviso = [0.0]
+
+    def ao_progredir(escritas, total):
+        agora = time.monotonic()
+        if agora - ultimo_aviso[0] < INTERVALO_PROGRESSO:
+            return
+        ultimo_aviso[0] = agora
+        aviso.content.value = f"Gerando PDF... {escritas * 100 // max(total, 1)}%"
+        page.snack_bar = aviso
+        page.update()
+
     try:
         caminho = gerar_nome(txt_pasta.value, "pdf")
-        
-        # Cria o PDF
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Configura o título e cabeçalho
-        pdf.set_font("Arial", "B", 16)
-        pdf.cell(0, 10, f"Estrutura da pasta: {os.path.basename(txt_pasta.value)}", 0, 1)
-        pdf.set_font("Arial", "I", 10)
-        pdf.cell(0, 10, f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", 0, 1)
-        pdf.line(10, 30, 200, 30)
-        pdf.ln(10)
-        
-        # Configura a fonte para o conteúdo
-        pdf.set_font("Courier", "", 10)
-        
-        # Altura da linha
-        linha_altura = 6
-        
-        # Função recursiva para gerar a árvore no PDF
-        def gerar_arvore_pdf(diretorio, nivel=0):
-            try:
-                itens = sorted(os.listdir(diretorio))
-                # Separar pastas e arquivos
-                pastas = [i for i in itens if os.path.isdir(os.path.join(diretorio, i))]
-                arquivos = [i for i in itens if os.path.isfile(os.path.join(diretorio, i))]
-                
-                # Processar pastas
-                for i, pasta in enumerate(pastas):
-                    caminho_completo = os.path.join(diretorio, pasta)
-                    
-                    # Verifica se é o último item
-                    is_ultimo = i == len(pastas) - 1 and len(arquivos) == 0
-                    
-                    # Gera os conectores da árvore
-                    if is_ultimo:
-                        conector = "└── "
-                        prefixo_filho = "    "
-                    else:
-                        conector = "├── "
-                        prefixo_filho = "│   "
-                    
-                    # Desenha a linha com o nome da pasta
-                    indentacao = "    " * nivel
-                    pdf.cell(0, linha_altura, f"{indentacao}{conector}📁 {pasta}/", 0, 1)
-                    
-                    # Processa recursivamente o conteúdo da pasta
-                    try:
-                        if os.access(caminho_completo, os.R_OK):
-                            gerar_arvore_pdf(caminho_completo, nivel + 1)
-                        else:
-                            pdf.cell(0, linha_altura, f"{indentacao}{prefixo_filho}└── 🚫 Sem permissão de acesso", 0, 1)
-                    except Exception as e:
-                        pdf.cell(0, linha_altura, f"{indentacao}{prefixo_filho}└── ⚠️ Erro: {str(e)[:50]}", 0, 1)
-                
-                # Processar arquivos
-                for i, arquivo in enumerate(arquivos):
-                    # Verifica se é o último item
-                    is_ultimo = i == len(arquivos) - 1
-                    
-                    # Gera o conector
-                    conector = "└── " if is_ultimo else "├── "
-                    
-                    # Define o emoji baseado na extensão
-                    ext = os.path.splitext(arquivo)[1].lower()
-                    emoji = "📄"
-                    if ext in ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c']:
-                        emoji = "📝"
-                    elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg']:
-                        emoji = "🖼️"
-                    elif ext in ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx']:
-                        emoji = "📑"
-                    elif ext in ['.mp3', '.wav', '.flac', '.aac']:
-                        emoji = "🎵"
-                    elif ext in ['.mp4', '.avi', '.mkv', '.mov']:
-                        emoji = "🎬"
-                    elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
-                        emoji = "📦"
-                    elif ext in ['.md', '.markdown']:
-                        emoji = "📝"
-                    
-                    # Desenha a linha para o arquivo
-                    indentacao = "    " * nivel
-                    pdf.cell(0, linha_altura, f"{indentacao}{conector}{emoji} {arquivo}", 0, 1)
-            except PermissionError:
-                pdf.cell(0, linha_altura, f"{'    ' * nivel}└── 🚫 Sem permissão de acesso", 0, 1)
-            except Exception as e:
-                pdf.cell(0, linha_altura, f"{'    ' * nivel}└── ⚠️ Erro: {str(e)[:50]}", 0, 1)
-        
-        # Começa a gerar a árvore
-        pdf.cell(0, linha_altura, f"📁 {os.path.basename(txt_pasta.value) or txt_pasta.value}", 0, 1)
-        gerar_arvore_pdf(txt_pasta.value)
-        
-        # Adiciona rodapé
-        pdf.ln(10)
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(5)
-        pdf.set_font("Arial", "I", 8)
-        pdf.cell(0, 10, "Gerado pelo File Synapses", 0, 0, "C")
-        
-        # Salva o PDF
-        pdf.output(caminho)
+        snapshot = obter_snapshot(txt_pasta.value, token=token)
+        caminhos = escrever_pdf(snapshot, caminho, token, ao_progredir)
         
         # Notifica o usuário
+        if len(caminhos) > 1:
+            mensagem = f"PDF exportado em {len(caminhos)} volumes: {caminhos[0]} ... ✅"
+        else:
+            mensagem = f"PDF exportado para: {caminho} ✅"
         page.snack_bar = ft.SnackBar(
-            ft.Text(f"PDF exportado para: {caminho} ✅"), 
-            action=ft.TextButton("Ver", on_click=lambda e: os.startfile(caminho)),
+            ft.Text(mensagem), 
+            action=ft.TextButton("Ver", on_click=lambda e: os.startfile(caminhos[0])),
             open=True
         )
         page.update()
+    except OperacaoCancelada:
+        page.snack_bar = ft.SnackBar(ft.Text("Exportação do PDF cancelada"), open=True)
+        page.update()
     except Exception as e:
         page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao exportar PDF: {str(e)} ❌"), open=True)
         page.update()
+    finally:
+        finalizar_tarefa("pdf", token)
+
+def escrever_md(snapshot, arquivo, token=None):
+    """Escreve a árvore como lista aninhada em Markdown, em lotes de linhas"""
+    nome_pasta = os.path.basename(snapshot.raiz) or snapshot.raiz
+    arquivo.write(f"# Estrutura da pasta: {nome_pasta}\n\n")
+    arquivo.write(f"*Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}*\n\n")
+    arquivo.write("---\n\n")
+
+    nomes = snapshot.nomes
+    modos = snapshot.modos
+    erros = snapshot.erros
+    emoji = _emojis_de(snapshot)
+    linhas = []
+    if 0 in erros:
+        linhas.append(f"- 🚫 **{erros[0]}**\n")
+    for indice, nivel, _ in snapshot.percorrer():
+        recuo = "  " * nivel
+        if stat.S_ISDIR(modos[indice]):
+            linhas.append(f"{recuo}- 📁 **{nomes[indice]}/**\n")
+            if indice in erros:
+                linhas.append(f"{recuo}  - 🚫 **{erros[indice]}**\n")
+        else:
+            linhas.append(f"{recuo}- {emoji(indice)} {nomes[indice]}\n")
+        if len(linhas) >= LOTE_ESCRITA:
+            verificar(token)
+            arquivo.writelines(linhas)
+            linhas.clear()
+    arquivo.writelines(linhas)
+
+    # Adiciona footer
+    arquivo.write("\n\n---\n")
+    arquivo.write("\n*Gerado pelo File Synapses*")
 
 def exportar_para_md(txt_pasta, page):
+    _exportar_em_fluxo(txt_pasta, page, "md", "Markdown", escrever_md)
+
+def _categoria_arquivo(ext):
+    """Determina a categoria do arquivo pela extensão"""
+    categoria = "documento"
+    if ext in ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c', '.h', '.php']:
+        categoria = "código"
+    elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp']:
+        categoria = "imagem"
+    elif ext in ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods']:
+        categoria = "documento"
+    elif ext in ['.mp3', '.wav', '.flac', '.aac', '.ogg']:
+        categoria = "áudio"
+    elif ext in ['.mp4', '.avi', '.mkv', '.mov', '.webm']:
+        categoria = "vídeo"
+    elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
+        categoria = "compactado"
+    elif ext in ['.md', '.markdown', '.txt']:
+        categoria = "texto"
+    return categoria
+
+def _info_json(snapshot, indice, path=None):
+    """Campos de uma entrada no JSON exportado (sem os filhos)"""
+    if path is None:
+        path = snapshot.caminho(indice)
     try:
-        caminho = gerar_nome(txt_pasta.value, "md")
+        item_nome = snapshot.nomes[indice]
+        permissao_leitura, permissao_escrita = snapshot.permissoes(indice)
+        item_info = {
+            "nome": item_nome,
+            "caminho": path,
+            "ultima_modificacao": datetime.fromtimestamp(snapshot.mtimes[indice]).strftime("%Y-%m-%d %H:%M:%S"),
+        }
         
-        with open(caminho, "w", encoding="utf-8") as f:
-            # Escreve o cabeçalho do Markdown
-            nome_pasta = os.path.basename(txt_pasta.value) or txt_pasta.value
-            f.write(f"# Estrutura da pasta: {nome_pasta}\n\n")
-            f.write(f"*Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}*\n\n")
-            f.write("---\n\n")
-            
-            # Função recursiva para gerar a árvore em Markdown
-            def gerar_arvore_md(diretorio, nivel=0):
-                try:
-                    itens = sorted(os.listdir(diretorio))
-                    # Separar pastas e arquivos
-                    pastas = [i for i in itens if os.path.isdir(os.path.join(diretorio, i))]
-                    arquivos = [i for i in itens if os.path.isfile(os.path.join(diretorio, i))]
-                    
-                    # Processar pastas
-                    for pasta in pastas:
-                        caminho_completo = os.path.join(diretorio, pasta)
-                        
-                        # Escreve o item com indentação baseada no nível
-                        # Usa ícones diferentes para pastas
-                        f.write(f"{'  ' * nivel}- 📁 **{pasta}/**\n")
-                        
-                        # Processa recursivamente
-                        gerar_arvore_md(caminho_completo, nivel + 1)
-                    
-                    # Processar arquivos
-                    for arquivo in arquivos:
-                        # Define o emoji baseado na extensão
-                        ext = os.path.splitext(arquivo)[1].lower()
-                        emoji = "📄"
-                        if ext in ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c']:
-                            emoji = "📝"
-                        elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg']:
-                            emoji = "🖼️"
-                        elif ext in ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx']:
-                            emoji = "📑"
-                        elif ext in ['.mp3', '.wav', '.flac', '.aac']:
-                            emoji = "🎵"
-                        elif ext in ['.mp4', '.avi', '.mkv', '.mov']:
-                            emoji = "🎬"
-                        elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
-                            emoji = "📦"
-                        elif ext in ['.md', '.markdown']:
-                            emoji = "📝"
-                        
-                        # Escreve o arquivo com indentação
-                        f.write(f"{'  ' * nivel}- {emoji} {arquivo}\n")
-                except PermissionError:
-                    f.write(f"{'  ' * nivel}- 🚫 **Sem permissão de acesso**\n")
-                except Exception as e:
-                    f.write(f"{'  ' * nivel}- ⚠️ Erro: {str(e)}\n")
-            
-            # Começa a gerar a árvore a partir da raiz
-            gerar_arvore_md(txt_pasta.value)
-            
-            # Adiciona footer
-            f.write("\n\n---\n")
-            f.write("\n*Gerado pelo File Synapses*")
+        if snapshot.eh_pasta(indice):
+            # Informações da pasta
+            item_info.update({
+                "tipo": "diretorio",
+                "permissao_leitura": permissao_leitura,
+                "permissao_escrita": permissao_escrita,
+            })
+        else:
+            # Informações do arquivo
+            tamanho = snapshot.tamanhos[indice]
+            ext = os.path.splitext(item_nome)[1].lower()
+            item_info.update({
+                "tipo": "arquivo",
+                "extensao": ext,
+                "categoria": _categoria_arquivo(ext),
+                "tamanho_bytes": tamanho,
+                "tamanho_formatado": formatar_tamanho(tamanho),
+                "permissao_leitura": permissao_leitura,
+                "permissao_escrita": permissao_escrita,
+            })
+        return item_info
+    except Exception as e:
+        # Informação básica em caso de erro
+        return {
+            "nome": os.path.basename(path) or path,
+            "caminho": path,
+            "tipo": "erro",
+            "mensagem": str(e)
+        }
+
+# Codificador reaproveitado: json.dumps com ensure_ascii=False cria um novo
+# JSONEncoder a cada chamada
+_CODIFICADOR = json.JSONEncoder(ensure_ascii=False)
+
+def _json(valor):
+    return _CODIFICADOR.encode(valor)
+
+def _metadados_json(raiz):
+    return {
+        "nome_aplicativo": "File Synapses",
+        "versao": "1.0",
+        "data_geracao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "pasta_raiz": raiz
+    }
+
+def escrever_json(snapshot, arquivo, token=None, metadados=None):
+    """Escreve a árvore do snapshot em JSON, entrada por entrada.
+
+    A saída é a mesma de ``json.dump(..., indent=2, ensure_ascii=False)``
+    sobre a estrutura aninhada, mas cada entrada é escrita assim que é
+    visitada: a memória usada cresce só com a profundidade da pasta.
+    """
+    if metadados is None:
+        metadados = _metadados_json(snapshot.raiz)
+    arquivo.write("{\n  \"metadados\": ")
+    arquivo.write(json.dumps(metadados, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+    arquivo.write(",\n  \"estrutura\": ")
+
+    # Pastas abertas: [recuo, já tem filhos escritos, erro, caminho]
+    abertas = []
+
+    def escrever_entrada(indice, recuo, path):
+        info = _info_json(snapshot, indice, path)
+        espacos = "  " * recuo
+        eh_pasta = info["tipo"] == "diretorio"
+        campos = [f"{espacos}  \"{chave}\": {_json(valor)}" for chave, valor in info.items()]
+        arquivo.write("{\n")
+        arquivo.write(",\n".join(campos))
+        if eh_pasta:
+            arquivo.write(f",\n{espacos}  \"filhos\": [")
+            abertas.append([recuo, False, snapshot.erros.get(indice), path])
+        else:
+            arquivo.write(f"\n{espacos}}}")
+
+    def fechar_pasta():
+        recuo, tem_filhos, erro, _ = abertas.pop()
+        espacos = "  " * recuo
+        arquivo.write(f"\n{espacos}  ]" if tem_filhos else "]")
+        if erro is not None:
+            arquivo.write(f",\n{espacos}  \"erro\": {_json(erro)}")
+        arquivo.write(f"\n{espacos}}}")
+
+    nomes = snapshot.nomes
+    escrever_entrada(0, 1, snapshot.raiz)
+    if snapshot.eh_pasta(0):
+        for posicao, (indice, nivel, _) in enumerate(snapshot.percorrer()):
+            if posicao % LOTE_ESCRITA == 0:
+                verificar(token)
+            while len(abertas) > nivel + 1:
+                fechar_pasta()
+            pai = abertas[-1]
+            arquivo.write(",\n" if pai[1] else "\n")
+            arquivo.write("  " * (pai[0] + 2))
+            pai[1] = True
+            escrever_entrada(indice, pai[0] + 2, os.path.join(pai[3], nomes[indice]))
+        while abertas:
+            fechar_pasta()
+    arquivo.write("\n}")
+
+def escrever_ndjson(snapshot, arquivo, token=None):
+    """Escreve uma entrada por linha (NDJSON), da raiz para baixo em pré-ordem.
+
+    Cada linha tem os campos do JSON (sem "filhos") mais "nivel" (0 na
+    raiz). O arquivo recebe flush a cada LOTE_ESCRITA linhas, para que
+    outras ferramentas possam consumi-lo enquanto a exportação continua.
+    """
+    nomes = snapshot.nomes
+    # Caminho da pasta aberta em cada nível
+    caminhos = [snapshot.raiz]
+
+    def linha(indice, nivel, path):
+        info = _info_json(snapshot, indice, path)
+        info["nivel"] = nivel
+        if indice in snapshot.erros:
+            info["erro"] = snapshot.erros[indice]
+        return _json(info) + "\n"
+
+    arquivo.write(linha(0, 0, snapshot.raiz))
+    for posicao, (indice, nivel, _) in enumerate(snapshot.percorrer(), 1):
+        if posicao % LOTE_ESCRITA == 0:
+            arquivo.flush()
+            verificar(token)
+        path = os.path.join(caminhos[nivel], nomes[indice])
+        if snapshot.qtd_filhos[indice]:
+            del caminhos[nivel + 1:]
+            caminhos.append(path)
+        arquivo.write(linha(indice, nivel + 1, path))
+
+def _exportar_em_fluxo(txt_pasta, page, ext, formato, escrever):
+    """Exporta com ``escrever(snapshot, arquivo, token)``, podendo ser cancelado"""
+    token = iniciar_tarefa(ext, f"Exportação {formato}")
+    caminho = None
+    try:
+        caminho = gerar_nome(txt_pasta.value, ext)
+        snapshot = obter_snapshot(txt_pasta.value, token=token)
+        with open(caminho, "w", encoding="utf-8", buffering=TAMANHO_BUFFER) as f:
+            escrever(snapshot, f, token)
         
         # Notifica o usuário
         page.snack_bar = ft.SnackBar(
-            ft.Text(f"Markdown exportado para: {caminho} ✅"), 
+            ft.Text(f"{formato} exportado para: {caminho} ✅"), 
             action=ft.TextButton("Ver", on_click=lambda e: os.startfile(caminho)),
             open=True
         )
         page.update()
+    except OperacaoCancelada:
+        # Não deixa um arquivo incompleto para trás
+        if caminho and os.path.exists(caminho):
+            os.remove(caminho)
+        page.snack_bar = ft.SnackBar(ft.Text(f"Exportação {formato} cancelada"), open=True)
+        page.update()
     except Exception as e:
-        page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao exportar Markdown: {str(e)} ❌"), open=True)
+        page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao exportar {formato}: {str(e)} ❌"), open=True)
         page.update()
+    finally:
+        finalizar_tarefa(ext, token)
 
 def exportar_para_json(txt_pasta, page):
+    metadados = _metadados_json(txt_pasta.value)
+    _exportar_em_fluxo(txt_pasta, page, "json", "JSON",
+                       lambda snapshot, f, token: escrever_json(snapshot, f, token, metadados))
+
+def exportar_para_ndjson(txt_pasta, page):
+    _exportar_em_fluxo(txt_pasta, page, "ndjson", "NDJSON", escrever_ndjson)
+
+def exportar_para_snapshot(txt_pasta, page):
+    """Exporta o snapshot binário (.fsnap), que pode ser reaberto sem a pasta original"""
+    token = iniciar_tarefa(EXTENSAO_SNAPSHOT, "Exportação do snapshot")
     try:
-        caminho = gerar_nome(txt_pasta.value, "json")
-        
-        def build_json(path):
+        caminho = gerar_nome(txt_pasta.value, EXTENSAO_SNAPSHOT)
+        snapshot = obter_snapshot(txt_pasta.value, token=token)
+        gravar_snapshot(snapshot, caminho, token)
+        page.snack_bar = ft.SnackBar(ft.Text(f"Snapshot exportado para: {caminho} ✅"), open=True)
+        page.update()
+    except OperacaoCancelada:
+        # gravar_snapshot já removeu o arquivo temporário
+        page.snack_bar = ft.SnackBar(ft.Text("Exportação do snapshot cancelada"), open=True)
+        page.update()
+    except Exception as e:
+        page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao exportar snapshot: {str(e)} ❌"), open=True)
+        page.update()
+    finally:
+        finalizar_tarefa(EXTENSAO_SNAPSHOT, token)
+
+# Escritores em fluxo por extensão (o PDF é gravado por escrever_pdf)
+ESCRITORES = {
+    "txt": escrever_txt,
+    "md": escrever_md,
+    "json": escrever_json,
+    "ndjson": escrever_ndjson,
+}
+
+def _gravar_formato(snapshot, ext, caminho, token):
+    """Grava ``snapshot`` no formato ``ext`` e retorna os arquivos gerados"""
+    if ext == "pdf":
+        return escrever_pdf(snapshot, caminho, token)
+    if ext == EXTENSAO_SNAPSHOT:
+        gravar_snapshot(snapshot, caminho, token)
+        return [caminho]
+    try:
+        with open(caminho, "w", encoding="utf-8", buffering=TAMANHO_BUFFER) as f:
+            ESCRITORES[ext](snapshot, f, token)
+    except OperacaoCancelada:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        raise
+    return [caminho]
+
+# Evento de cancelamento compartilhado com os processos de exportação
+_CANCELAMENTO_PROCESSO = None
+
+def _iniciar_processo(evento):
+    global _CANCELAMENTO_PROCESSO
+    _CANCELAMENTO_PROCESSO = evento
+
+def _gravar_formato_em_processo(raiz, colunas, erros, ext, caminho):
+    """Executado em outro processo: reconstrói o snapshot e grava um formato"""
+    snapshot = SnapshotArvore.de_colunas(raiz, colunas, erros)
+    token = TokenCancelamento(f"Exportação {ext}", _CANCELAMENTO_PROCESSO)
+    return _gravar_formato(snapshot, ext, caminho, token)
+
+def exportar_formatos(snapshot, caminhos, token=None):
+    """Exporta o mesmo snapshot em vários formatos ao mesmo tempo.
+
+    ``caminhos`` mapeia a extensão ("txt", "pdf", "md", "json", "ndjson",
+    "fsnap") para o arquivo de destino. A pasta é varrida uma única vez (no
+    snapshot) e cada formato é gravado por um worker próprio, de modo que
+    o tempo total fica próximo ao do escritor mais lento. Como os
+    escritores disputam o GIL, árvores com MIN_ENTRADAS_PROCESSOS entradas
+    ou mais usam um processo por formato (limitado ao número de CPUs), que
+    recebe as colunas do snapshot; as menores, ou máquinas com uma só CPU,
+    usam threads, evitando o custo de iniciar processos.
+
+    Retorna ``(gerados, erros)``: arquivos gerados e mensagens de erro por
+    extensão. Se ``token`` for cancelado, os arquivos parciais são
+    removidos e OperacaoCancelada é levantada.
+    """
+    gerados, erros = {}, {}
+    workers = len(caminhos) or 1
+    processos = min(workers, os.cpu_count() or 1)
+    evento = None
+    if len(snapshot) >= MIN_ENTRADAS_PROCESSOS and processos > 1:
+        contexto = multiprocessing.get_context("spawn")
+        evento = contexto.Event()
+        executor = ProcessPoolExecutor(max_workers=processos, mp_context=contexto,
+                                       initializer=_iniciar_processo, initargs=(evento,))
+        colunas = snapshot.para_colunas()
+        erros_snapshot = dict(snapshot.erros)
+        enviar = lambda ext, caminho: executor.submit(
+            _gravar_formato_em_processo, snapshot.raiz, colunas, erros_snapshot, ext, caminho)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        enviar = lambda ext, caminho: executor.submit(_gravar_formato, snapshot, ext, caminho, token)
+
+    with executor:
+        futuros = {ext: enviar(ext, caminho) for ext, caminho in caminhos.items()}
+        pendentes = set(futuros.values())
+        while pendentes:
+            _, pendentes = wait(pendentes, timeout=INTERVALO_PROGRESSO)
+            if evento is not None and token is not None and token.cancelado:
+                evento.set()
+        for ext, futuro in futuros.items():
             try:
-                item_nome = os.path.basename(path) or path
-                item_info = {
-                    "nome": item_nome,
-                    "caminho": path,
-                    "ultima_modificacao": datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d %H:%M:%S"),
-                }
-                
-                if os.path.isdir(path):
-                    # Informações da pasta
-                    item_info.update({
-                        "tipo": "diretorio",
-                        "permissao_leitura": os.access(path, os.R_OK),
-                        "permissao_escrita": os.access(path, os.W_OK),
-                        "filhos": []
-                    })
-                    
-                    # Processa os filhos
-                    try:
-                        itens = sorted(os.listdir(path))
-                        # Pastas primeiro, depois arquivos
-                        pastas = [os.path.join(path, i) for i in itens if os.path.isdir(os.path.join(path, i))]
-                        arquivos = [os.path.join(path, i) for i in itens if os.path.isfile(os.path.join(path, i))]
-                        
-                        # Adiciona pastas e arquivos à lista de filhos
-                        for item_path in pastas + arquivos:
-                            filho = build_json(item_path)
-                            if filho:
-                                item_info["filhos"].append(filho)
-                    except PermissionError:
-                        item_info["erro"] = "Sem permissão de acesso"
-                    except Exception as e:
-                        item_info["erro"] = str(e)
-                else:
-                    # Informações do arquivo
-                    tamanho = os.path.getsize(path)
-                    ext = os.path.splitext(path)[1].lower()
-                    
-                    # Determina a categoria do arquivo
-                    categoria = "documento"
-                    if ext in ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c', '.h', '.php']:
-                        categoria = "código"
-                    elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp']:
-                        categoria = "imagem"
-                    elif ext in ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods']:
-                        categoria = "documento"
-                    elif ext in ['.mp3', '.wav', '.flac', '.aac', '.ogg']:
-                        categoria = "áudio"
-                    elif ext in ['.mp4', '.avi', '.mkv', '.mov', '.webm']:
-                        categoria = "vídeo"
-                    elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
-                        categoria = "compactado"
-                    elif ext in ['.md', '.markdown', '.txt']:
-                        categoria = "texto"
-                    
-                    item_info.update({
-                        "tipo": "arquivo",
-                        "extensao": ext,
-                        "categoria": categoria,
-                        "tamanho_bytes": tamanho,
-                        "tamanho_formatado": formatar_tamanho(tamanho),
-                        "permissao_leitura": os.access(path, os.R_OK),
-                        "permissao_escrita": os.access(path, os.W_OK),
-                    })
-                
-                return item_info
+                gerados[ext] = futuro.result()
+            except OperacaoCancelada:
+                pass
             except Exception as e:
-                # Informação básica em caso de erro
-                return {
-                    "nome": os.path.basename(path) or path,
-                    "caminho": path,
-                    "tipo": "erro",
-                    "mensagem": str(e)
-                }
-        
-        # Função auxiliar para formatar o tamanho
-        def formatar_tamanho(tamanho_bytes):
-            # Converte bytes para KB, MB, GB conforme apropriado
-            if tamanho_bytes < 1024:
-                return f"{tamanho_bytes} bytes"
-            elif tamanho_bytes < 1024 * 1024:
-                return f"{tamanho_bytes / 1024:.2f} KB"
-            elif tamanho_bytes < 1024 * 1024 * 1024:
-                return f"{tamanho_bytes / (1024 * 1024):.2f} MB"
-            else:
-                return f"{tamanho_bytes / (1024 * 1024 * 1024):.2f} GB"
-        
-        # Metadados do JSON
-        estrutura = {
-            "metadados": {
-                "nome_aplicativo": "File Synapses",
-                "versao": "1.0",
-                "data_geracao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "pasta_raiz": txt_pasta.value
-            },
-            "estrutura": build_json(txt_pasta.value)
-        }
-        
-        # Salva o JSON
-        with open(caminho, "w", encoding="utf-8") as f:
-            json.dump(estrutura, f, indent=2, ensure_ascii=False)
+                erros[ext] = str(e)
+    if (token is not None and token.cancelado) or (evento is not None and evento.is_set()):
+        for arquivos in gerados.values():
+            for arquivo in arquivos:
+                if os.path.exists(arquivo):
+                    os.remove(arquivo)
+        raise OperacaoCancelada(token.descricao if token is not None else "")
+    return gerados, erros
+
+def exportar_tudo(txt_pasta, page):
+    token = iniciar_tarefa("exportar_tudo", "Exportação de todos os formatos")
+    try:
+        snapshot = obter_snapshot(txt_pasta.value, token=token)
+        caminhos = {ext: gerar_nome(txt_pasta.value, ext) for ext in ("txt", "pdf", "md", "json", EXTENSAO_SNAPSHOT)}
+        gerados, erros = exportar_formatos(snapshot, caminhos, token)
         
         # Notifica o usuário
+        pasta_destino = os.path.dirname(caminhos["txt"])
+        mensagem = f"{sum(len(arquivos) for arquivos in gerados.values())} arquivos exportados para: {pasta_destino} ✅"
+        if erros:
+            mensagem += " | Erros: " + ", ".join(f"{ext.upper()}: {erro}" for ext, erro in erros.items()) + " ❌"
         page.snack_bar = ft.SnackBar(
-            ft.Text(f"JSON exportado para: {caminho} ✅"), 
-            action=ft.TextButton("Ver", on_click=lambda e: os.startfile(caminho)),
+            ft.Text(mensagem), 
+            action=ft.TextButton("Ver", on_click=lambda e: os.startfile(pasta_destino)),
             open=True
         )
         page.update()
+    except OperacaoCancelada:
+        page.snack_bar = ft.SnackBar(ft.Text("Exportação cancelada"), open=True)
+        page.update()
     except Exception as e:
-        page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao exportar JSON: {str(e)} ❌"), open=True)
+        page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao exportar: {str(e)} ❌"), open=True)
         page.update()
+    finally:
+        finalizar_tarefa("exportar_tudo", token)
@@ -0,0 +1,313 @@
+import threading
+import weakref
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from utils.scanner import ler_indice_persistido, persistir_indice, snapshot_em_memoria
+
+# Índices já construídos, por snapshot (descartados junto com o snapshot)
+_INDICES = weakref.WeakKeyDictionary()
+
+# Índices de trigramas, por TabelaNomes (compartilhados pelos snapshots
+# incrementais, que reaproveitam a mesma tabela)
+_TRIGRAMAS = weakref.WeakKeyDictionary()
+_TRAVA = threading.Lock()
+
+# Quantos nomes candidatos (pelos trigramas em comum) são pontuados na busca aproximada
+MAX_CANDIDATOS_APROXIMADOS = 1000
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class IndiceTrigramas:
+    """Listas invertidas trigrama -> ids de nomes (em ordem crescente).
+
+    Os ids de uma TabelaNomes só crescem, então o índice é estendido com os
+    nomes novos sem refazer os antigos. A parte carregada do cache fica
+    compactada num único array; os nomes acrescentados depois ficam em
+    listas separadas, sempre com ids maiores.
+    """
+
+    def __init__(self):
+        self.qtd_nomes = 0
+        self._posicoes = {}
+        self._ids = array("i")
+        self._extras = {}
+
+    def estender(self, nomes, primeiro_id):
+        """Indexa ``nomes`` (em minúsculas) a partir do id ``primeiro_id``"""
+        extras = self._extras
+        for id_nome, nome in enumerate(nomes, primeiro_id):
+            for trigrama in _trigramas(nome):
+                lista = extras.get(trigrama)
+                if lista is None:
+                    lista = extras[trigrama] = array("i")
+                lista.append(id_nome)
+        self.qtd_nomes = primeiro_id + len(nomes)
+
+    def lista(self, trigrama):
+        posicao = self._posicoes.get(trigrama)
+        base = self._ids[posicao[0]:posicao[1]] if posicao else array("i")
+        extra = self._extras.get(trigrama)
+        if extra:
+            base.extend(extra)
+        return base
+
+    def candidatos(self, termo):
+        """Ids dos nomes que têm todos os trigramas de ``termo`` (len >= 3)"""
+        listas = sorted((self.lista(t) for t in _trigramas(termo)), key=len)
+        if not listas or not listas[0]:
+            return []
+        resultado = set(listas[0])
+        for lista in listas[1:]:
+            resultado.intersection_update(lista)
+            if not resultado:
+                break
+        return sorted(resultado)
+
+    def contar(self, termo):
+        """Quantos trigramas de ``termo`` cada nome possui"""
+        contagem = Counter()
+        for trigrama in _trigramas(termo):
+            contagem.update(self.lista(trigrama))
+        return contagem
+
+    def para_bytes(self):
+        chaves = sorted(set(self._posicoes) | set(self._extras))
+        tamanhos = array("i")
+        ids = array("i")
+        for chave in chaves:
+            lista = self.lista(chave)
+            tamanhos.append(len(lista))
+            ids.extend(lista)
+        return {
+            "chaves": "\0".join(chaves).encode("utf-8", "surrogatepass"),
+            "tamanhos": tamanhos.tobytes(),
+            "ids": ids.tobytes(),
+        }
+
+    @classmethod
+    def de_bytes(cls, dados, qtd_nomes):
+        indice = cls()
+        chaves = dados["chaves"].decode("utf-8", "surrogatepass").split("\0") if dados["chaves"] else []
+        tamanhos = array("i")
+        tamanhos.frombytes(dados["tamanhos"])
+        indice._ids.frombytes(dados["ids"])
+        inicio = 0
+        for chave, tamanho in zip(chaves, tamanhos):
+            indice._posicoes[chave] = (inicio, inicio + tamanho)
+            inicio += tamanho
+        indice.qtd_nomes = qtd_nomes
+        return indice
+
+def _verificacao(tabela, qtd_nomes):
+    """Soma de verificação dos ``qtd_nomes`` primeiros nomes da tabela"""
+    return zlib.crc32(memoryview(tabela.dados)[:tabela.inicios[qtd_nomes]])
+
+def _carregar_trigramas(snapshot):
+    """Lê do cache em disco o índice de trigramas da tabela de ``snapshot``"""
+    dados = ler_indice_persistido(snapshot.raiz)
+    tabela = snapshot.tabela_nomes
+    if dados is None or dados["qtd_nomes"] > len(tabela):
+        return None
+    if _verificacao(tabela, dados["qtd_nomes"]) != dados["verificacao"]:
+        return None
+    return IndiceTrigramas.de_bytes(dados, dados["qtd_nomes"])
+
+class IndiceNomes:
+    """Índice de busca por nome sobre um SnapshotArvore.
+
+    Os nomes distintos da TabelaNomes ficam, em minúsculas, num único texto
+    separado por quebras de linha, e os nomes encontrados são mapeados para
+    as entradas por uma tabela agrupada por nome. Termos com três ou mais
+    caracteres usam o índice de trigramas para achar os candidatos, que são
+    confirmados no texto; termos curtos são procurados direto no texto com
+    ``str.find``. Em ambos os casos cada nome é examinado uma única vez,
+    não importa quantas entradas o usem.
+    """
+
+    def __init__(self, snapshot, trigramas):
+        self.snapshot = snapshot
+        self.tamanho = len(snapshot)
+        self.trigramas = trigramas
+        tabela = snapshot.tabela_nomes
+        qtd_nomes = len(tabela)
+
+        nomes = [tabela[i].lower() for i in range(qtd_nomes)]
+        self.texto = "\n".join(nomes) + "\n"
+        self.inicios = array("q")
+        posicao = 0
+        for nome in nomes:
+            self.inicios.append(posicao)
+            posicao += len(nome) + 1
+        if trigramas.qtd_nomes < qtd_nomes:
+            trigramas.estender(nomes[trigramas.qtd_nomes:], trigramas.qtd_nomes)
+
+        # Entradas agrupadas por nome: as de id_nome ficam em
+        # entradas[comeco[id_nome]:comeco[id_nome + 1]]
+        self.comeco = array("i", [0]) * (qtd_nomes + 1)
+        ids_nomes = snapshot.ids_nomes[:self.tamanho]
+        for id_nome in ids_nomes:
+            self.comeco[id_nome + 1] += 1
+        for id_nome in range(qtd_nomes):
+            self.comeco[id_nome + 1] += self.comeco[id_nome]
+        proximo = array("i", self.comeco)
+        self.entradas = array("i", [0]) * self.tamanho
+        for indice, id_nome in enumerate(ids_nomes):
+            self.entradas[proximo[id_nome]] = indice
+            proximo[id_nome] += 1
+
+    def nome(self, id_nome):
+        """Nome em minúsculas de ``id_nome``"""
+        return self.texto[self.inicios[id_nome]:self._fim(id_nome)]
+
+    def _fim(self, id_nome):
+        if id_nome + 1 < len(self.inicios):
+            return self.inicios[id_nome + 1] - 1
+        return len(self.texto) - 1
+
+    def ids_com(self, termo):
+        """Retorna os ids dos nomes que contêm ``termo`` (sem diferenciar maiúsculas)"""
+        termo = termo.lower()
+        if not termo or "\n" in termo:
+            return []
+        if len(termo) >= 3:
+            return [i for i in self.trigramas.candidatos(termo) if i < len(self.inicios) and termo in self.nome(i)]
+        return self._ids_no_texto(termo)
+
+    def _ids_no_texto(self, termo):
+        """Procura ``termo`` direto no texto dos nomes, um nome por ocorrência"""
+        texto = self.texto
+        ids = []
+        posicao = texto.find(termo)
+        while posicao != -1:
+            id_nome = bisect_right(self.inicios, posicao) - 1
+            ids.append(id_nome)
+            if id_nome + 1 >= len(self.inicios):
+                break
+            # Continua a partir do próximo nome
+            posicao = texto.find(termo, self.inicios[id_nome + 1])
+        return ids
+
+    def ids_terminados_em(self, sufixo):
+        """Retorna os ids dos nomes que terminam com ``sufixo`` (em minúsculas)"""
+        return self._ids_no_texto(sufixo.lower() + "\n")
+
+    def ids_onde(self, predicado, minusculas=True):
+        """Retorna os ids dos nomes para os quais ``predicado(nome)`` é verdadeiro.
+
+        O predicado é chamado uma vez por nome distinto que tenha entradas
+        neste snapshot; com ``minusculas`` False ele recebe o nome original.
+        """
+        tabela = self.snapshot.tabela_nomes
+        comeco = self.comeco
+        ids = []
+        for id_nome in range(len(self.inicios)):
+            if comeco[id_nome] == comeco[id_nome + 1]:
+                continue
+            if predicado(self.nome(id_nome) if minusculas else tabela[id_nome]):
+                ids.append(id_nome)
+        return ids
+
+    def entradas_de(self, ids):
+        """Retorna as entradas que usam os nomes ``ids``"""
+        encontrados = array("i")
+        for id_nome in ids:
+            encontrados.extend(self.entradas[self.comeco[id_nome]:self.comeco[id_nome + 1]])
+        return encontrados
+
+    def buscar(self, termo):
+        """Retorna, em ordem crescente, as entradas cujo nome contém ``termo``.
+
+        A raiz não participa da busca, em qualquer profundidade.
+        """
+        return sorted(i for i in self.entradas_de(self.ids_com(termo)) if i > 0)
+
+    def buscar_aproximado(self, termo, limite=200):
+        """Busca tolerante a erros de digitação, do melhor resultado para o pior.
+
+        Os nomes com mais trigramas em comum com ``termo`` são pontuados pela
+        menor distância de edição entre o termo e algum trecho do nome; são
+        aceitos até um erro a cada quatro caracteres. Cada erro destrói no
+        máximo três trigramas do termo, o que descarta de antemão os nomes
+        com poucos trigramas em comum. Retorna no máximo ``limite`` entradas.
+        """
+        termo = termo.lower()
+        if len(termo) < 3:
+            return self.buscar(termo)[:limite]
+        tolerancia = max(1, len(termo) // 4)
+        minimo_comum = len(termo) - 2 - 3 * tolerancia
+        contagem = self.trigramas.contar(termo)
+        pontuados = []
+        for id_nome, comuns in contagem.most_common(MAX_CANDIDATOS_APROXIMADOS):
+            if comuns < minimo_comum:
+                break
+            if id_nome >= len(self.inicios) or self.comeco[id_nome] == self.comeco[id_nome + 1]:
+                continue
+            nome = self.nome(id_nome)
+            distancia = _distancia_aproximada(termo, nome, tolerancia)
+            if distancia <= tolerancia:
+                pontuados.append((distancia, len(nome), nome, id_nome))
+        pontuados.sort()
+        resultado = []
+        for _, _, _, id_nome in pontuados:
+            resultado.extend(i for i in self.entradas[self.comeco[id_nome]:self.comeco[id_nome + 1]] if i > 0)
+            if len(resultado) >= limite:
+                break
+        return resultado[:limite]
+
+    def com_ancestrais(self, indices):
+        """Retorna as entradas ``indices`` e todas as pastas que as contêm"""
+        pais = self.snapshot.pais
+        resultado = set()
+        for indice in indices:
+            while indice > 0 and indice not in resultado:
+                resultado.add(indice)
+                indice = pais[indice]
+        return resultado
+
+def _distancia_aproximada(padrao, texto, limite):
+    """Menor distância de edição entre ``padrao`` e algum trecho de ``texto``.
+
+    Para assim que a distância passa de ``limite`` (retornando limite + 1).
+    """
+    anterior = [0] * (len(texto) + 1)
+    for i, caractere in enumerate(padrao, 1):
+        atual = [i]
+        for j, outro in enumerate(texto, 1):
+            atual.append(min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (caractere != outro)))
+        if min(atual) > limite:
+            return limite + 1
+        anterior = atual
+    return min(anterior)
+
+def _trigramas_de(snapshot):
+    tabela = snapshot.tabela_nomes
+    trigramas = _TRIGRAMAS.get(tabela)
+    if trigramas is None:
+        trigramas = _carregar_trigramas(snapshot) or IndiceTrigramas()
+        _TRIGRAMAS[tabela] = trigramas
+    return trigramas
+
+def indice_de(snapshot):
+    """Retorna o índice de nomes de ``snapshot``, construindo-o uma única vez.
+
+    Um snapshot ainda em construção ganha um novo índice sempre que tiver
+    recebido novas entradas. O índice de trigramas do snapshot da sessão é
+    gravado no cache em disco sempre que recebe nomes novos.
+    """
+    with _TRAVA:
+        indice = _INDICES.get(snapshot)
+        if indice is not None and indice.tamanho == len(snapshot):
+            return indice
+        trigramas = _trigramas_de(snapshot)
+        qtd_anterior = trigramas.qtd_nomes
+        indice = IndiceNomes(snapshot, trigramas)
+        _INDICES[snapshot] = indice
+        if trigramas.qtd_nomes > qtd_anterior and snapshot is snapshot_em_memoria(snapshot.raiz):
+            dados = trigramas.para_bytes()
+            dados["qtd_nomes"] = trigramas.qtd_nomes
+            dados["verificacao"] = _verificacao(snapshot.tabela_nomes, trigramas.qtd_nomes)
+            persistir_indice(snapshot.raiz, dados)
+        return indice
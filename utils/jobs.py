@@ -0,0 +1,88 @@
+import threading
+
+class OperacaoCancelada(Exception):
+    """Levantada por uma operação longa quando o seu token é cancelado"""
+
+class TokenCancelamento:
+    """Sinal de cancelamento compartilhado entre a interface e uma operação.
+
+    A operação chama ``verificar()`` em pontos seguros (entre pastas,
+    arquivos ou blocos); se o token foi cancelado, OperacaoCancelada é
+    levantada e a operação desfaz o que for necessário. ``evento`` permite
+    usar um multiprocessing.Event, para tokens vistos por outros processos.
+    """
+
+    def __init__(self, descricao="", evento=None):
+        self.descricao = descricao
+        self._evento = evento if evento is not None else threading.Event()
+
+    @property
+    def cancelado(self):
+        return self._evento.is_set()
+
+    def cancelar(self):
+        self._evento.set()
+
+    def verificar(self):
+        if self._evento.is_set():
+            raise OperacaoCancelada(self.descricao)
+
+def verificar(token):
+    """Atalho para operações que aceitam ``token`` opcional"""
+    if token is not None:
+        token.verificar()
+
+# Operações em andamento, por tipo (ex.: "arvore", "zip")
+_TAREFAS = {}
+_TRAVA = threading.Lock()
+_OUVINTES = []
+
+def _avisar():
+    for ouvinte in list(_OUVINTES):
+        try:
+            ouvinte(tarefas_ativas())
+        except Exception as e:
+            print(f"Erro ao avisar sobre tarefas: {e}")
+
+def observar_tarefas(ouvinte):
+    """Registra ``ouvinte``, chamado com a lista de tarefas ativas sempre que ela muda"""
+    _OUVINTES.append(ouvinte)
+
+def iniciar_tarefa(tipo, descricao=""):
+    """Cria o token de uma nova operação do ``tipo`` indicado.
+
+    Uma operação anterior do mesmo tipo ainda em andamento fica obsoleta e
+    é cancelada (ex.: a varredura de uma pasta quando outra é escolhida).
+    """
+    token = TokenCancelamento(descricao or tipo)
+    with _TRAVA:
+        anterior = _TAREFAS.get(tipo)
+        _TAREFAS[tipo] = token
+    if anterior is not None:
+        anterior.cancelar()
+    _avisar()
+    return token
+
+def finalizar_tarefa(tipo, token):
+    """Remove ``token`` das tarefas ativas (se ainda for o atual do tipo)"""
+    with _TRAVA:
+        if _TAREFAS.get(tipo) is not token:
+            return
+        del _TAREFAS[tipo]
+    _avisar()
+
+def cancelar_tarefas(tipo=None):
+    """Cancela as operações em andamento (todas, ou apenas as de ``tipo``)"""
+    with _TRAVA:
+        tipos = [tipo] if tipo is not None else list(_TAREFAS)
+        tokens = [_TAREFAS.pop(t) for t in tipos if t in _TAREFAS]
+    for token in tokens:
+        token.cancelar()
+    if tokens:
+        _avisar()
+    return len(tokens)
+
+def tarefas_ativas():
+    """Retorna as descrições das operações em andamento"""
+    with _TRAVA:
+        return [token.descricao for token in _TAREFAS.values()]
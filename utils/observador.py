@@ -0,0 +1,225 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from utils.scanner import snapshot_em_memoria
+
+# Máscaras do inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+
+MASCARA_EVENTOS = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                   IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_CABECALHO_EVENTO = struct.Struct("iIII")
+
+def _carregar_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class ObservadorPasta:
+    """Observa uma pasta e avisa quais subpastas precisam ser relistadas.
+
+    No Linux usa inotify (uma observação por pasta do snapshot); nos demais
+    sistemas, ou se o limite de observações do inotify for atingido,
+    compara periodicamente o mtime das pastas (nesse modo, arquivos
+    editados no lugar não são detectados).
+
+    ``ao_alterar`` recebe um conjunto de caminhos de pastas alteradas, ou
+    None quando não é possível saber quais pastas mudaram (ex.: estouro da
+    fila de eventos). Eventos próximos são agrupados por ``atraso`` segundos.
+    """
+
+    def __init__(self, raiz, ao_alterar, intervalo=2.0, atraso=0.3):
+        self.raiz = raiz
+        self.ao_alterar = ao_alterar
+        self.intervalo = intervalo
+        self.atraso = atraso
+        self.modo = None
+        self._parar = threading.Event()
+        self._thread = None
+        self._fd = None
+        self._libc = None
+        self._observacoes = {}
+        self._pastas_observadas = {}
+        # (snapshot, {caminho: índice}) das pastas do último snapshot visto
+        self._pastas_cache = (None, None)
+
+    def iniciar(self):
+        self._libc = _carregar_libc()
+        if self._libc is not None:
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK)
+            if self._fd < 0:
+                self._fd = None
+        self.modo = "inotify" if self._fd is not None else "polling"
+        if self._fd is not None and not self.sincronizar():
+            self._fechar_inotify()
+            self.modo = "polling"
+        alvo = self._laco_inotify if self.modo == "inotify" else self._laco_polling
+        self._thread = threading.Thread(target=alvo, name="observador-pasta", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._fechar_inotify()
+
+    def _fechar_inotify(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._observacoes.clear()
+        self._pastas_observadas.clear()
+
+    def _pastas_snapshot(self):
+        """Retorna o snapshot da sessão e {caminho: índice} das suas pastas.
+
+        O mapa só é refeito quando o snapshot muda (cada atualização gera
+        um novo snapshot), e não a cada evento. Sem snapshot, o mapa tem
+        só a raiz, com índice None.
+        """
+        snapshot = snapshot_em_memoria(self.raiz)
+        if snapshot is None:
+            return None, {os.path.normpath(self.raiz): None}
+        anterior, pastas = self._pastas_cache
+        if snapshot is anterior:
+            return snapshot, pastas
+        pastas = {}
+        # Os caminhos são montados a partir do caminho do pai
+        pilha = [(0, os.path.normpath(snapshot.raiz))]
+        while pilha:
+            indice, caminho = pilha.pop()
+            pastas[caminho] = indice
+            for filho in snapshot.filhos(indice):
+                if snapshot.listavel(filho):
+                    pilha.append((filho, os.path.join(caminho, snapshot.nomes[filho])))
+        self._pastas_cache = (snapshot, pastas)
+        return snapshot, pastas
+
+    def sincronizar(self):
+        """Observa as pastas novas do snapshot e esquece as removidas.
+
+        Retorna False se o limite de observações do inotify foi atingido.
+        """
+        if self._fd is None:
+            return True
+        _, pastas = self._pastas_snapshot()
+        for caminho in list(self._pastas_observadas):
+            if caminho not in pastas:
+                wd = self._pastas_observadas.pop(caminho)
+                self._observacoes.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+        for caminho in pastas:
+            if caminho in self._pastas_observadas:
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(caminho), MASCARA_EVENTOS)
+            if wd < 0:
+                if ctypes.get_errno() == errno.ENOSPC:
+                    return False
+                continue
+            self._observacoes[wd] = caminho
+            self._pastas_observadas[caminho] = wd
+        return True
+
+    def _ler_eventos(self):
+        """Lê os eventos disponíveis e retorna as pastas afetadas (ou None)"""
+        alteradas = set()
+        try:
+            dados = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return alteradas
+        posicao = 0
+        while posicao + _CABECALHO_EVENTO.size <= len(dados):
+            wd, mascara, _, tamanho = _CABECALHO_EVENTO.unpack_from(dados, posicao)
+            posicao += _CABECALHO_EVENTO.size + tamanho
+            if mascara & IN_Q_OVERFLOW:
+                return None
+            pasta = self._observacoes.get(wd)
+            if pasta is None:
+                continue
+            if mascara & IN_IGNORED:
+                self._observacoes.pop(wd, None)
+                self._pastas_observadas.pop(pasta, None)
+                continue
+            if mascara & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # A própria pasta sumiu: quem precisa ser relistado é o pai
+                alteradas.add(os.path.dirname(pasta))
+            else:
+                alteradas.add(pasta)
+        return alteradas
+
+    def _laco_inotify(self):
+        while not self._parar.is_set():
+            prontos, _, _ = select.select([self._fd], [], [], 0.5)
+            if not prontos:
+                continue
+            alteradas = self._ler_eventos()
+            # Agrupa os eventos que chegarem logo em seguida
+            limite = time.monotonic() + self.atraso
+            while alteradas is not None and not self._parar.is_set():
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                prontos, _, _ = select.select([self._fd], [], [], restante)
+                if prontos:
+                    novas = self._ler_eventos()
+                    alteradas = None if novas is None else alteradas | novas
+            if self._parar.is_set():
+                break
+            self._notificar(alteradas)
+            if not self.sincronizar():
+                # Limite de observações atingido: segue por polling
+                self._fechar_inotify()
+                self.modo = "polling"
+                self._laco_polling()
+                return
+
+    def _laco_polling(self):
+        while not self._parar.wait(self.intervalo):
+            alteradas = set()
+            snapshot, pastas = self._pastas_snapshot()
+            for caminho, indice in pastas.items():
+                mtime = snapshot.mtimes[indice] if snapshot is not None else None
+                try:
+                    if os.stat(caminho).st_mtime != mtime:
+                        alteradas.add(caminho)
+                except OSError:
+                    alteradas.add(os.path.dirname(caminho))
+            if alteradas:
+                self._notificar(alteradas)
+
+    def _notificar(self, alteradas):
+        if alteradas is not None:
+            raiz = os.path.normpath(self.raiz)
+            # Ignora pastas fora da raiz (ex.: o pai da própria raiz)
+            alteradas = {p for p in alteradas if p == raiz or p.startswith(raiz.rstrip(os.sep) + os.sep)}
+            if not alteradas:
+                return
+        try:
+            self.ao_alterar(alteradas)
+        except Exception as e:
+            print(f"Erro ao aplicar alterações observadas: {e}")
@@ -0,0 +1,693 @@
+import os
+import stat
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils import cache_varredura
+from utils.jobs import verificar
+
+# Snapshots já varridos nesta sessão, indexados pelo caminho absoluto da raiz
+_SNAPSHOTS = {}
+
+# mtime das exportações abertas como snapshot (veja _obter_exportacao)
+_EXPORTACOES = {}
+
+# Chamados com (anterior, novo) a cada snapshot atualizado incrementalmente
+_OUVINTES_ATUALIZACAO = []
+
+# Intervalo mínimo, em segundos, entre dois avisos de progresso da varredura
+INTERVALO_PROGRESSO = 0.2
+
+# Parâmetros da varredura (ajustados a partir do config.json)
+_CONFIGURACAO = {"workers": 8, "cache": None}
+
+def configurar_varredura(workers=None, caminho_cache=None):
+    """Define o número de threads da varredura e o arquivo de cache em disco"""
+    if workers is not None:
+        _CONFIGURACAO["workers"] = max(1, int(workers))
+    if caminho_cache is not None:
+        _CONFIGURACAO["cache"] = caminho_cache
+
+class TabelaNomes:
+    """Tabela de nomes internados, guardados em um único buffer UTF-8.
+
+    Cada nome distinto é armazenado uma única vez; as entradas do snapshot
+    guardam apenas o identificador (int32) do nome na tabela.
+    """
+
+    def __init__(self):
+        self.dados = bytearray()
+        self.inicios = array("q", [0])
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.inicios) - 1
+
+    def __getitem__(self, id_nome):
+        inicio, fim = self.inicios[id_nome], self.inicios[id_nome + 1]
+        return str(self.dados[inicio:fim], "utf-8", "surrogatepass")
+
+    def internar(self, nome):
+        """Retorna o identificador de ``nome``, inserindo-o se necessário"""
+        if self._ids is None:
+            # Tabela congelada sendo reaproveitada: refaz a deduplicação
+            # (mantendo o primeiro id de cada nome) para não repetir nomes
+            self._ids = {}
+            for id_nome in reversed(range(len(self))):
+                self._ids[self[id_nome]] = id_nome
+        id_nome = self._ids.get(nome)
+        if id_nome is None:
+            id_nome = len(self)
+            self.dados += nome.encode("utf-8", "surrogatepass")
+            self.inicios.append(len(self.dados))
+            self._ids[nome] = id_nome
+        return id_nome
+
+    def congelar(self):
+        """Descarta o dicionário de deduplicação ao fim da varredura.
+
+        Se a tabela voltar a receber nomes, o dicionário é refeito a partir
+        dos nomes guardados.
+        """
+        self._ids = None
+
+class _VisaoNomes:
+    """Acesso indexado aos nomes das entradas de um snapshot"""
+
+    def __init__(self, snapshot):
+        self._ids = snapshot.ids_nomes
+        self._tabela = snapshot.tabela_nomes
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, indice):
+        return self._tabela[self._ids[indice]]
+
+    def __iter__(self):
+        tabela = self._tabela
+        return (tabela[id_nome] for id_nome in self._ids)
+
+class SnapshotArvore:
+    """Fotografia em memória de uma árvore de pastas, organizada em colunas.
+
+    Cada entrada é identificada por um índice; a raiz é sempre o índice 0.
+    Os dados ficam em colunas paralelas do módulo ``array`` (pai, modo,
+    tamanho, mtime...) e os nomes em uma TabelaNomes, o que mantém o custo
+    em poucas dezenas de bytes por entrada. Formatações (tamanho legível,
+    datas) são feitas apenas na hora de exibir ou exportar.
+
+    Os filhos de uma pasta ocupam índices contíguos (pastas primeiro, depois
+    arquivos, ambos em ordem alfabética), de modo que bastam o índice do
+    primeiro filho e a quantidade de filhos para percorrê-los.
+    """
+
+    # Colunas por entrada e o typecode de cada uma
+    COLUNAS = (
+        ("ids_nomes", "i"),
+        ("pais", "i"),
+        ("modos", "I"),
+        ("tamanhos", "q"),
+        ("mtimes", "d"),
+        ("primeiro_filho", "i"),
+        ("qtd_filhos", "i"),
+        ("flags", "B"),
+    )
+
+    # Bits da coluna flags
+    FLAG_LINK = 1
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+        self.tabela_nomes = TabelaNomes()
+        for nome, typecode in self.COLUNAS:
+            setattr(self, nome, array(typecode))
+        self.nomes = _VisaoNomes(self)
+        # Erros de leitura por índice de pasta (ex.: sem permissão)
+        self.erros = {}
+        # Pastas listadas na última varredura (as demais foram reaproveitadas)
+        # e o índice de cada uma no snapshot anterior (-1 se for nova)
+        self.pastas_listadas = None
+        self.antigos_listadas = None
+        # (pastas processadas, pastas conhecidas) no último aviso de progresso
+        self.progresso_varredura = None
+        # Arquivo de exportação de onde o snapshot foi lido (None se veio de
+        # uma varredura); ``raiz`` continua sendo a pasta original
+        self.exportacao = None
+        # Libera os buffers externos (ex.: o mmap de um .fsnap); None se não houver
+        self._liberar = None
+
+    def para_colunas(self):
+        """Retorna as colunas do snapshot como bytes, para gravação em disco"""
+        colunas = {nome: getattr(self, nome).tobytes() for nome, _ in self.COLUNAS}
+        colunas["nomes_dados"] = bytes(self.tabela_nomes.dados)
+        colunas["nomes_inicios"] = self.tabela_nomes.inicios.tobytes()
+        return colunas
+
+    @classmethod
+    def de_colunas(cls, raiz, colunas, erros=None):
+        """Reconstrói um snapshot a partir do resultado de ``para_colunas``"""
+        snapshot = cls(raiz)
+        for nome, typecode in cls.COLUNAS:
+            getattr(snapshot, nome).frombytes(colunas[nome])
+        snapshot.tabela_nomes.dados = bytearray(colunas["nomes_dados"])
+        snapshot.tabela_nomes.inicios = array("q")
+        snapshot.tabela_nomes.inicios.frombytes(colunas["nomes_inicios"])
+        snapshot.tabela_nomes.congelar()
+        snapshot.erros = dict(erros or {})
+        return snapshot
+
+    @classmethod
+    def de_buffers(cls, raiz, colunas, erros=None):
+        """Monta um snapshot somente leitura sobre buffers já tipados.
+
+        ``colunas`` tem as chaves de ``para_colunas``, mas com memoryviews
+        no formato de cada coluna (ex.: sobre um arquivo mapeado com mmap)
+        no lugar de bytes; nada é copiado.
+        """
+        snapshot = cls(raiz)
+        for nome, _ in cls.COLUNAS:
+            setattr(snapshot, nome, colunas[nome])
+        snapshot.tabela_nomes.dados = colunas["nomes_dados"]
+        snapshot.tabela_nomes.inicios = colunas["nomes_inicios"]
+        snapshot.tabela_nomes.congelar()
+        snapshot.nomes = _VisaoNomes(snapshot)
+        snapshot.erros = dict(erros or {})
+        return snapshot
+
+    def fechar(self):
+        """Libera os buffers externos do snapshot (ex.: o arquivo mapeado).
+
+        Depois disso o snapshot não pode mais ser usado. Snapshots montados
+        em memória não têm o que liberar.
+        """
+        if self._liberar is not None:
+            self._liberar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fechar()
+
+    def __len__(self):
+        return len(self.ids_nomes)
+
+    def adicionar(self, nome, pai, modo, tamanho, mtime, flags=0):
+        """Acrescenta uma entrada e retorna o seu índice"""
+        self.ids_nomes.append(self.tabela_nomes.internar(nome))
+        self.pais.append(pai)
+        self.modos.append(modo)
+        self.tamanhos.append(tamanho)
+        self.mtimes.append(mtime)
+        self.primeiro_filho.append(0)
+        self.qtd_filhos.append(0)
+        self.flags.append(flags)
+        return len(self.ids_nomes) - 1
+
+    def copiar_filhos(self, origem, pasta_origem, pai):
+        """Copia os filhos de ``pasta_origem`` de outro snapshot para ``pai``.
+
+        As colunas são copiadas por fatias; os filhos de subpastas ainda
+        precisam ser preenchidos por quem chama. Retorna o índice do
+        primeiro filho copiado.
+        """
+        inicio = origem.primeiro_filho[pasta_origem]
+        fim = inicio + origem.qtd_filhos[pasta_origem]
+        primeiro = len(self)
+        tabela = self.tabela_nomes
+        if tabela is origem.tabela_nomes:
+            self.ids_nomes.extend(origem.ids_nomes[inicio:fim])
+        else:
+            self.ids_nomes.extend(tabela.internar(origem.nomes[i]) for i in range(inicio, fim))
+        self.pais.extend(array("i", [pai]) * (fim - inicio))
+        self.modos.extend(origem.modos[inicio:fim])
+        self.tamanhos.extend(origem.tamanhos[inicio:fim])
+        self.mtimes.extend(origem.mtimes[inicio:fim])
+        self.primeiro_filho.extend(array("i", [0]) * (fim - inicio))
+        self.qtd_filhos.extend(array("i", [0]) * (fim - inicio))
+        self.flags.extend(origem.flags[inicio:fim])
+        # Publicados por último, como em _varrer
+        self.primeiro_filho[pai] = primeiro
+        self.qtd_filhos[pai] = fim - inicio
+        return primeiro
+
+    def bytes_por_entrada(self):
+        """Estimativa do custo de memória do snapshot por entrada"""
+        colunas = [getattr(self, nome) for nome, _ in self.COLUNAS]
+        total = sum(c.itemsize * len(c) for c in colunas)
+        total += len(self.tabela_nomes.dados) + self.tabela_nomes.inicios.itemsize * len(self.tabela_nomes.inicios)
+        return total / max(len(self), 1)
+
+    def eh_pasta(self, indice):
+        return stat.S_ISDIR(self.modos[indice])
+
+    def permissoes(self, indice):
+        """Retorna (leitura, escrita) a partir dos bits do dono no modo"""
+        modo = self.modos[indice]
+        return bool(modo & stat.S_IRUSR), bool(modo & stat.S_IWUSR)
+
+    def filhos(self, indice):
+        """Retorna os índices dos filhos diretos de uma pasta.
+
+        Num snapshot ainda em construção, limita-se às entradas já gravadas
+        em todas as colunas (flags é a última a receber cada entrada).
+        """
+        inicio = self.primeiro_filho[indice]
+        return range(inicio, min(inicio + self.qtd_filhos[indice], len(self.flags)))
+
+    def pastas(self):
+        """Retorna os índices de todas as pastas do snapshot"""
+        return [i for i in range(len(self)) if self.eh_pasta(i)]
+
+    def listavel(self, indice):
+        """Indica se a entrada é uma pasta cujo conteúdo é varrido"""
+        return self.eh_pasta(indice) and not self.flags[indice] & self.FLAG_LINK
+
+    def pendente(self, indice):
+        """Indica se a pasta ainda não foi listada (snapshot em construção)"""
+        return (indice > 0 and self.primeiro_filho[indice] == 0 and
+                self.listavel(indice) and indice not in self.erros)
+
+    def caminho_relativo(self, indice):
+        partes = []
+        while indice > 0:
+            partes.append(self.nomes[indice])
+            indice = self.pais[indice]
+        return os.path.join(*reversed(partes)) if partes else ""
+
+    def localizar(self, caminho_relativo):
+        """Retorna o índice da entrada em ``caminho_relativo`` (ou None)"""
+        indice = 0
+        for parte in caminho_relativo.replace("\\", "/").split("/"):
+            if not parte or parte == ".":
+                continue
+            for filho in self.filhos(indice):
+                if self.nomes[filho] == parte:
+                    indice = filho
+                    break
+            else:
+                return None
+        return indice
+
+    def caminho(self, indice):
+        relativo = self.caminho_relativo(indice)
+        return os.path.join(self.raiz, relativo) if relativo else self.raiz
+
+    def percorrer(self, indice=0):
+        """Percorre os descendentes em pré-ordem.
+
+        Gera tuplas (indice, nivel, ultimo), onde ``nivel`` começa em 0 para os
+        filhos diretos de ``indice`` e ``ultimo`` indica se a entrada é a
+        última entre os seus irmãos.
+        """
+        inicio = self.primeiro_filho[indice]
+        pilha = [[inicio, inicio + self.qtd_filhos[indice], 0]]
+        while pilha:
+            topo = pilha[-1]
+            if topo[0] >= topo[1]:
+                pilha.pop()
+                continue
+            filho = topo[0]
+            topo[0] += 1
+            yield filho, topo[2], topo[0] == topo[1]
+            if self.qtd_filhos[filho]:
+                inicio = self.primeiro_filho[filho]
+                pilha.append([inicio, inicio + self.qtd_filhos[filho], topo[2] + 1])
+
+def listar_pasta(caminho):
+    """Lista uma pasta com uma única chamada a os.scandir.
+
+    Retorna tuplas (nome, modo, tamanho, mtime, eh_link) com as pastas
+    primeiro e depois os arquivos, ambos em ordem alfabética. Entradas que não
+    são pastas nem arquivos regulares (links quebrados, sockets...) são ignoradas.
+    """
+    pastas = []
+    arquivos = []
+    with os.scandir(caminho) as entradas:
+        for entrada in entradas:
+            try:
+                info = entrada.stat()
+            except OSError:
+                continue
+            item = (entrada.name, info.st_mode, info.st_size, info.st_mtime, entrada.is_symlink())
+            if stat.S_ISDIR(info.st_mode):
+                pastas.append(item)
+            elif stat.S_ISREG(info.st_mode):
+                arquivos.append(item)
+    pastas.sort()
+    arquivos.sort()
+    return pastas + arquivos
+
+class _ExecutorImediato:
+    """Executor sem threads, usado quando a varredura é sequencial"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def submit(self, funcao, *args):
+        futuro = Future()
+        try:
+            futuro.set_result(funcao(*args))
+        except BaseException as e:
+            futuro.set_exception(e)
+        return futuro
+
+# mtime que nunca é igual a outro (NaN): força a relistagem de uma pasta
+_SEMPRE_RELISTAR = float("nan")
+
+def _listar_se_mudou(caminho, mtime_anterior):
+    """Lista ``caminho`` apenas se o seu mtime mudou.
+
+    Retorna (info, entradas): ``info`` é o stat atual da pasta (ou None se
+    não houve comparação) e ``entradas`` é None quando a listagem anterior
+    pode ser reaproveitada.
+    """
+    if mtime_anterior is None:
+        return None, listar_pasta(caminho)
+    info = os.stat(caminho)
+    if info.st_mtime == mtime_anterior:
+        return info, None
+    return info, listar_pasta(caminho)
+
+def observar_atualizacoes(ouvinte):
+    """Registra ``ouvinte``, chamado com (anterior, novo) sempre que uma
+    varredura produz um snapshot reaproveitando outro"""
+    _OUVINTES_ATUALIZACAO.append(ouvinte)
+
+def _avisar_atualizacao(anterior, snapshot):
+    for ouvinte in list(_OUVINTES_ATUALIZACAO):
+        try:
+            ouvinte(anterior, snapshot)
+        except Exception as e:
+            print(f"Erro ao avisar sobre atualização do snapshot: {e}")
+
+def _reaproveitar():
+    futuro = Future()
+    futuro.set_result((None, None))
+    return futuro
+
+def _varrer(raiz, workers, anterior=None, alteradas=None, ao_progredir=None, token=None):
+    """Núcleo da varredura em largura, opcionalmente reaproveitando um snapshot.
+
+    Com ``alteradas`` (conjunto de caminhos normalizados) apenas essas pastas
+    são relistadas; as demais pastas conhecidas são reaproveitadas sem
+    nenhuma chamada ao sistema.
+
+    ``ao_progredir`` recebe o snapshot parcial no máximo a cada
+    INTERVALO_PROGRESSO segundos, na própria thread da varredura e entre
+    duas pastas, de modo que o que ele lê está sempre consistente. Nesse
+    momento ``snapshot.progresso_varredura`` traz quantas pastas já foram
+    processadas e quantas são conhecidas até ali.
+
+    ``token`` (TokenCancelamento) é verificado antes de cada pasta; se for
+    cancelado, OperacaoCancelada é levantada e o snapshot parcial descartado.
+    """
+    if workers is None:
+        workers = _CONFIGURACAO["workers"]
+    info = os.stat(raiz)
+    snapshot = SnapshotArvore(raiz)
+    if anterior is not None:
+        # Compartilha a tabela de nomes: ela só recebe acréscimos
+        snapshot.tabela_nomes = anterior.tabela_nomes
+        snapshot.nomes = _VisaoNomes(snapshot)
+    snapshot.adicionar(os.path.basename(raiz) or raiz, -1, info.st_mode, info.st_size, info.st_mtime)
+    snapshot.pastas_listadas = []
+    snapshot.antigos_listadas = []
+    proximo_aviso = time.monotonic() + INTERVALO_PROGRESSO
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else _ExecutorImediato()
+    # Limita quantas listagens ficam em andamento ao mesmo tempo
+    limite = workers * 4
+    with executor:
+        # Varredura em largura: os filhos de cada pasta recebem índices contíguos.
+        # Cada item guarda o índice correspondente no snapshot anterior (ou -1).
+        pendentes = deque([(0, raiz, 0 if anterior is not None else -1)])
+        em_andamento = deque()
+        processadas = 0
+        while pendentes or em_andamento:
+            while pendentes and len(em_andamento) < limite:
+                indice, caminho, antigo = pendentes.popleft()
+                if antigo < 0:
+                    futuro = executor.submit(_listar_se_mudou, caminho, None)
+                elif alteradas is None:
+                    futuro = executor.submit(_listar_se_mudou, caminho, anterior.mtimes[antigo])
+                elif os.path.normpath(caminho) in alteradas:
+                    futuro = executor.submit(_listar_se_mudou, caminho, _SEMPRE_RELISTAR)
+                else:
+                    futuro = _reaproveitar()
+                em_andamento.append((indice, caminho, antigo, futuro))
+
+            if ao_progredir is not None and len(snapshot) > 1 and time.monotonic() >= proximo_aviso:
+                snapshot.progresso_varredura = (processadas, processadas + len(pendentes) + len(em_andamento))
+                ao_progredir(snapshot)
+                proximo_aviso = time.monotonic() + INTERVALO_PROGRESSO
+
+            verificar(token)
+            indice, caminho, antigo, futuro = em_andamento.popleft()
+            processadas += 1
+            try:
+                info, entradas = futuro.result()
+            except PermissionError:
+                snapshot.erros[indice] = "Sem permissão de acesso"
+                snapshot.pastas_listadas.append(indice)
+                snapshot.antigos_listadas.append(antigo)
+                continue
+            except OSError as e:
+                snapshot.erros[indice] = str(e)
+                snapshot.pastas_listadas.append(indice)
+                snapshot.antigos_listadas.append(antigo)
+                continue
+
+            if entradas is None:
+                # Pasta inalterada: copia as linhas do snapshot anterior
+                if antigo in anterior.erros:
+                    snapshot.erros[indice] = anterior.erros[antigo]
+                    continue
+                primeiro = snapshot.copiar_filhos(anterior, antigo, indice)
+                inicio_antigo = anterior.primeiro_filho[antigo]
+                for deslocamento in range(anterior.qtd_filhos[antigo]):
+                    if anterior.listavel(inicio_antigo + deslocamento):
+                        filho = primeiro + deslocamento
+                        pendentes.append((filho, os.path.join(caminho, snapshot.nomes[filho]), inicio_antigo + deslocamento))
+                continue
+
+            if info is not None:
+                # A pasta mudou: atualiza os dados copiados da listagem do pai
+                snapshot.modos[indice] = info.st_mode
+                snapshot.tamanhos[indice] = info.st_size
+                snapshot.mtimes[indice] = info.st_mtime
+            snapshot.pastas_listadas.append(indice)
+            snapshot.antigos_listadas.append(antigo)
+
+            # Subpastas já conhecidas podem ser reaproveitadas individualmente
+            antigos = {}
+            if antigo >= 0 and antigo not in anterior.erros:
+                antigos = {anterior.nomes[i]: i for i in anterior.filhos(antigo) if anterior.listavel(i)}
+
+            primeiro = len(snapshot)
+            for nome, modo, tamanho, mtime, eh_link in entradas:
+                flags = SnapshotArvore.FLAG_LINK if eh_link else 0
+                filho = snapshot.adicionar(nome, indice, modo, tamanho, mtime, flags)
+                # Links para pastas não são seguidos para evitar ciclos
+                if stat.S_ISDIR(modo) and not eh_link:
+                    pendentes.append((filho, os.path.join(caminho, nome), antigos.get(nome, -1)))
+            # A interface lê o snapshot parcial sem trava: os filhos só são
+            # publicados depois de gravados em todas as colunas
+            snapshot.primeiro_filho[indice] = primeiro
+            snapshot.qtd_filhos[indice] = len(entradas)
+    if anterior is None:
+        snapshot.tabela_nomes.congelar()
+    else:
+        # A tabela de uma pasta revarrida tende a ser reaproveitada de novo
+        # (ex.: a cada evento do observador): o dicionário é mantido
+        _avisar_atualizacao(anterior, snapshot)
+    return snapshot
+
+def escanear(raiz, workers=None, ao_progredir=None, token=None):
+    """Varre ``raiz`` uma única vez e retorna um SnapshotArvore.
+
+    Com ``workers`` > 1 as pastas irmãs são listadas em paralelo por um
+    ThreadPoolExecutor, o que esconde a latência de compartilhamentos de
+    rede. Os resultados são consumidos sempre na mesma ordem (em largura),
+    então os índices do snapshot não dependem da ordem de conclusão.
+    """
+    return _varrer(raiz, workers, ao_progredir=ao_progredir, token=token)
+
+def _mtime_pasta(caminho):
+    try:
+        return os.stat(caminho).st_mtime
+    except OSError:
+        return None
+
+def snapshot_valido(snapshot, workers=None, token=None):
+    """Verifica se nenhuma pasta do snapshot mudou desde a varredura"""
+    if workers is None:
+        workers = _CONFIGURACAO["workers"]
+    pastas = [0] + [i for i in range(1, len(snapshot)) if snapshot.listavel(i)]
+    caminhos = [snapshot.caminho(i) for i in pastas]
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    mtimes = executor.map(_mtime_pasta, caminhos, chunksize=256) if executor else map(_mtime_pasta, caminhos)
+    try:
+        for posicao, (i, mtime) in enumerate(zip(pastas, mtimes)):
+            if posicao % 256 == 0:
+                verificar(token)
+            if mtime != snapshot.mtimes[i]:
+                return False
+        return True
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+def atualizar_snapshot(anterior, workers=None, ao_progredir=None, token=None):
+    """Atualiza um snapshot relistando apenas as pastas cujo mtime mudou.
+
+    Se nada mudou, o próprio ``anterior`` é retornado. Observação: editar
+    um arquivo no lugar não altera o mtime da pasta; nesse caso é preciso
+    forçar uma nova varredura.
+    """
+    if snapshot_valido(anterior, workers, token):
+        return anterior
+    return _varrer(anterior.raiz, workers, anterior, ao_progredir=ao_progredir, token=token)
+
+def aplicar_alteracoes(raiz, pastas=None, workers=None):
+    """Aplica ao snapshot da sessão as alterações observadas em ``pastas``.
+
+    Só as pastas indicadas são relistadas (inclusive para captar arquivos
+    modificados no lugar); o restante é reaproveitado sem tocar no disco.
+    Com ``pastas`` None todas as pastas são revalidadas pelo mtime.
+    """
+    chave = os.path.abspath(raiz)
+    anterior = _SNAPSHOTS.get(chave)
+    if anterior is None:
+        return obter_snapshot(raiz)
+    if pastas is None:
+        snapshot = atualizar_snapshot(anterior, workers)
+    else:
+        alteradas = {os.path.normpath(p) for p in pastas}
+        snapshot = _varrer(anterior.raiz, workers, anterior, alteradas)
+    _SNAPSHOTS[chave] = snapshot
+    return snapshot
+
+def snapshot_em_memoria(raiz):
+    """Retorna o snapshot da sessão para ``raiz`` sem revalidá-lo (ou None)"""
+    return _SNAPSHOTS.get(os.path.abspath(raiz))
+
+def _ler_cache(raiz):
+    caminho_cache = _CONFIGURACAO["cache"]
+    if not caminho_cache:
+        return None
+    try:
+        dados = cache_varredura.ler_colunas(caminho_cache, os.path.abspath(raiz))
+    except Exception as e:
+        print(f"Erro ao ler cache de varredura: {e}")
+        return None
+    if dados is None:
+        return None
+    colunas, erros = dados
+    return SnapshotArvore.de_colunas(raiz, colunas, erros)
+
+def _gravar_cache(snapshot):
+    caminho_cache = _CONFIGURACAO["cache"]
+    if not caminho_cache:
+        return
+    try:
+        cache_varredura.gravar_colunas(caminho_cache, os.path.abspath(snapshot.raiz), snapshot.para_colunas(), snapshot.erros)
+    except Exception as e:
+        print(f"Erro ao gravar cache de varredura: {e}")
+
+def ler_indice_persistido(raiz):
+    """Lê do cache em disco o índice de trigramas gravado para ``raiz``"""
+    caminho_cache = _CONFIGURACAO["cache"]
+    if not caminho_cache:
+        return None
+    try:
+        return cache_varredura.ler_indice(caminho_cache, os.path.abspath(raiz))
+    except Exception as e:
+        print(f"Erro ao ler índice de busca: {e}")
+        return None
+
+def persistir_indice(raiz, dados):
+    """Grava no cache em disco o índice de trigramas de ``raiz``"""
+    caminho_cache = _CONFIGURACAO["cache"]
+    if not caminho_cache:
+        return
+    try:
+        cache_varredura.gravar_indice(caminho_cache, os.path.abspath(raiz), dados)
+    except Exception as e:
+        print(f"Erro ao gravar índice de busca: {e}")
+
+def ler_assinaturas_persistidas(raiz):
+    """Lê do cache em disco as assinaturas de pastas gravadas para ``raiz``"""
+    caminho_cache = _CONFIGURACAO["cache"]
+    if not caminho_cache:
+        return None
+    try:
+        return cache_varredura.ler_assinaturas(caminho_cache, os.path.abspath(raiz))
+    except Exception as e:
+        print(f"Erro ao ler assinaturas de pastas: {e}")
+        return None
+
+def persistir_assinaturas(raiz, dados):
+    """Grava no cache em disco as assinaturas de pastas de ``raiz``"""
+    caminho_cache = _CONFIGURACAO["cache"]
+    if not caminho_cache:
+        return
+    try:
+        cache_varredura.gravar_assinaturas(caminho_cache, os.path.abspath(raiz), dados)
+    except Exception as e:
+        print(f"Erro ao gravar assinaturas de pastas: {e}")
+
+def _obter_exportacao(caminho, forcar=False, token=None):
+    """Snapshot de uma exportação aberta no lugar de uma pasta (modo offline).
+
+    Fica no cache da sessão pela chave do arquivo e só é relido se o
+    arquivo mudar.
+    """
+    from utils.arquivo_snapshot import abrir_exportacao
+
+    chave = os.path.abspath(caminho)
+    mtime = os.path.getmtime(caminho)
+    anterior = _SNAPSHOTS.get(chave)
+    if not forcar and anterior is not None and _EXPORTACOES.get(chave) == mtime:
+        return anterior
+    snapshot = abrir_exportacao(caminho, token)
+    _SNAPSHOTS[chave] = snapshot
+    _EXPORTACOES[chave] = mtime
+    return snapshot
+
+def obter_snapshot(raiz, forcar=False, ao_progredir=None, token=None):
+    """Retorna o snapshot de ``raiz``, varrendo a pasta apenas se necessário.
+
+    O mesmo snapshot é compartilhado pela árvore, estatísticas, exportações e
+    comparação. Um snapshot já conhecido (da sessão ou do cache em disco) é
+    revalidado pelo mtime das pastas e só as pastas alteradas são relistadas;
+    ``forcar`` descarta tudo e faz uma varredura completa. ``ao_progredir``
+    recebe o snapshot parcial durante a varredura e ``token`` permite
+    cancelá-la (veja ``_varrer``). Se ``raiz`` for um arquivo de exportação
+    (.fsnap, .json, .ndjson), o snapshot é lido dele, sem acessar a pasta
+    original.
+    """
+    chave = os.path.abspath(raiz)
+    if os.path.isfile(raiz):
+        return _obter_exportacao(raiz, forcar, token)
+    anterior = None
+    if not forcar:
+        anterior = _SNAPSHOTS.get(chave) or _ler_cache(raiz)
+    if anterior is None:
+        snapshot = escanear(raiz, ao_progredir=ao_progredir, token=token)
+    else:
+        snapshot = atualizar_snapshot(anterior, ao_progredir=ao_progredir, token=token)
+    if snapshot is not anterior or chave not in _SNAPSHOTS:
+        _SNAPSHOTS[chave] = snapshot
+        if snapshot is not anterior:
+            _gravar_cache(snapshot)
+    return snapshot
+
+def descartar_snapshot(raiz):
+    """Remove o snapshot de ``raiz`` do cache da sessão"""
+    _SNAPSHOTS.pop(os.path.abspath(raiz), None)
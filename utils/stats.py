@@ -1,8 +1,12 @@
 import os
+import time
 import flet as ft
 from flet import Colors
-from collections import Counter, defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime
+from utils.scanner import obter_snapshot, INTERVALO_PROGRESSO
+from utils.estatisticas import calcular_estatisticas
+from utils.duplicados import encontrar_duplicados
+from utils.jobs import OperacaoCancelada, iniciar_tarefa, finalizar_tarefa
 
 def formatar_tamanho(tamanho_bytes):
     # Converte bytes para KB, MB, GB conforme apropriado
@@ -16,127 +20,30 @@ def formatar_tamanho(tamanho_bytes):
         return f"{tamanho_bytes / (1024 * 1024 * 1024):.2f} GB"
 
 def gerar_estatisticas(txt_pasta, page):
+    token = iniciar_tarefa("estatisticas", "Estatísticas")
     try:
-        # Inicializa contadores e variáveis
-        total_arquivos = 0
-        total_diretorios = 0
-        total_tamanho = 0
-        maior_arquivo = {"nome": "", "tamanho": 0, "caminho": ""}
-        arquivo_mais_recente = {"nome": "", "data": 0, "caminho": ""}
-        arquivo_mais_antigo = {"nome": "", "data": datetime.now().timestamp(), "caminho": ""}
-        extensoes = Counter()
-        tipos_arquivos = defaultdict(int)
-        profundidade_max = 0
-        
-        # Novas estatísticas
-        arquivos_por_mes = defaultdict(int)
-        tamanho_por_mes = defaultdict(int)
-        arquivos_vazios = 0
-        arquivos_grandes = 0  # Arquivos maiores que 10MB
-        arquivos_pequenos = 0  # Arquivos menores que 10KB
-        arquivos_ocultos = 0
-        arquivos_somente_leitura = 0
-        
-        # Mapeamento de extensões para categorias
-        mapa_categorias = {
-            "código": ['.py', '.js', '.html', '.css', '.java', '.cpp', '.c', '.h', '.php'],
-            "imagem": ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp'],
-            "documento": ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.txt', '.md', '.odt', '.ods'],
-            "áudio": ['.mp3', '.wav', '.flac', '.aac', '.ogg'],
-            "vídeo": ['.mp4', '.avi', '.mkv', '.mov', '.webm'],
-            "compactado": ['.zip', '.rar', '.7z', '.tar', '.gz']
-        }
-        
-        # Percorre a estrutura da pasta
-        for root, dirs, files in os.walk(txt_pasta.value):
-            # Calcula a profundidade
-            nivel = root[len(txt_pasta.value):].count(os.sep)
-            profundidade_max = max(profundidade_max, nivel)
-            
-            # Conta os diretórios
-            total_diretorios += len(dirs)
-            
-            # Processa os arquivos
-            for file in files:
-                total_arquivos += 1
-                caminho = os.path.join(root, file)
-                
-                try:
-                    # Informações do arquivo
-                    if os.path.exists(caminho):
-                        # Verifica se é arquivo oculto (começa com .)
-                        if file.startswith("."):
-                            arquivos_ocultos += 1
-                            
-                        # Verifica permissões
-                        if not os.access(caminho, os.W_OK) and os.access(caminho, os.R_OK):
-                            arquivos_somente_leitura += 1
-                        
-                        # Tamanho
-                        tamanho = os.path.getsize(caminho)
-                        total_tamanho += tamanho
-                        
-                        # Categoriza por tamanho
-                        if tamanho == 0:
-                            arquivos_vazios += 1
-                        elif tamanho < 10 * 1024:  # < 10KB
-                            arquivos_pequenos += 1
-                        elif tamanho > 10 * 1024 * 1024:  # > 10MB
-                            arquivos_grandes += 1
-                        
-                        # Extensão
-                        ext = os.path.splitext(file)[1].lower()
-                        extensoes[ext] += 1
-                        
-                        # Categoriza o arquivo
-                        categoria = "outro"
-                        for cat, exts in mapa_categorias.items():
-                            if ext in exts:
-                                categoria = cat
-                                break
-                        tipos_arquivos[categoria] += 1
-                        
-                        # Verifica se é o maior arquivo
-                        if tamanho > maior_arquivo["tamanho"]:
-                            maior_arquivo = {"nome": file, "tamanho": tamanho, "caminho": caminho}
-                        
-                        # Datas de modificação
-                        data_mod = os.path.getmtime(caminho)
-                        data_mod_dt = datetime.fromtimestamp(data_mod)
-                        mes_ano = data_mod_dt.strftime("%Y-%m")
-                        
-                        # Agrupa por mês/ano
-                        arquivos_por_mes[mes_ano] += 1
-                        tamanho_por_mes[mes_ano] += tamanho
-                        
-                        if data_mod > arquivo_mais_recente["data"]:
-                            arquivo_mais_recente = {"nome": file, "data": data_mod, "caminho": caminho}
-                        if data_mod < arquivo_mais_antigo["data"]:
-                            arquivo_mais_antigo = {"nome": file, "data": data_mod, "caminho": caminho}
-                except:
-                    # Ignora erros ao ler informações do arquivo
-                    pass
-        
-        # Análise temporal
-        meses_ordenados = sorted(arquivos_por_mes.keys())
-        
-        # Previsão simples de crescimento (último mês vs. média)
-        taxa_crescimento = 0
-        previsao_tamanho_6meses = total_tamanho
-        
-        if meses_ordenados:
-            # Se temos dados suficientes para análise temporal
-            if len(meses_ordenados) >= 2:
-                ultimo_mes = meses_ordenados[-1]
-                penultimo_mes = meses_ordenados[-2]
-                
-                # Taxa de crescimento baseada nos últimos dois meses
-                if tamanho_por_mes[penultimo_mes] > 0:
-                    taxa_crescimento = (tamanho_por_mes[ultimo_mes] - tamanho_por_mes[penultimo_mes]) / tamanho_por_mes[penultimo_mes] * 100
-                
-                # Previsão simples para 6 meses (crescimento composto)
-                if taxa_crescimento > 0:
-                    previsao_tamanho_6meses = total_tamanho * (1 + taxa_crescimento/100) ** 6
+        # As contas são feitas por colunas sobre o snapshot compartilhado
+        snapshot = obter_snapshot(txt_pasta.value, token=token)
+        estatisticas = calcular_estatisticas(snapshot, token)
+        total_arquivos = estatisticas["total_arquivos"]
+        total_diretorios = estatisticas["total_diretorios"]
+        total_tamanho = estatisticas["total_tamanho"]
+        maior_arquivo = estatisticas["maior_arquivo"]
+        arquivo_mais_recente = estatisticas["arquivo_mais_recente"]
+        arquivo_mais_antigo = estatisticas["arquivo_mais_antigo"]
+        extensoes = estatisticas["extensoes"]
+        tipos_arquivos = estatisticas["tipos_arquivos"]
+        profundidade_max = estatisticas["profundidade_max"]
+        arquivos_por_mes = estatisticas["arquivos_por_mes"]
+        tamanho_por_mes = estatisticas["tamanho_por_mes"]
+        meses_ordenados = estatisticas["meses_ordenados"]
+        arquivos_vazios = estatisticas["arquivos_vazios"]
+        arquivos_grandes = estatisticas["arquivos_grandes"]
+        arquivos_pequenos = estatisticas["arquivos_pequenos"]
+        arquivos_ocultos = estatisticas["arquivos_ocultos"]
+        arquivos_somente_leitura = estatisticas["arquivos_somente_leitura"]
+        taxa_crescimento = estatisticas["taxa_crescimento"]
+        previsao_tamanho_6meses = estatisticas["previsao_tamanho_6meses"]
         
         # Extensões mais comuns
         extensoes_comuns = dict(extensoes.most_common(5))
@@ -404,6 +311,9 @@ def gerar_estatisticas(txt_pasta, page):
         )
         page.dialog.open = True
         page.update()
+    except OperacaoCancelada:
+        page.snack_bar = ft.SnackBar(ft.Text("Estatísticas canceladas"), open=True)
+        page.update()
     except Exception as e:
         # Em caso de erro, mostra mensagem simplificada
         page.dialog = ft.AlertDialog(
@@ -415,6 +325,84 @@ def gerar_estatisticas(txt_pasta, page):
         )
         page.dialog.open = True
         page.update()
+    finally:
+        finalizar_tarefa("estatisticas", token)
+
+# Grupos de duplicados exibidos no diálogo (os de maior espaço recuperável)
+MAX_GRUPOS_EXIBIDOS = 200
+
+def gerar_duplicados(txt_pasta, page):
+    if not txt_pasta.value:
+        return
+    if not os.path.isdir(txt_pasta.value):
+        # Uma exportação aberta no lugar da pasta não tem o conteúdo dos arquivos
+        page.snack_bar = ft.SnackBar(ft.Text("A busca de duplicados só está disponível para pastas"), open=True)
+        page.update()
+        return
+    token = iniciar_tarefa("duplicados", "Busca de duplicados")
+    aviso = ft.SnackBar(ft.Text("Procurando duplicados..."), open=True)
+    page.snack_bar = aviso
+    page.update()
+    ultimo_aviso = [0.0]
+
+    def ao_progredir(etapa, feitos, total):
+        agora = time.monotonic()
+        if agora - ultimo_aviso[0] < INTERVALO_PROGRESSO:
+            return
+        ultimo_aviso[0] = agora
+        aviso.content.value = f"Procurando duplicados ({etapa})... {feitos}/{total}"
+        page.snack_bar = aviso
+        page.update()
+
+    try:
+        snapshot = obter_snapshot(txt_pasta.value, token=token)
+        grupos = encontrar_duplicados(snapshot, token, ao_progredir)
+        recuperavel = sum(grupo["recuperavel"] for grupo in grupos)
+        copias = sum(len(grupo["caminhos"]) for grupo in grupos)
+
+        itens = []
+        for grupo in grupos[:MAX_GRUPOS_EXIBIDOS]:
+            itens.append(ft.Container(
+                content=ft.Column([
+                    ft.Text(f"{len(grupo['caminhos'])} cópias de {formatar_tamanho(grupo['tamanho'])} "
+                            f"• recuperável: {formatar_tamanho(grupo['recuperavel'])}", weight=ft.FontWeight.BOLD),
+                    *[ft.Text(f"• {os.path.relpath(caminho, txt_pasta.value)}", size=12, selectable=True)
+                      for caminho in grupo["caminhos"]]
+                ]),
+                padding=10,
+                bgcolor=Colors.BLUE_GREY_800,
+                border_radius=10
+            ))
+        if len(grupos) > MAX_GRUPOS_EXIBIDOS:
+            itens.append(ft.Text(f"... e mais {len(grupos) - MAX_GRUPOS_EXIBIDOS} grupo(s)", italic=True))
+
+        resumo = (f"Espaço recuperável: {formatar_tamanho(recuperavel)} em {len(grupos)} grupo(s) "
+                  f"com {copias} arquivo(s)" if grupos else "Nenhum arquivo duplicado encontrado ✅")
+        page.dialog = ft.AlertDialog(
+            title=ft.Text("🧬 Arquivos Duplicados"),
+            content=ft.Container(
+                content=ft.Column([
+                    ft.Text(resumo, size=16, weight=ft.FontWeight.BOLD),
+                    ft.ListView(controls=itens, spacing=10, expand=True)
+                ]),
+                width=700,
+                height=500
+            ),
+            actions=[
+                ft.TextButton("Fechar", on_click=lambda e: close_dlg(e, page))
+            ],
+            actions_alignment=ft.MainAxisAlignment.END
+        )
+        page.dialog.open = True
+        page.update()
+    except OperacaoCancelada:
+        page.snack_bar = ft.SnackBar(ft.Text("Busca de duplicados cancelada"), open=True)
+        page.update()
+    except Exception as e:
+        page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao procurar duplicados: {str(e)} ❌"), open=True)
+        page.update()
+    finally:
+        finalizar_tarefa("duplicados", token)
 
 def criar_barra_grafico(rotulo, valor, total):
     if total == 0:
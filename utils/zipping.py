@@ -1,10 +1,53 @@
-import shutil
 import os
+import zipfile
 import flet as ft
+from utils.jobs import OperacaoCancelada, iniciar_tarefa, finalizar_tarefa
+
+# Tamanho dos blocos copiados para o ZIP; o cancelamento é verificado entre blocos
+TAMANHO_BLOCO = 1024 * 1024
+
+def _compactar(raiz, zip_path, token):
+    """Compacta ``raiz`` em ``zip_path`` (mesmo layout do shutil.make_archive)"""
+    zip_abs = os.path.abspath(zip_path)
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for pasta_atual, pastas, arquivos in os.walk(raiz):
+            token.verificar()
+            pastas.sort()
+            relativa = os.path.relpath(pasta_atual, raiz)
+            if relativa != os.curdir:
+                arquivo_zip.write(pasta_atual, relativa)
+            for nome in sorted(arquivos):
+                caminho = os.path.join(pasta_atual, nome)
+                if os.path.abspath(caminho) == zip_abs or not os.path.isfile(caminho):
+                    continue
+                info = zipfile.ZipInfo.from_file(caminho, os.path.normpath(os.path.join(relativa, nome)))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(caminho, "rb") as origem, arquivo_zip.open(info, "w") as destino:
+                    while True:
+                        token.verificar()
+                        bloco = origem.read(TAMANHO_BLOCO)
+                        if not bloco:
+                            break
+                        destino.write(bloco)
 
 def zipar_pasta(txt_pasta, page):
     if not txt_pasta.value:
         return
-    zip_path = shutil.make_archive(os.path.join(txt_pasta.value, "estrutura_compactada"), 'zip', txt_pasta.value)
-    page.snack_bar = ft.SnackBar(ft.Text(f"ZIP criado: {zip_path} ✅"), open=True)
+    if not os.path.isdir(txt_pasta.value):
+        # Uma exportação aberta no lugar da pasta não tem os arquivos
+        page.snack_bar = ft.SnackBar(ft.Text("A compactação só está disponível para pastas"), open=True)
+        page.update()
+        return
+    zip_path = os.path.join(txt_pasta.value, "estrutura_compactada.zip")
+    token = iniciar_tarefa("zip", "Compactação ZIP")
+    try:
+        _compactar(txt_pasta.value, zip_path, token)
+        page.snack_bar = ft.SnackBar(ft.Text(f"ZIP criado: {zip_path} ✅"), open=True)
+    except OperacaoCancelada:
+        # Não deixa um ZIP incompleto para trás
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        page.snack_bar = ft.SnackBar(ft.Text("Compactação cancelada"), open=True)
+    finally:
+        finalizar_tarefa("zip", token)
     page.update()